@@ -0,0 +1,117 @@
+"""
+Métricas do pool asyncpg de cada worker da API (database/postgres).
+
+A cada conexão pega do pool são registrados: a espera pelo acquire, quanto
+tempo a conexão ficou em uso e a demanda no momento do pedido (conexões em
+uso + pedidos esperando, contando o próprio). Com a demanda observada,
+sugestao_max() indica um PGPOOL_MAX que atende PGPOOL_TARGET_QUANTILE dos
+pedidos sem espera, em vez de um valor chutado.
+"""
+import bisect
+import math
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+PGPOOL_TARGET_QUANTILE = float(os.getenv("PGPOOL_TARGET_QUANTILE", "0.99"))
+
+# limites superiores dos baldes (o último balde é +inf)
+BALDES_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+BALDES_CONEXOES = tuple(range(1, 33)) + (48, 64, 96, 128)
+
+
+class Histograma:
+    """Histograma de baldes fixos (contagem, soma, máximo e quantis aproximados)."""
+
+    def __init__(self, limites: Sequence[float]):
+        self.limites = tuple(limites)
+        self.contagens = [0] * (len(self.limites) + 1)
+        self.total = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, valor: float) -> None:
+        self.contagens[bisect.bisect_left(self.limites, valor)] += 1
+        self.total += 1
+        self.soma += valor
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def quantil(self, q: float) -> Optional[float]:
+        """Limite superior do balde que contém o quantil q (máximo no balde +inf)."""
+        if not self.total:
+            return None
+        alvo = math.ceil(q * self.total)
+        acumulado = 0
+        for i, n in enumerate(self.contagens):
+            acumulado += n
+            if acumulado >= alvo:
+                return self.limites[i] if i < len(self.limites) else self.maximo
+        return self.maximo
+
+    def resumo(self) -> Dict[str, object]:
+        baldes: List[Dict[str, object]] = [
+            {"le": le, "n": n} for le, n in zip(self.limites, self.contagens) if n
+        ]
+        if self.contagens[-1]:
+            baldes.append({"le": "+inf", "n": self.contagens[-1]})
+        return {
+            "total": self.total,
+            "media": self.soma / self.total if self.total else None,
+            "p50": self.quantil(0.5),
+            "p95": self.quantil(0.95),
+            "p99": self.quantil(0.99),
+            "max": self.maximo,
+            "baldes": baldes,
+        }
+
+
+class PoolMetrics:
+    """Métricas de um pool: espera, tempo em uso e demanda por conexão."""
+
+    def __init__(self):
+        self.espera_ms = Histograma(BALDES_MS)
+        self.uso_ms = Histograma(BALDES_MS)
+        self.demanda = Histograma(BALDES_CONEXOES)
+        self.em_uso = 0
+        self.aguardando = 0
+        self.inicio = time.time()
+
+    def pedido(self) -> float:
+        """Início de um acquire; retorna o instante para fim_pedido()."""
+        self.aguardando += 1
+        self.demanda.registrar(self.em_uso + self.aguardando)
+        return time.perf_counter()
+
+    def fim_pedido(self, t0: float, ok: bool) -> float:
+        self.aguardando -= 1
+        agora = time.perf_counter()
+        if ok:
+            self.em_uso += 1
+            self.espera_ms.registrar((agora - t0) * 1000)
+        return agora
+
+    def devolvida(self, t_acquire: float) -> None:
+        self.em_uso -= 1
+        self.uso_ms.registrar((time.perf_counter() - t_acquire) * 1000)
+
+    def sugestao_max(self, q: float = PGPOOL_TARGET_QUANTILE) -> Optional[int]:
+        """Conexões que atendem a fração q dos pedidos sem esperar (None sem dados)."""
+        p = self.demanda.quantil(q)
+        return None if p is None else int(math.ceil(p))
+
+    def resumo(self, max_size: Optional[int] = None) -> Dict[str, object]:
+        sugestao = self.sugestao_max()
+        return {
+            "desde": self.inicio,
+            "pool_max": max_size,
+            "em_uso": self.em_uso,
+            "aguardando": self.aguardando,
+            "espera_ms": self.espera_ms.resumo(),
+            "uso_ms": self.uso_ms.resumo(),
+            "demanda": self.demanda.resumo(),
+            "sugestao_pgpool_max": sugestao,
+        }
+
+
+__all__ = ["Histograma", "PoolMetrics", "PGPOOL_TARGET_QUANTILE"]
@@ -1,9 +1,16 @@
 # database/postgres.py
 import os
+import asyncio
 import asyncpg
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from database.pool_metrics import PoolMetrics
 
 _pool: Optional[asyncpg.Pool] = None
+_pool_lock = asyncio.Lock()
+_metrics = PoolMetrics()
+_acquired_at: Dict[int, float] = {}  # id(conexão) → instante do acquire
 
 # Permite DSN completo (opcional) ou variáveis separadas
 def _dsn_from_env() -> str:
@@ -20,43 +27,60 @@ def _dsn_from_env() -> str:
 async def init_postgres_pool():
     """Chamar no startup do FastAPI (cada worker cria seu próprio pool)."""
     global _pool
-    if _pool is None:
-        _pool = await asyncpg.create_pool(
-            dsn=_dsn_from_env(),
-            min_size=int(os.getenv("PGPOOL_MIN", "1")),
-            max_size=int(os.getenv("PGPOOL_MAX", "5")),
-            max_inactive_connection_lifetime=float(os.getenv("PGPOOL_IDLE", "300")),
-            statement_cache_size=int(os.getenv("PG_STMT_CACHE", "1000")),
-        )
+    # o lock evita que pedidos simultâneos antes do startup criem vários pools
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                dsn=_dsn_from_env(),
+                min_size=int(os.getenv("PGPOOL_MIN", "1")),
+                max_size=int(os.getenv("PGPOOL_MAX", "5")),
+                max_inactive_connection_lifetime=float(os.getenv("PGPOOL_IDLE", "300")),
+                statement_cache_size=int(os.getenv("PG_STMT_CACHE", "1000")),
+            )
 
 async def close_postgres_pool():
     global _pool
-    if _pool is not None:
-        await _pool.close()
-        _pool = None
+    async with _pool_lock:
+        if _pool is not None:
+            await _pool.close()
+            _pool = None
 
 async def acquire_conn() -> asyncpg.Connection:
-    """Pega uma conexão do pool (lembre de dar release)."""
+    """Pega uma conexão do pool (lembre de dar release; prefira `async with conexao()`)."""
     if _pool is None:
         await init_postgres_pool()
-    return await _pool.acquire()
+    t0 = _metrics.pedido()
+    try:
+        conn = await _pool.acquire()
+    except BaseException:
+        _metrics.fim_pedido(t0, ok=False)
+        raise
+    _acquired_at[id(conn)] = _metrics.fim_pedido(t0, ok=True)
+    return conn
 
 async def release_conn(conn: asyncpg.Connection):
     if _pool is not None and conn is not None:
+        t_acquire = _acquired_at.pop(id(conn), None)
+        if t_acquire is not None:
+            _metrics.devolvida(t_acquire)
         await _pool.release(conn)
 
-# # Compat: se você quiser manter a assinatura antiga,
-# # pode expor um helper com 'async with':
-# class _ConnCtx:
-#     def __init__(self, pool): self.pool = pool
-#     async def __aenter__(self):
-#         if self.pool is None:
-#             await init_postgres_pool()
-#         return await _pool.acquire()
-#     async def __aexit__(self, exc_type, exc, tb):
-#         await _pool.release(self.conn)  # noqa
-
-# # Mantém a função antiga como alias para facilitar migração
-# # (mas recomendo usar acquire/release diretamente)
-# async def get_postgres_conn():
-#     return await acquire_conn()
+@asynccontextmanager
+async def conexao() -> AsyncIterator[asyncpg.Connection]:
+    """`async with conexao() as conn:` — conexão do pool, devolvida na saída do bloco."""
+    conn = await acquire_conn()
+    try:
+        yield conn
+    finally:
+        await release_conn(conn)
+
+@asynccontextmanager
+async def transacao() -> AsyncIterator[asyncpg.Connection]:
+    """Como conexao(), mas o bloco roda numa transação (rollback se levantar exceção)."""
+    async with conexao() as conn:
+        async with conn.transaction():
+            yield conn
+
+def pool_metrics() -> Dict[str, object]:
+    """Espera no acquire, tempo em uso e demanda do pool deste worker, com o PGPOOL_MAX sugerido."""
+    return _metrics.resumo(_pool.get_max_size() if _pool is not None else None)
@@ -0,0 +1,55 @@
+# database/postgres_sync.py
+"""
+Conexão Postgres síncrona (psycopg2) para os workers Celery, que não rodam
+event loop: uma conexão por processo, serializada por lock e refeita se cair.
+"""
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    import psycopg2
+except ImportError:  # só os workers precisam; a API usa asyncpg
+    psycopg2 = None
+
+from database.postgres import _dsn_from_env
+
+_conn = None
+_lock = threading.Lock()
+
+
+def _connect():
+    global _conn
+    if psycopg2 is None:
+        raise RuntimeError("psycopg2 não está instalado")
+    if _conn is None or _conn.closed:
+        _conn = psycopg2.connect(_dsn_from_env())
+        _conn.autocommit = True
+    return _conn
+
+
+@contextmanager
+def sync_cursor(transaction: bool = False) -> Iterator["psycopg2.extensions.cursor"]:
+    """
+    Cursor na conexão do processo (autocommit). Com transaction=True, o bloco
+    roda entre BEGIN e COMMIT (ROLLBACK se levantar exceção).
+    """
+    global _conn
+    with _lock:
+        conn = _connect()
+        try:
+            with conn.cursor() as cur:
+                if transaction:
+                    cur.execute("BEGIN")
+                try:
+                    yield cur
+                except BaseException:
+                    if transaction and not conn.closed:
+                        cur.execute("ROLLBACK")
+                    raise
+                if transaction:
+                    cur.execute("COMMIT")
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # conexão perdida: a próxima chamada reconecta
+            _conn = None
+            raise
@@ -28,11 +28,19 @@ def on_starting(server):
     import asyncio
     from preprocessing.sentence_indexing_rag import setup_elasticsearch
     from services.auth import ensure_auth_schema
+    from services.task_progress import ensure_progress_schema
+    from services.batches import ensure_batch_schema
+    from services.queue_stats import ensure_queue_stats_schema
+    from services.mailer import ensure_mail_schema
 
     print("🚀 EXECUTANDO SETUP ÚNICO NO PROCESSO MESTRE...")
     try:
         setup_elasticsearch()
         asyncio.run(ensure_auth_schema())
+        asyncio.run(ensure_progress_schema())
+        asyncio.run(ensure_batch_schema())
+        asyncio.run(ensure_queue_stats_schema())
+        asyncio.run(ensure_mail_schema())
     except Exception as e:
         print(f"❌ Falha no setup: {e}")
     print("✅ SETUP ÚNICO CONCLUÍDO.")
@@ -8,8 +8,32 @@ from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
 from dotenv import load_dotenv
 
+from services.keyword_matcher import KeywordMatcher, Resultado
+
 load_dotenv()
 
+# Palavras-chave para cada classe (fallback sem BERT)
+KEYWORDS = {
+    "peticao_inicial": [
+        "petição inicial", "peticao inicial", "requer", "requerente",
+        "vem respeitosamente", "vem à presença", "pelos motivos expostos"
+    ],
+    "contestacao": [
+        "contestação", "contestacao", "contesta", "defesa",
+        "vem apresentar contestação", "nega os fatos"
+    ],
+    "sentenca": [
+        "sentença", "sentenca", "julgo", "julgo procedente",
+        "julgo improcedente", "resolvo o mérito", "dispositivo"
+    ],
+    "despacho": [
+        "despacho", "determino", "intimo", "determina-se",
+        "determino a", "intimo-se"
+    ]
+}
+
+KEYWORD_MATCHER = KeywordMatcher(KEYWORDS)
+
 
 class DocumentClassifier:
     """
@@ -80,32 +104,12 @@ class DocumentClassifier:
         """
         Classificação por palavras-chave (fallback quando BERT não está disponível).
         """
-        text_lower = text.lower()
-        
-        # Palavras-chave para cada classe
-        keywords = {
-            "peticao_inicial": [
-                "petição inicial", "peticao inicial", "requer", "requerente",
-                "vem respeitosamente", "vem à presença", "pelos motivos expostos"
-            ],
-            "contestacao": [
-                "contestação", "contestacao", "contesta", "defesa",
-                "vem apresentar contestação", "nega os fatos"
-            ],
-            "sentenca": [
-                "sentença", "sentenca", "julgo", "julgo procedente",
-                "julgo improcedente", "resolvo o mérito", "dispositivo"
-            ],
-            "despacho": [
-                "despacho", "determino", "intimo", "determina-se",
-                "determino a", "intimo-se"
-            ]
-        }
-        
-        scores = {}
-        for doc_type, kw_list in keywords.items():
-            score = sum(1 for kw in kw_list if kw in text_lower)
-            scores[doc_type] = score
+        return self._keyword_result(KEYWORD_MATCHER.classificar(text))
+    
+    @staticmethod
+    def _keyword_result(res: Resultado) -> Dict[str, any]:
+        # score = palavras-chave diferentes encontradas na classe
+        scores = res.distintas
         
         # Determina a classe com maior score
         if max(scores.values()) > 0:
@@ -119,7 +123,8 @@ class DocumentClassifier:
             "class": best_class,
             "confidence": confidence,
             "method": "keyword_based",
-            "scores": scores
+            "scores": scores,
+            "positions": res.posicoes,
         }
     
     def classify_batch(self, texts: list[str]) -> list[Dict[str, any]]:
@@ -132,5 +137,20 @@ class DocumentClassifier:
         Returns:
             Lista de resultados de classificação
         """
-        return [self.classify(text) for text in texts]
+        if self.model is not None:
+            return [self.classify(text) for text in texts]
+        
+        # Textos com conteúdo passam juntos pelo matcher (uma varredura só)
+        results: list[Optional[Dict[str, any]]] = [None] * len(texts)
+        pending = []
+        for i, text in enumerate(texts):
+            if not text or len(text.strip()) < 50:
+                results[i] = self.classify(text)
+            else:
+                pending.append(i)
+        
+        batch = KEYWORD_MATCHER.classificar_lote([texts[i] for i in pending])
+        for i, res in zip(pending, batch):
+            results[i] = self._keyword_result(res)
+        return results
 
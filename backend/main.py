@@ -8,8 +8,8 @@ import time
 from pathlib import Path as FSPath
 from typing import List, Optional, AsyncGenerator
 
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from pydantic import BaseModel
@@ -19,14 +19,30 @@ from preprocessing.sentence_indexing_rag import setup_elasticsearch
 from preprocessing.process_report_pipeline import Config, generate as gerar_relatorio
 from services.retrieval_rerank import recuperar_documentos_similares as semantic_search_rerank
 from services.llm import gerar_sentenca_llm
-from services.docx_utils import salvar_sentenca_como_docx, salvar_docs_referencia
-from services.docx_parser import parse_docx_bytes
+from services.docx_render import renderizar as renderizar_artefato, spec_referencias, spec_sentenca
+from services.docx_parser import parse_docx_many
+from services.uploads import (
+    StoredUpload,
+    salvar_upload,
+    extrair_pdfs_zip,
+    MAX_UPLOAD_BYTES,
+    MAX_BATCH_BYTES,
+)
+from services.batches import criar_lote, status_lote, resumo as resumo_lote, MAX_BATCH_FILES
+from services.zip_stream import zip_stream
+from services import artifacts, blob_store
+from services.task_progress import get_progress as get_task_progress, hub as progress_hub
+from services.queue_stats import estatisticas as estatisticas_filas
 from services.auth import router as auth_router
 from services.auth import ensure_auth_schema
-from database.postgres import init_postgres_pool, close_postgres_pool
+from services.session_cache import cache as session_cache
+from services.mailer import sender as mail_sender
+from database.postgres import init_postgres_pool, close_postgres_pool, pool_metrics
 from celery.result import AsyncResult
 from tasks.celery_app import celery_app
-from tasks.pdf_tasks import processar_pdf_task, gerar_sentenca_task
+from tasks.config import CeleryConfig
+from tasks.pdf_tasks import processar_pdf_task, gerar_sentenca_task, despachar_lotes_task
+from tasks.autoscale import profundidade as profundidade_filas
 
 
 
@@ -171,10 +187,14 @@ async def health_check():
 async def _startup():
     # Cada worker cria seu próprio pool (rápido e barato)
     await init_postgres_pool()
+    mail_sender.start()
 
 @app.on_event("shutdown")
 async def _shutdown():
     # Fecha o pool do worker de forma limpa
+    await progress_hub.close()
+    await session_cache.close()
+    await mail_sender.close()
     await close_postgres_pool()
 
 # ─────────────────────────── Modelos de tarefas Celery ───────────────────────────
@@ -183,6 +203,34 @@ class TaskEnqueueResponse(BaseModel):
     status: str
 
 
+# Intervalo máximo entre consultas no SSE de /tasks/{id}/events (sem NOTIFY)
+TASK_EVENTS_POLL = float(os.getenv("TASK_EVENTS_POLL", "15"))
+
+
+class LoteEnqueueResponse(BaseModel):
+    batch_id: str
+    total: int
+    arquivos: List[str]
+
+
+class LoteItem(BaseModel):
+    idx: int
+    filename: str
+    task_id: Optional[str] = None
+    status: str
+    progress: Optional[str] = None
+
+
+class LoteStatusResponse(BaseModel):
+    batch_id: str
+    total: int
+    pendentes: int
+    em_andamento: int
+    concluidos: int
+    falhas: int
+    itens: List[LoteItem]
+
+
 class TaskStatusResponse(BaseModel):
     task_id: str
     status: str
@@ -344,17 +392,15 @@ async def processar_pdf(pdf: UploadFile = File(...)):
     # Validações
     validar_arquivo_pdf(pdf)
     
-    tmp_id = uuid.uuid4().hex
-    tmp_path = f"/tmp/{tmp_id}.pdf"
+    upload = None
     
     try:
-        # Salva arquivo temporário
-        with open(tmp_path, "wb") as f:
-            f.write(await pdf.read())
+        # Grava em disco em blocos, já calculando o hash (sem pdf.read() inteiro)
+        upload = await salvar_upload(pdf)
 
-        # Processa o PDF
+        # Processa o PDF fora do event loop
         cfg = Config()
-        texto = gerar_relatorio(FSPath(tmp_path), cfg)
+        texto = await asyncio.to_thread(gerar_relatorio, upload.path, cfg, digest=upload.sha256)
         
         # Extrai número do processo se presente
         numero_processo = extrair_numero_processo(texto)
@@ -364,12 +410,15 @@ async def processar_pdf(pdf: UploadFile = File(...)):
             numero_processo=numero_processo
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro no processamento: {str(e)}")
     
     finally:
         # Limpa arquivo temporário
-        limpar_arquivo_temporario(tmp_path)
+        if upload:
+            limpar_arquivo_temporario(str(upload.path))
 
 class Documento(BaseModel):
     id: str
@@ -415,12 +464,13 @@ async def gerar_sentenca_endpoint(
         # 1) Monta lista inicial com arquivos enviados, se houver
         docs: List[dict] = []
         if arquivos_referencia:
-            for upload in arquivos_referencia:
-                # if not upload.filename.lower().endswith('.docx'):
-                #     raise HTTPException(status_code=400, detail=f"Arquivo {upload.filename} deve ser DOCX")
-                
-                data = await upload.read()
-                sec = parse_docx_bytes(data)
+            # if not upload.filename.lower().endswith('.docx'):
+            #     raise HTTPException(status_code=400, detail=f"Arquivo {upload.filename} deve ser DOCX")
+            
+            # Lê todos e extrai as seções em paralelo, fora do event loop
+            datas = [await upload.read() for upload in arquivos_referencia]
+            secoes = await asyncio.to_thread(parse_docx_many, datas)
+            for upload, sec in zip(arquivos_referencia, secoes):
                 sec["id"] = upload.filename or uuid.uuid4().hex
                 docs.append(sec)
             
@@ -451,28 +501,15 @@ async def gerar_sentenca_endpoint(
         nome_base_sentenca = gerar_nome_arquivo_sentenca(numero_processo)
         nome_base_referencias = gerar_nome_arquivo_referencias(numero_processo)
         
-        sent_id = f"{nome_base_sentenca}_{uuid.uuid4().hex[:8]}"
-        refs_id = f"{nome_base_referencias}_{uuid.uuid4().hex[:8]}"
-        
-        SENTENCA_DIR = "/output_files/sentenca"
-        REFS_DIR = "/output_files/referencias"
-
-        # Garante que os subdiretórios existam dentro do volume
-        os.makedirs(SENTENCA_DIR, exist_ok=True)
-        os.makedirs(REFS_DIR, exist_ok=True)
-
-        # Define o caminho completo dos arquivos para salvar
-        sent_path = os.path.join(SENTENCA_DIR, f"{sent_id}.docx")
-        refs_path = os.path.join(REFS_DIR, f"{refs_id}.zip")
-
-        # 4) Salvar .docx e ZIP de referências com número do processo
-        salvar_sentenca_como_docx(
-            relatorio=relatorio,
-            fundamentacao_dispositivo=sentenca,
-            arquivo_path=sent_path,
-            numero_processo=numero_processo
+        # 4) Registra .docx e ZIP de referências (gerados no primeiro download)
+        sentenca_url = await asyncio.to_thread(
+            artifacts.registrar, "sentenca", artifacts.novo_id(nome_base_sentenca),
+            spec_sentenca(relatorio, sentenca, numero_processo),
+        )
+        referencias_url = await asyncio.to_thread(
+            artifacts.registrar, "referencias", artifacts.novo_id(nome_base_referencias),
+            spec_referencias(docs),
         )
-        salvar_docs_referencia(docs, refs_path)
 
         # 5) Montar e retornar
         retorno = [
@@ -489,8 +526,8 @@ async def gerar_sentenca_endpoint(
         return GerarSentencaResp(
             documentos=retorno,
             sentenca=decodificar_unicode(sentenca),
-            sentenca_url=f"/download/sentenca/{sent_id}.docx",
-            referencias_url=f"/download/referencias/{refs_id}.zip",
+            sentenca_url=sentenca_url,
+            referencias_url=referencias_url,
             numero_processo=numero_processo
         )
     
@@ -505,8 +542,7 @@ async def _run_in_thread(func):
     """
     Executa função em thread separada
     """
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, func)
+    return await asyncio.to_thread(func)
 
 
 @app.post("/stream/processar")
@@ -515,37 +551,36 @@ async def stream_processar_pdf(pdf: UploadFile = File(...)) -> EventSourceRespon
     Processa PDF com streaming de progresso
     """
     # Validação rápida
-    if pdf.size and pdf.size > 200 * 1024 * 1024:
+    if pdf.size and pdf.size > MAX_UPLOAD_BYTES:
         async def error_generator():
             yield f"event: error\ndata: Arquivo muito grande. Máximo: 200MB\n\n"
         return EventSourceResponse(error_generator())
     
-    tmp_id = uuid.uuid4().hex
-    tmp_path = f"/tmp/{tmp_id}.pdf"
-    
     try:
-        with open(tmp_path, "wb") as f:
-            f.write(await pdf.read())
+        upload = await salvar_upload(pdf)
     except Exception as e:
+        detalhe = e.detail if isinstance(e, HTTPException) else f"Erro ao salvar arquivo: {str(e)}"
         async def error_generator():
-            yield f"event: error\ndata: Erro ao salvar arquivo: {str(e)}\n\n"
+            yield f"event: error\ndata: {detalhe}\n\n"
         return EventSourceResponse(error_generator())
 
     cfg = Config()
     queue: asyncio.Queue[str] = asyncio.Queue()
+    loop = asyncio.get_running_loop()
 
     def on_progress(msg: str):
-        queue.put_nowait(msg)
+        # chamado da thread do pipeline: entrega na fila pelo loop
+        loop.call_soon_threadsafe(queue.put_nowait, msg)
 
     def worker():
         try:
-            report = gerar_relatorio(FSPath(tmp_path), cfg, on_progress=on_progress)
-            queue.put_nowait("__COMPLETE__:" + report)
+            report = gerar_relatorio(upload.path, cfg, on_progress=on_progress, digest=upload.sha256)
+            on_progress("__COMPLETE__:" + report)
         except Exception as e:
-            queue.put_nowait(f"__ERROR__:Erro na extração: {str(e)}")
+            on_progress(f"__ERROR__:Erro na extração: {str(e)}")
         finally:
             # Limpa arquivo temporário
-            limpar_arquivo_temporario(tmp_path)
+            limpar_arquivo_temporario(str(upload.path))
 
     asyncio.create_task(_run_in_thread(worker))
 
@@ -606,9 +641,11 @@ async def stream_gerar_sentenca(
                     async def error_generator():
                         yield f"event: error\ndata: {error_msg}\n\n"
                     return EventSourceResponse(error_generator())
-                
-                data = await upload.read()
-                sec = parse_docx_bytes(data)
+            
+            # Lê todos e extrai as seções em paralelo, fora do event loop
+            datas = [await upload.read() for upload in arquivos_referencia]
+            secoes = await asyncio.to_thread(parse_docx_many, datas)
+            for upload, sec in zip(arquivos_referencia, secoes):
                 sec["id"] = upload.filename or uuid.uuid4().hex
                 docs.append(sec)
             
@@ -626,90 +663,63 @@ async def stream_gerar_sentenca(
         nome_base_sentenca = gerar_nome_arquivo_sentenca(numero_processo)
         nome_base_referencias = gerar_nome_arquivo_referencias(numero_processo)
         
-        sent_id = f"{nome_base_sentenca}_{uuid.uuid4().hex[:8]}"
-        refs_id = f"{nome_base_referencias}_{uuid.uuid4().hex[:8]}"
-        
-# Define os diretórios de saída DENTRO do volume compartilhado
-        SENTENCA_DIR = "/output_files/sentenca"
-        REFS_DIR = "/output_files/referencias"
-
-        # Garante que os subdiretórios existam dentro do volume
-        os.makedirs(SENTENCA_DIR, exist_ok=True)
-        os.makedirs(REFS_DIR, exist_ok=True)
-
-        # Define o caminho completo dos arquivos para salvar
-        sent_path = os.path.join(SENTENCA_DIR, f"{sent_id}.docx")
-        refs_path = os.path.join(REFS_DIR, f"{refs_id}.zip")
-
         def on_progress(msg: str):
             queue.put_nowait(msg)
 
-        # CORREÇÃO: Função worker que roda em thread separada
-        def worker():
+        # Worker assíncrono: a chamada ao LLM roda no próprio loop; só a
+        # escrita dos arquivos (bloqueante) vai para thread.
+        async def worker():
             try:
                 queue.put_nowait("🔄 Iniciando geração da sentença...")
-                
-                # CORREÇÃO: Criar um loop asyncio para a thread
-                import asyncio
-                new_loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(new_loop)
-                
-                try:
-                    # CORREÇÃO: Chama a função async corretamente
-                    sentenca = new_loop.run_until_complete(
-                        gerar_sentenca_llm(
-                            relatorio=relatorio,
-                            docs=docs,
-                            instrucoes_usuario=instrucoes_usuario,
-                            on_progress=on_progress,  # CORREÇÃO: Passa o callback
-                        )
-                    )
-                    
-                    queue.put_nowait("📝 Processando texto da sentença...")
-                    
-                    # Limpa e normaliza o texto da sentença
-                    sentenca_limpa = decodificar_unicode(sentenca)
-                    
-                    queue.put_nowait("💾 Salvando sentença...")
-                    
-                    # Salva com número do processo
-                    salvar_sentenca_como_docx(
-                        relatorio=relatorio,
-                        fundamentacao_dispositivo=sentenca_limpa,
-                        arquivo_path=sent_path,
-                        numero_processo=numero_processo
-                    )
-                    
-                    queue.put_nowait("📁 Preparando documentos de referência...")
-                    salvar_docs_referencia(docs, refs_path)
-                    
-                    # Monta payload com texto limpo
-                    payload_data = {
-                        "sentenca": sentenca_limpa,
-                        "sentenca_url": f"/download/sentenca/{sent_id}.docx",
-                        "referencias_url": f"/download/referencias/{refs_id}.zip",
-                        "numero_processo": numero_processo
-                    }
-                    
-                    # Serializa JSON com configurações específicas
-                    payload = json.dumps(
-                        payload_data, 
-                        ensure_ascii=False,
-                        separators=(',', ':'),
-                        indent=None
-                    )
-
-                    queue.put_nowait("__COMPLETE__:" + payload)
-                    
-                finally:
-                    new_loop.close()
-                
+
+                sentenca = await gerar_sentenca_llm(
+                    relatorio=relatorio,
+                    docs=docs,
+                    instrucoes_usuario=instrucoes_usuario,
+                    on_progress=on_progress,
+                )
+
+                queue.put_nowait("📝 Processando texto da sentença...")
+
+                # Limpa e normaliza o texto da sentença
+                sentenca_limpa = decodificar_unicode(sentenca)
+
+                queue.put_nowait("💾 Salvando sentença...")
+
+                # Só registra: DOCX e ZIP são gerados no primeiro download
+                sentenca_url = await asyncio.to_thread(
+                    artifacts.registrar, "sentenca", artifacts.novo_id(nome_base_sentenca),
+                    spec_sentenca(relatorio, sentenca_limpa, numero_processo),
+                )
+                referencias_url = await asyncio.to_thread(
+                    artifacts.registrar, "referencias", artifacts.novo_id(nome_base_referencias),
+                    spec_referencias(docs),
+                )
+
+                # Monta payload com texto limpo
+                payload_data = {
+                    "sentenca": sentenca_limpa,
+                    "sentenca_url": sentenca_url,
+                    "referencias_url": referencias_url,
+                    "numero_processo": numero_processo
+                }
+
+                # Serializa JSON com configurações específicas
+                payload = json.dumps(
+                    payload_data,
+                    ensure_ascii=False,
+                    separators=(',', ':'),
+                    indent=None
+                )
+
+                queue.put_nowait("__COMPLETE__:" + payload)
+
             except Exception as e:
                 # Log do erro para debug
                 print(f"❌ Erro na geração da sentença: {str(e)}")
                 import traceback
                 traceback.print_exc()
-                
+
                 error_payload = json.dumps({
                     "error": str(e),
                     "sentenca": "",
@@ -719,7 +729,7 @@ async def stream_gerar_sentenca(
                 }, ensure_ascii=False)
                 queue.put_nowait("__ERROR__:" + error_payload)
 
-        asyncio.create_task(_run_in_thread(worker))
+        asyncio.create_task(worker())
 
         async def event_generator() -> AsyncGenerator[str, None]:
             timeout_count = 0
@@ -757,6 +767,35 @@ async def stream_gerar_sentenca(
         return EventSourceResponse(error_generator())
 
 
+# ─────────────────────────── Downloads ───────────────────────────
+
+@app.get("/download/{tipo}/{arquivo}")
+async def download_artefato(tipo: str, arquivo: str, request: Request):
+    """
+    Baixa a sentença (DOCX) ou o ZIP de referências registrados pela API ou
+    pelos workers; o arquivo é gerado no primeiro download. FileResponse envia o arquivo em partes e atende Range (download
+    retomável); o ETag evita rebaixar o que o cliente já tem.
+    """
+    try:
+        # primeiro download: gera o DOCX/ZIP a partir do registro
+        path = await asyncio.to_thread(artifacts.materializar, tipo, arquivo, renderizar_artefato)
+        st = await asyncio.to_thread(path.stat)
+    except (artifacts.ArtifactNotFound, FileNotFoundError):
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado ou expirado")
+
+    etag = artifacts.etag(st)
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={artifacts.ARTIFACT_TTL}, immutable"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(
+        path,
+        media_type=artifacts.media_type(tipo),
+        filename=arquivo,
+        headers=headers,
+        stat_result=st,
+    )
+
+
 # ─────────────────────────── Endpoints Administrativos ───────────────
 
 @app.get("/ultimo-relatorio")
@@ -830,6 +869,71 @@ async def status_sistema():
     }
 
 
+@app.get("/metrics/filas")
+async def metricas_filas():
+    """
+    Backlog por fila: mensagens aguardando, consumidores, idade do backlog e
+    trabalho pendente, além do histórico de cada task (médias móveis).
+
+    A idade do backlog é a espera do último job iniciado (o mais antigo da
+    fila naquele momento) somada ao tempo decorrido desde então.
+    """
+    filas = [
+        CeleryConfig.QUEUE_OCR,
+        CeleryConfig.QUEUE_LLM,
+        CeleryConfig.QUEUE_RETRIEVAL,
+        CeleryConfig.TASK_DEFAULT_QUEUE,
+    ]
+    try:
+        broker = await asyncio.to_thread(profundidade_filas, celery_app, filas)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Broker indisponível: {e}")
+    historico = [dict(r) for r in await estatisticas_filas()]
+
+    resultado = {}
+    for fila in filas:
+        mensagens, consumidores = broker[fila]
+        tasks = [h for h in historico if h["queue"] == fila]
+        amostras = sum(h["samples"] for h in tasks)
+        tempo_medio = (
+            sum(h["runtime_ewma"] * h["samples"] for h in tasks) / amostras if amostras else None
+        )
+        ultima = min(tasks, key=lambda h: h["since_last_start"], default=None)
+        idade = 0.0
+        if mensagens and ultima is not None:
+            idade = ultima["last_wait"] + float(ultima["since_last_start"])
+        # segundos de processamento acumulados (o autoscaler divide pela meta de drenagem)
+        trabalho = None
+        if mensagens is not None and tempo_medio is not None:
+            trabalho = mensagens * tempo_medio
+        resultado[fila] = {
+            "mensagens": mensagens,
+            "consumidores": consumidores,
+            "idade_backlog_s": round(idade, 1),
+            "tempo_medio_s": round(tempo_medio, 2) if tempo_medio is not None else None,
+            "trabalho_pendente_s": round(trabalho, 1) if trabalho is not None else None,
+            "tasks": {
+                h["task_name"]: {
+                    "execucoes": h["samples"],
+                    "tempo_medio_s": round(h["runtime_ewma"], 2),
+                    "espera_media_s": round(h["wait_ewma"], 2),
+                }
+                for h in tasks
+            },
+        }
+    return {"timestamp": time.time(), "filas": resultado}
+
+
+@app.get("/metrics/pool")
+async def metricas_pool():
+    """
+    Pool Postgres deste worker (cada worker do gunicorn tem o seu): histogramas
+    da espera no acquire, do tempo em uso e da demanda por conexões, e o
+    PGPOOL_MAX que atenderia PGPOOL_TARGET_QUANTILE dos pedidos sem espera.
+    """
+    return {"timestamp": time.time(), "pid": os.getpid(), "pool": pool_metrics()}
+
+
 # ─────────────────────────── Handler de Erro Global ───────────────
 
 @app.exception_handler(Exception)
@@ -847,19 +951,191 @@ async def queue_processar(pdf: UploadFile = File(...)):
     """Enfileira processamento de PDF"""
     if not pdf.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Envie um arquivo PDF")
-    data = await pdf.read()
-    task = processar_pdf_task.delay(data, pdf.filename)
+    # Grava uma vez no blob store e enfileira só a chave (hash do conteúdo)
+    upload = await salvar_upload(pdf)
+    blob_key = await asyncio.to_thread(blob_store.put_file, upload.path, upload.sha256)
+    task = processar_pdf_task.apply_async(
+        args=(blob_key, pdf.filename),
+        priority=CeleryConfig.PRIORITY_INTERACTIVE,
+    )
     return TaskEnqueueResponse(task_id=task.id, status="QUEUED")
 
 
+@app.post("/queue/gerar-sentenca", response_model=TaskEnqueueResponse)
+async def queue_gerar_sentenca(
+    relatorio: str = Form(...),
+    instrucoes_usuario: Optional[str] = Form(None),
+    numero_processo: Optional[str] = Form(None),
+    top_k: int = Form(10),
+    rerank_top_k: int = Form(5),
+    arquivos_referencia: Optional[List[UploadFile]] = File(None),
+    buscar_na_base: bool = Form(False),
+):
+    """Enfileira geração de sentença (DOCX de referência vão por chave do blob store)"""
+    if not relatorio.strip():
+        raise HTTPException(status_code=400, detail="Relatório não pode estar vazio")
+
+    refs = []
+    for upload in arquivos_referencia or []:
+        if not (upload.filename or "").lower().endswith(".docx"):
+            raise HTTPException(status_code=400, detail=f"Arquivo {upload.filename} deve ser DOCX")
+        stored = await salvar_upload(upload, suffix=".docx")
+        blob_key = await asyncio.to_thread(blob_store.put_file, stored.path, stored.sha256)
+        refs.append({"filename": upload.filename, "blob_key": blob_key})
+
+    task = gerar_sentenca_task.apply_async(
+        args=(relatorio,),
+        kwargs=dict(
+            instrucoes_usuario=instrucoes_usuario,
+            numero_processo=numero_processo,
+            top_k=top_k,
+            rerank_top_k=rerank_top_k,
+            arquivos_referencia_data=refs or None,
+            buscar_na_base=buscar_na_base,
+        ),
+        priority=CeleryConfig.PRIORITY_INTERACTIVE,
+    )
+    return TaskEnqueueResponse(task_id=task.id, status="QUEUED")
+
+
+# ─────────────────────────── Lotes de PDFs ───────────────────────────
+@app.post("/queue/lote", response_model=LoteEnqueueResponse)
+async def queue_lote(
+    pdfs: Optional[List[UploadFile]] = File(None),
+    arquivo_zip: Optional[UploadFile] = File(None),
+):
+    """
+    Enfileira um lote de PDFs (vários arquivos e/ou um ZIP): um job de
+    relatório por PDF, liberados aos poucos conforme a capacidade (BATCH_MAX_INFLIGHT).
+    """
+    # valida contagem e extensões antes de gravar qualquer arquivo em disco
+    pdfs = pdfs or []
+    if len(pdfs) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f"Máximo de {MAX_BATCH_FILES} PDFs por lote")
+    for pdf in pdfs:
+        if not (pdf.filename or "").lower().endswith(".pdf"):
+            raise HTTPException(status_code=400, detail=f"Arquivo {pdf.filename} não é PDF")
+
+    uploads: List[StoredUpload] = []
+    try:
+        for pdf in pdfs:
+            uploads.append(await salvar_upload(pdf))
+        if arquivo_zip is not None:
+            zip_upload = await salvar_upload(arquivo_zip, max_bytes=MAX_BATCH_BYTES, suffix=".zip")
+            try:
+                uploads.extend(await asyncio.to_thread(
+                    extrair_pdfs_zip,
+                    zip_upload.path,
+                    max_files=MAX_BATCH_FILES - len(uploads),
+                    max_total_bytes=MAX_BATCH_BYTES - sum(up.size for up in uploads),
+                ))
+            finally:
+                limpar_arquivo_temporario(str(zip_upload.path))
+        if not uploads:
+            raise HTTPException(status_code=400, detail="Envie PDFs ou um ZIP com PDFs")
+        if len(uploads) > MAX_BATCH_FILES:
+            raise HTTPException(status_code=413, detail=f"Máximo de {MAX_BATCH_FILES} PDFs por lote")
+
+        itens = []
+        for up in uploads:
+            blob_key = await asyncio.to_thread(blob_store.put_file, up.path, up.sha256)
+            itens.append((up.filename, blob_key))
+    except BaseException:
+        for up in uploads:
+            limpar_arquivo_temporario(str(up.path))
+        raise
+
+    batch_id = await criar_lote(itens)
+    despachar_lotes_task.apply_async()
+    return LoteEnqueueResponse(batch_id=batch_id, total=len(itens), arquivos=[nome for nome, _ in itens])
+
+
+async def _itens_lote(batch_id: str) -> List[dict]:
+    rows = await status_lote(batch_id)
+    if rows is None:
+        raise HTTPException(status_code=404, detail="Lote não encontrado")
+    return [dict(r) for r in rows]
+
+
+@app.get("/lotes/{batch_id}", response_model=LoteStatusResponse)
+async def lote_status(batch_id: str):
+    """Progresso agregado do lote e o estado/progresso de cada PDF"""
+    itens = await _itens_lote(batch_id)
+    return LoteStatusResponse(batch_id=batch_id, **resumo_lote(itens), itens=itens)
+
+
+@app.get("/lotes/{batch_id}/relatorios.zip")
+async def lote_relatorios_zip(batch_id: str):
+    """
+    ZIP (em streaming) com o relatório de cada PDF concluído; falhas viram
+    um .erro.txt com a mensagem. Pode ser baixado antes do fim do lote.
+    """
+    itens = [i for i in await _itens_lote(batch_id) if i["status"] in ("SUCCESS", "FAILURE")]
+    if not itens:
+        return JSONResponse(status_code=202, content={"detail": "Nenhum relatório concluído ainda"})
+
+    def arquivos():
+        for item in itens:
+            base = f"{item['idx'] + 1:04d}_{FSPath(item['filename']).stem}"
+            result = AsyncResult(item["task_id"], app=celery_app)
+            if item["status"] == "SUCCESS" and isinstance(result.result, dict):
+                yield f"{base}.txt", result.result.get("relatorio", "")
+            else:
+                yield f"{base}.erro.txt", str(result.result or "Falha no processamento")
+
+    return StreamingResponse(
+        zip_stream(arquivos()),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="relatorios_{batch_id}.zip"'},
+    )
+
+
 @app.get("/tasks/{task_id}/status", response_model=TaskStatusResponse)
 async def task_status(task_id: str):
     """Retorna status/progresso de uma task Celery"""
     result = AsyncResult(task_id, app=celery_app)
-    progress = None
-    if isinstance(result.info, dict):
-        progress = result.info.get("progress")
-    return TaskStatusResponse(task_id=task_id, status=result.status, progress=progress)
+    status, info = await asyncio.to_thread(lambda: (result.status, result.info))
+    row = await get_task_progress(task_id)
+    progress = row["progress"] if row else None
+    if progress is None and isinstance(info, dict):
+        progress = info.get("progress")
+    return TaskStatusResponse(task_id=task_id, status=status, progress=progress)
+
+
+@app.get("/tasks/{task_id}/events")
+async def task_events(task_id: str) -> EventSourceResponse:
+    """
+    Progresso da task por SSE: cada NOTIFY do worker vira um evento, até o
+    resultado final (complete/error). Substitui o polling de /status.
+    """
+    async def event_generator() -> AsyncGenerator[str, None]:
+        queue = await progress_hub.subscribe(task_id)
+        ultimo_seq = None
+        try:
+            while True:
+                row = await get_task_progress(task_id)
+                if row and row["seq"] != ultimo_seq:
+                    ultimo_seq = row["seq"]
+                    yield f"event: message\ndata: {row['progress']}\n\n"
+
+                result = AsyncResult(task_id, app=celery_app)
+                state, info = await asyncio.to_thread(lambda: (result.state, result.info))
+                if state == "SUCCESS":
+                    yield f"event: complete\ndata: {json.dumps(info, ensure_ascii=False)}\n\n"
+                    break
+                if state == "FAILURE":
+                    yield f"event: error\ndata: {info}\n\n"
+                    break
+
+                # Acorda no NOTIFY; o timeout só cobre notificações perdidas
+                try:
+                    await asyncio.wait_for(queue.get(), timeout=TASK_EVENTS_POLL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            progress_hub.unsubscribe(task_id, queue)
+
+    return EventSourceResponse(event_generator(), ping=30)
 
 
 @app.get("/tasks/{task_id}/result", response_model=TaskResultResponse)
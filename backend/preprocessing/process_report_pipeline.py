@@ -9,8 +9,7 @@ from pathlib import Path
 from typing import Callable, Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
 from types import SimpleNamespace
-import hashlib
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -22,9 +21,16 @@ import anthropic
 from pypdf.errors import PdfReadError
 from pypdf import PdfReader
 import pytesseract
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_path
 from PIL import Image
 
+from utils import sha256_file
+from services import llm_cache, model_router, single_flight
+from services.model_router import Tier
+from services.keyword_matcher import KeywordMatcher
+
+# Cache de relatórios prontos por hash do PDF (volume compartilhado API/workers)
+REPORT_CACHE_DIR = Path(os.getenv("REPORT_CACHE_DIR", "/tmp"))
 
 # ───────────────────────────────────────── config ──────────────────────────
 @dataclass
@@ -42,15 +48,17 @@ def log(msg: str, cfg: Config):
         
 # --- NOVO: FUNÇÃO DE TAREFA PARA OCR PARALELO ---
 # Esta função precisa ser de "nível superior" para funcionar com ProcessPoolExecutor
-def ocr_page_task(task_args: Tuple[bytes, int, str]) -> Tuple[int, str]:
+def ocr_page_task(task_args: Tuple[str, int, str]) -> Tuple[int, str]:
     """
     Executa OCR em uma única página de um PDF.
+    Recebe o caminho do arquivo (não os bytes): cada processo do pool
+    rasteriza só a sua página, sem copiar o PDF inteiro para a memória.
     Retorna uma tupla com (numero_da_pagina, texto_extraido).
     """
-    pdf_bytes, page_number, lang = task_args
+    pdf_path, page_number, lang = task_args
     try:
-        pil_images = convert_from_bytes(
-            pdf_bytes,
+        pil_images = convert_from_path(
+            pdf_path,
             dpi=300,
             first_page=page_number,
             last_page=page_number
@@ -63,56 +71,73 @@ def ocr_page_task(task_args: Tuple[bytes, int, str]) -> Tuple[int, str]:
     
     return (page_number, "")
 
-# --- NOVO: FUNÇÃO PARA EXTRAIR TEXTO COM OCR PARALELO ---
-def extract_text_from_pdf(pdf_path: Path, cfg: Config, on_progress: Optional[Callable[[str], None]] = None) -> List[SimpleNamespace]:
+def ocr_pages(pdf_path: Path, page_numbers: List[int], lang: str = "por", parallel: bool = True) -> Dict[int, str]:
     """
-    Carrega o texto de um PDF, aplicando OCR em paralelo nas páginas que forem imagens.
+    OCR de um conjunto de páginas (numeração a partir de 1).
+    parallel=False roda na própria thread: usado pelos shards do Celery, cujos
+    processos prefork não podem abrir um ProcessPoolExecutor próprio.
+    """
+    tasks = [(str(pdf_path), page_num, lang) for page_num in page_numbers]
+    if not parallel:
+        return dict(ocr_page_task(t) for t in tasks)
+    with ProcessPoolExecutor() as executor:
+        return dict(executor.map(ocr_page_task, tasks))
+
+
+def scan_pdf_text(pdf_path: Path, cfg: Config, on_progress: Optional[Callable[[str], None]] = None) -> Tuple[List[Optional[str]], List[int]]:
+    """
+    Fase 1 da extração: texto direto de cada página (pypdf). Devolve a lista
+    de textos (None nas páginas de imagem) e as páginas que precisam de OCR.
     """
-    pages_content = []
-    pages_to_ocr = []
+    texts: List[Optional[str]] = []
+    pages_to_ocr: List[int] = []
     
     try:
         reader = PdfReader(str(pdf_path), strict=False)
         num_pages = len(reader.pages)
         if on_progress: on_progress(f"📄 PDF com {num_pages} páginas detectado. Lendo texto...")
 
-        # Fase 1: Extrai texto direto e identifica páginas para OCR
         for i, page in enumerate(reader.pages):
             try:
                 text = page.extract_text() or ""
                 if len(text.strip()) < 100:
                     pages_to_ocr.append(i + 1)
-                    pages_content.append(SimpleNamespace(page_content=None, metadata={'page': i})) # Placeholder
+                    texts.append(None) # Placeholder
                 else:
-                    pages_content.append(SimpleNamespace(page_content=text, metadata={'page': i}))
+                    texts.append(text)
             except Exception:
                 log(f"   – erro extraindo texto da página {i+1}, marcando para OCR.", cfg)
                 pages_to_ocr.append(i + 1)
-                pages_content.append(SimpleNamespace(page_content=None, metadata={'page': i})) # Placeholder
+                texts.append(None) # Placeholder
 
     except Exception as e:
         log(f"⚠️ Leitura do PDF falhou: {e}. O documento pode estar corrompido.", cfg)
         raise
 
-    # Fase 2: Executa OCR em paralelo, se necessário
-    if pages_to_ocr:
-        if on_progress: on_progress(f"⚙️ Executando OCR em {len(pages_to_ocr)} páginas em paralelo...")
-        pdf_bytes = pdf_path.read_bytes()
-        tasks = [(pdf_bytes, page_num, 'por') for page_num in pages_to_ocr]
+    return texts, pages_to_ocr
 
-        with ProcessPoolExecutor() as executor:
-            results = executor.map(ocr_page_task, tasks)
-            
-            for page_num, ocr_text in results:
-                # O índice na lista é page_num - 1
-                pages_content[page_num - 1].page_content = ocr_text
 
+def pages_from_texts(texts: List[Optional[str]]) -> List[SimpleNamespace]:
+    """Monta as páginas no formato do loader (page_content/metadata)."""
     # Garante que nenhum conteúdo de página seja None
-    for page in pages_content:
-        if page.page_content is None:
-            page.page_content = ""
+    return [SimpleNamespace(page_content=t or "", metadata={'page': i}) for i, t in enumerate(texts)]
+
+
+# --- NOVO: FUNÇÃO PARA EXTRAIR TEXTO COM OCR PARALELO ---
+def extract_text_from_pdf(pdf_path: Path, cfg: Config, on_progress: Optional[Callable[[str], None]] = None) -> List[SimpleNamespace]:
+    """
+    Carrega o texto de um PDF, aplicando OCR em paralelo nas páginas que forem imagens.
+    """
+    texts, pages_to_ocr = scan_pdf_text(pdf_path, cfg, on_progress)
+
+    # Fase 2: Executa OCR em paralelo, se necessário
+    if pages_to_ocr:
+        if on_progress: on_progress(f"⚙️ Executando OCR em {len(pages_to_ocr)} páginas em paralelo...")
+        for page_num, ocr_text in ocr_pages(pdf_path, pages_to_ocr).items():
+            # O índice na lista é page_num - 1
+            texts[page_num - 1] = ocr_text
 
-    return pages_content
+    return pages_from_texts(texts)
 
 # ────────────────────────────── detectar peça ─────────────────────────────
 PIECE_KWS: Dict[str, list[str]] = {
@@ -124,12 +149,14 @@ PIECE_KWS: Dict[str, list[str]] = {
     "replica":         ["réplica", "replica"],
 }
 
+PIECE_MATCHER = KeywordMatcher(PIECE_KWS)
+
 def classify_page(txt: str) -> str:
-    low = txt.lower()
-    for lab, kws in PIECE_KWS.items():
-        if any(kw in low for kw in kws):
-            return lab
-    return "outros"
+    return PIECE_MATCHER.primeira_classe(PIECE_MATCHER.classificar(txt))
+
+def classify_pages(texts: List[str]) -> List[str]:
+    """Rótulo de cada página, com uma única varredura sobre todas."""
+    return [PIECE_MATCHER.primeira_classe(r) for r in PIECE_MATCHER.classificar_lote(texts)]
 
 def extract_process_number(first_page_text: str) -> Optional[str]:
     """
@@ -208,8 +235,9 @@ def group_pages(pages: List, cfg: Config) -> tuple[Dict[str, List[str]], Optiona
     process_number = None
     # mapa de label -> ID capturado do rodapé
     section_id_map: Dict[str,str] = {}
+    labels = classify_pages([p.page_content for p in pages])
     
-    for i, p in enumerate(pages):
+    for i, (p, lab) in enumerate(zip(pages, labels)):
         # Extrai número do processo da primeira página
         if i == 0:
             process_number = extract_process_number(p.page_content)
@@ -218,7 +246,6 @@ def group_pages(pages: List, cfg: Config) -> tuple[Dict[str, List[str]], Optiona
             else:
                 log("⚠️ Número do processo não encontrado na primeira página", cfg)
         
-        lab = classify_page(p.page_content)
         if lab != cur:
             if buf:
                 groups.setdefault(cur or "outros", []).append("\n".join(buf))
@@ -339,8 +366,8 @@ RELATÓRIO:""",
 
 # ─────────────────────────── wrapper Claude CORRIGIDO ─────────────────────────────
 class AnthropicClaudeWrapper:
-    def __init__(self, model: str, max_tokens: int = 4096, temperature: float = 0.2):
-        self.client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+    def __init__(self, model: str, max_tokens: int = 4096, temperature: float = 0.2, timeout: Optional[float] = None):
+        self.client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), timeout=timeout, max_retries=0)
         self.model = model
 
         self.max_tokens = max_tokens
@@ -401,46 +428,49 @@ class AnthropicClaudeWrapper:
             return text.strip()
             
         except Exception as e:
+            # propaga: o roteador decide se troca de tier (529/503/timeout)
             print(f"Erro na chamada da API Anthropic: {e}", file=sys.stderr)
-            return f"Erro na geração de conteúdo: {str(e)}"
+            raise
 
 # ───────────────────────── funções LLM CORRIGIDAS ────────────────────────────────────
 
-def get_llm(model_name: str, cfg: Config) -> BaseLanguageModel:
+_llm_clients: Dict[Tuple[str, str, float, int, Optional[float]], Any] = {}
+
+def get_llm(model_name: str, cfg: Config, provider: Optional[str] = None, timeout: Optional[float] = None) -> BaseLanguageModel:
     """
-    Seleciona dinamicamente o cliente LLM (OpenAI ou Anthropic)
-    com base no nome do modelo.
+    Cria (ou reaproveita) o cliente LLM do tier: OpenAI ou Anthropic.
+    O provider vem do tier; sem ele, é inferido do prefixo do modelo.
+    Não há fallback silencioso: modelos alternativos vêm da lista de tiers.
     """
-    if model_name.startswith("gpt"):
-        log(f"Usando modelo OpenAI: {model_name}", cfg)
-        try:
-            return ChatOpenAI(
-                model=model_name,
-                temperature=cfg.temperature,
-                max_tokens=cfg.max_tokens,
-                api_key=os.getenv("OPENAI_API_KEY") # Passando a chave explicitamente
-            )
-        except Exception as e:
-            log(f"Falha ao inicializar ChatOpenAI para o modelo '{model_name}': {e}", cfg)
-            # Se falhar (ex: chave inválida), cai no fallback
-            pass
+    provider = provider or model_router.infer_provider(model_name)
+    key = (provider, model_name, cfg.temperature, cfg.max_tokens, timeout)
+    llm = _llm_clients.get(key)
+    if llm is not None:
+        return llm
 
-    elif model_name.startswith("claude"):
+    if provider == "openai":
+        log(f"Usando modelo OpenAI: {model_name}", cfg)
+        llm = ChatOpenAI(
+            model=model_name,
+            temperature=cfg.temperature,
+            max_tokens=cfg.max_tokens,
+            timeout=timeout,
+            max_retries=0,
+            api_key=os.getenv("OPENAI_API_KEY") # Passando a chave explicitamente
+        )
+    elif provider == "anthropic":
         log(f"Usando modelo Anthropic: {model_name}", cfg)
-        return AnthropicClaudeWrapper(
+        llm = AnthropicClaudeWrapper(
             model=model_name,
             max_tokens=cfg.max_tokens,
-            temperature=cfg.temperature
+            temperature=cfg.temperature,
+            timeout=timeout,
         )
+    else:
+        raise ValueError(f"provider inválido: {provider}")
 
-    # Fallback para um modelo padrão se o nome não for reconhecido OU se a inicialização falhar
-    log(f"⚠️ Modelo '{model_name}' não encontrado ou falhou ao inicializar. Usando fallback gpt-4o-mini.", cfg)
-    return ChatOpenAI(
-        model="gpt-4o-mini",
-        temperature=cfg.temperature,
-        max_tokens=cfg.max_tokens,
-        api_key=os.getenv("OPENAI_API_KEY")
-    )
+    _llm_clients[key] = llm
+    return llm
 
 
 def _extract_text_safely(response) -> str:
@@ -487,48 +517,66 @@ def _extract_text_safely(response) -> str:
 #     else:
 #         return ChatOpenAI(model_name=model, temperature=cfg.temperature, max_tokens=cfg.max_tokens)
 
-def summarize(text: str, llm: BaseLanguageModel, cfg: Config) -> str:
-    try:
-        resp = (SUMMARY_PT | llm).invoke({"texto": text})
+def _invoke_routed(task: str, default_model: str, prompt: str, cfg: Config) -> str:
+    """
+    Invoca o LLM da tarefa ('summary' | 'report') pelos tiers do roteador
+    (LLM_TIERS_SUMMARY / LLM_TIERS_REPORT), passando pelo cache de respostas.
+    Um retry do Celery que reemite o mesmo prompt não paga a chamada de novo.
+    """
+    tiers = model_router.tiers_for(task, default_model)
+    params = {"temperature": cfg.temperature, "max_tokens": cfg.max_tokens}
+    for tier in tiers:
+        cached = llm_cache.get(llm_cache.cache_key(tier.provider, tier.model, params, prompt))
+        if cached is not None:
+            return cached
+
+    def _call(tier: Tier) -> str:
+        llm = get_llm(tier.model, cfg, provider=tier.provider, timeout=tier.timeout)
+        # Se for o wrapper do Claude, ele quer {"prompt": ...}; caso contrário, passe string
+        if isinstance(llm, AnthropicClaudeWrapper):
+            resp = llm.invoke({"prompt": prompt})
+        else:
+            # ChatOpenAI (LangChain): aceita string diretamente
+            resp = llm.invoke(prompt)
         content = _extract_text_safely(resp)
-        return content.strip()
+        llm_cache.set(llm_cache.cache_key(tier.provider, tier.model, params, prompt), content)
+        return content
+
+    tier, content = model_router.route_sync(task, _call, tiers)
+    if tier != tiers[0]:
+        log(f"🔀 '{task}' atendido pelo tier {tier}", cfg)
+    return content
+
+def summarize(text: str, cfg: Config) -> str:
+    # erros do LLM propagam: o estágio do Celery entra em retry e nenhum
+    # texto de fallback chega ao cache de relatórios
+    try:
+        content = _invoke_routed("summary", cfg.summary_model, SUMMARY_PT.format(texto=text), cfg)
     except Exception as e:
         print(f"Erro na função summarize: {e}", file=sys.stderr)
-        return f"Documento processado com {len(text)} caracteres."
+        raise
+    return content.strip()
 
 
 from typing import Any
 
 def build_report(atos: str, process_number: Optional[str], cfg: Config) -> str:
-    try:
-        llm = get_llm(cfg.report_model, cfg)
-
-        instructions = (
-            INSTRUCOES_COM_PROCESSO.format(numero_processo=process_number)
-            if process_number else INSTRUCOES_SEM_PROCESSO
-        )
-        formatted_prompt = REPORT_PT.format(instr=instructions, linhas_atos=atos)
-
-        # Se for o wrapper do Claude, ele quer {"prompt": ...}; caso contrário, passe string
-        if isinstance(llm, AnthropicClaudeWrapper):
-            resp = llm.invoke({"prompt": formatted_prompt})
-        else:
-            # ChatOpenAI (LangChain): aceita string diretamente
-            resp = llm.invoke(formatted_prompt)
-
-        content = _extract_text_safely(resp)
-
-        if process_number and not content.strip().startswith(f"Processo nº {process_number}"):
-            content = f"Processo nº {process_number}\n\n{content.strip()}"
-
-        return content.strip()
+    instructions = (
+        INSTRUCOES_COM_PROCESSO.format(numero_processo=process_number)
+        if process_number else INSTRUCOES_SEM_PROCESSO
+    )
+    formatted_prompt = REPORT_PT.format(instr=instructions, linhas_atos=atos)
 
+    try:
+        content = _invoke_routed("report", cfg.report_model, formatted_prompt, cfg)
     except Exception as e:
         print(f"Erro na função build_report: {e}", file=sys.stderr)
-        if process_number:
-            return (f"Processo nº {process_number}\n\n"
-                    f"Relatório: Processo analisado com base nos atos processuais fornecidos.\n\n{atos}")
-        return f"Relatório: Processo analisado com base nos atos processuais fornecidos.\n\n{atos}"
+        raise
+
+    if process_number and not content.strip().startswith(f"Processo nº {process_number}"):
+        content = f"Processo nº {process_number}\n\n{content.strip()}"
+
+    return content.strip()
 
 def clean_textblock_artifacts(text: str) -> str:
     """
@@ -614,63 +662,107 @@ def clean_textblock_artifacts(text: str) -> str:
 def generate(
     pdf: Path,
     cfg: Config,
-    on_progress: Optional[Callable[[str], None]] = None
+    on_progress: Optional[Callable[[str], None]] = None,
+    digest: Optional[str] = None,
 ) -> str:
-    summary_llm = get_llm(cfg.summary_model, cfg)
-    
-    # ── CACHE (sem alterações) ──
-    digest = hashlib.sha256(pdf.read_bytes()).hexdigest()
-    cache_path = Path(f"/tmp/report_{digest}.txt")
-    if cache_path.exists():
+    # ── CACHE ──
+    # O upload já chega com o SHA-256 calculado durante a gravação; sem ele,
+    # calcula em blocos (sem carregar o PDF inteiro na memória).
+    digest = digest or sha256_file(pdf)
+    cache_path = report_cache_path(digest)
+
+    def _cached() -> Optional[str]:
+        return read_cached_report(digest)
+
+    cached = _cached()
+    if cached is not None:
         log("♻️  Usando relatório em cache", cfg)
         if on_progress: on_progress("♻️ Usando relatório em cache...")
-        return cache_path.read_text(encoding="utf-8")
-        
+        return cached
+
+    # ── SINGLE-FLIGHT ──
+    # Pedidos simultâneos do mesmo PDF (mesmo worker ou outros processos)
+    # acompanham o job em andamento em vez de repetir OCR + LLM.
+    return single_flight.run(
+        digest,
+        lambda progress: _generate(pdf, cfg, progress, cache_path),
+        on_progress=on_progress,
+        cached=_cached,
+    )
+
+
+def report_cache_path(digest: str) -> Path:
+    return REPORT_CACHE_DIR / f"report_{digest}.txt"
+
+
+def read_cached_report(digest: str) -> Optional[str]:
+    try:
+        return report_cache_path(digest).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+
+
+def prepare_summary_chunks(pages: List, cfg: Config) -> Tuple[List[Tuple[str, str]], Optional[str], Dict[str, str]]:
+    """Agrupa as páginas por peça e divide as seções grandes em partes para resumo."""
+    groups, process_number, section_id_map = group_pages(pages, cfg)
+
+    chunks_para_resumir: List[Tuple[str, str]] = []
+    for label, blocos in groups.items():
+        texto_secao = "\n".join(blocos)
+        if len(texto_secao) > cfg.fallback_chars:
+            parts = [texto_secao[i : i + cfg.fallback_chars] for i in range(0, len(texto_secao), cfg.fallback_chars)]
+        else:
+            parts = [texto_secao]
+        for part in parts:
+            chunks_para_resumir.append((label, part))
+    return chunks_para_resumir, process_number, section_id_map
+
+
+def summarize_section(label: str, texto: str, section_id_map: Dict[str, str], cfg: Config) -> str:
+    """Resume uma parte de seção e anexa o ID da peça, se conhecido."""
+    resumo = summarize(texto, cfg)
+    id_real = section_id_map.get(label)
+    if id_real: resumo = resumo.rstrip(".") + f" (ID {id_real})."
+    return clean_textblock_artifacts(resumo)
+
+
+def finalize_report(linhas: List[str], process_number: Optional[str], cfg: Config, cache_path: Path) -> str:
+    """
+    Constrói o relatório final a partir dos resumos (em ordem) e grava o cache.
+    Se o LLM falhar, a exceção sobe antes de qualquer escrita no cache.
+    """
+    atos = "\n".join(linhas)
+    report = build_report(atos, process_number, cfg)
+    report_limpo = clean_textblock_artifacts(report)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(report_limpo, encoding="utf-8")
+    os.replace(tmp_path, cache_path)  # atômico: quem espera nunca lê pela metade
+    return report_limpo
+
+
+def _generate(pdf: Path, cfg: Config, on_progress: Callable[[str], None], cache_path: Path) -> str:
     try:
-        # 1) NOVO: Extrai texto do PDF com OCR paralelo para páginas de imagem
+        # 1) Extrai texto do PDF com OCR paralelo para páginas de imagem
         pages = extract_text_from_pdf(pdf, cfg, on_progress)
 
-        # 2) Agrupa por peça e extrai número do processo (sem alterações)
-        groups, process_number, section_id_map = group_pages(pages, cfg)
+        # 2) Agrupa por peça, extrai número do processo e prepara os chunks
+        chunks_para_resumir, process_number, section_id_map = prepare_summary_chunks(pages, cfg)
         
         if process_number and on_progress:
             on_progress(f"📋 Processo nº {process_number} identificado")
-
-        # 3) Prepara os chunks para o resumo (sem alterações)
-        chunks_para_resumir: List[Tuple[str, str]] = []
-        for label, blocos in groups.items():
-            # ... (lógica de divisão de chunks grandes continua a mesma) ...
-            texto_secao = "\n".join(blocos)
-            if len(texto_secao) > cfg.fallback_chars:
-                parts = [texto_secao[i : i + cfg.fallback_chars] for i in range(0, len(texto_secao), cfg.fallback_chars)]
-            else:
-                parts = [texto_secao]
-            for pi, part in enumerate(parts, start=1):
-                chunks_para_resumir.append((label, part))
         
         if on_progress: on_progress(f"🧠 Resumindo {len(chunks_para_resumir)} partes do processo em paralelo...")
 
-        # 4) Paraleliza chamadas de resumo com ThreadPoolExecutor (sem alterações)
-        def _job(label_text: Tuple[str,str]) -> str:
-            label, texto = label_text
-            resumo = summarize(texto, summary_llm, cfg)
-            id_real = section_id_map.get(label)
-            if id_real: resumo = resumo.rstrip(".") + f" (ID {id_real})."
-            return clean_textblock_artifacts(resumo)
-
-        linhas: List[str] = []
+        # 3) Paraleliza chamadas de resumo com ThreadPoolExecutor
+        # pool.map preserva a ordem dos chunks: o prompt do relatório fica
+        # determinístico e um retry acerta o cache de respostas do LLM
         with ThreadPoolExecutor(max_workers=8) as pool: # Aumentado para 8 workers
-            futures = { pool.submit(_job, lt): lt for lt in chunks_para_resumir }
-            for fut in as_completed(futures):
-                linhas.append(fut.result())
-
-        atos = "\n".join(linhas)
+            linhas: List[str] = list(pool.map(lambda lt: summarize_section(lt[0], lt[1], section_id_map, cfg), chunks_para_resumir))
 
-        # 5) Construção do relatório final (sem alterações)
+        # 4) Construção do relatório final
         if on_progress: on_progress("⚙️ Construindo relatório final...")
-        report = build_report(atos, process_number, cfg)
-        report_limpo = clean_textblock_artifacts(report)
-        cache_path.write_text(report_limpo, encoding="utf-8")
+        report_limpo = finalize_report(linhas, process_number, cfg, cache_path)
         
         if on_progress: on_progress("✅ Relatório pronto!")
         return report_limpo
@@ -0,0 +1,182 @@
+"""
+Armazenamento dos arquivos gerados (sentença em DOCX, ZIP de referências)
+servidos por GET /download/{tipo}/{arquivo}.
+
+Uma raiz só (ARTIFACT_DIR, no volume compartilhado entre API e workers no
+docker-compose): o que a rota HTTP e a task Celery gravam é baixável por
+qualquer réplica da API. A gravação é atômica (arquivo temporário + rename),
+então um download nunca vê um arquivo pela metade. gc() remove os artefatos
+que passaram de ARTIFACT_TTL, alinhado por padrão à expiração dos resultados.
+
+Artefatos preguiçosos: registrar() grava só os dados de entrada (um JSON ao
+lado do caminho final) e materializar() gera o arquivo no primeiro download,
+uma vez só mesmo com downloads simultâneos (single-flight por artefato).
+Quem nunca baixa a sentença não paga a renderização do DOCX.
+"""
+import os
+import re
+import json
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from services import single_flight
+
+ARTIFACT_DIR = Path(os.getenv("ARTIFACT_DIR", "/tmp/outputs/artifacts"))
+ARTIFACT_TTL = int(os.getenv("ARTIFACT_TTL", str(24 * 60 * 60)))  # = CeleryConfig.RESULT_EXPIRES
+
+# tipo → (extensão, media type)
+TIPOS = {
+    "sentenca": (".docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    "referencias": (".zip", "application/zip"),
+}
+
+_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,200}$")
+
+
+class ArtifactNotFound(FileNotFoundError):
+    """Tipo/nome inválido, artefato inexistente ou já removido pelo gc."""
+
+
+def novo_id(nome_base: str) -> str:
+    """Id único a partir do nome amigável (ex.: sentenca_<processo>_<data>)."""
+    nome_base = re.sub(r"[^A-Za-z0-9_-]", "_", nome_base)[:150]
+    return f"{nome_base}_{uuid.uuid4().hex[:8]}"
+
+
+def nome_arquivo(tipo: str, artifact_id: str) -> str:
+    return f"{artifact_id}{TIPOS[tipo][0]}"
+
+
+def url(tipo: str, artifact_id: str) -> str:
+    return f"/download/{tipo}/{nome_arquivo(tipo, artifact_id)}"
+
+
+def media_type(tipo: str) -> str:
+    return TIPOS[tipo][1]
+
+
+def _path(tipo: str, artifact_id: str) -> Path:
+    if tipo not in TIPOS or not _ID_RE.match(artifact_id):
+        raise ArtifactNotFound(f"Artefato inválido: {tipo}/{artifact_id}")
+    return ARTIFACT_DIR / tipo / nome_arquivo(tipo, artifact_id)
+
+
+def gravar(tipo: str, artifact_id: str, escrever: Callable[[str], None]) -> Path:
+    """
+    Chama escrever(caminho_temporario) e publica o arquivo no lugar final
+    com rename atômico. Retorna o caminho final.
+    """
+    return _publicar(_path(tipo, artifact_id), escrever)
+
+
+def _publicar(destino: Path, escrever: Callable[[str], None]) -> Path:
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    tmp = destino.with_name(f".{destino.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        escrever(str(tmp))
+        os.replace(tmp, destino)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return destino
+
+
+def _resolver(tipo: str, arquivo: str) -> Path:
+    if tipo not in TIPOS:
+        raise ArtifactNotFound(f"Tipo de artefato desconhecido: {tipo}")
+    ext = TIPOS[tipo][0]
+    if not arquivo.endswith(ext):
+        raise ArtifactNotFound(f"Artefato inválido: {tipo}/{arquivo}")
+    return _path(tipo, arquivo[: -len(ext)])
+
+
+def local_path(tipo: str, arquivo: str) -> Path:
+    """Caminho do artefato pedido como '<id><ext>' (o nome que aparece na URL)."""
+    path = _resolver(tipo, arquivo)
+    if not path.is_file():
+        raise ArtifactNotFound(f"Artefato não encontrado: {tipo}/{arquivo}")
+    return path
+
+
+def _spec_path(path: Path) -> Path:
+    return path.with_name(f"{path.name}.spec.json")
+
+
+def _json_default(v: Any) -> Any:
+    # escalares numpy (scores do rerank) e afins
+    if hasattr(v, "item"):
+        return v.item()
+    return str(v)
+
+
+def registrar(tipo: str, artifact_id: str, spec: Dict[str, Any]) -> str:
+    """Registra um artefato a ser gerado no primeiro download; retorna a URL."""
+    dados = json.dumps(spec, ensure_ascii=False, default=_json_default)
+    _publicar(_spec_path(_path(tipo, artifact_id)), lambda tmp: Path(tmp).write_text(dados, encoding="utf-8"))
+    return url(tipo, artifact_id)
+
+
+def materializar(
+    tipo: str,
+    arquivo: str,
+    renderizar: Callable[[str, Dict[str, Any], str], None],
+) -> Path:
+    """
+    Caminho do artefato pedido na URL, gerando-o antes se ainda for só um
+    registro: renderizar(tipo, spec, caminho) escreve o arquivo.
+    """
+    destino = _resolver(tipo, arquivo)
+    if destino.is_file():
+        return destino
+    spec_path = _spec_path(destino)
+    if not spec_path.is_file():
+        raise ArtifactNotFound(f"Artefato não encontrado: {tipo}/{arquivo}")
+
+    def gerar(progress) -> str:
+        spec = json.loads(spec_path.read_text(encoding="utf-8"))
+        _publicar(destino, lambda tmp: renderizar(tipo, spec, tmp))
+        return str(destino)
+
+    def pronto() -> Optional[str]:
+        return str(destino) if destino.is_file() else None
+
+    return Path(single_flight.run(f"artifact_{tipo}_{destino.name}", gerar, cached=pronto))
+
+
+def etag(st: os.stat_result) -> str:
+    """ETag forte: artefatos nunca são reescritos (cada geração recebe um id novo)."""
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def gc(ttl: int = ARTIFACT_TTL) -> int:
+    """Remove artefatos (registros e temporários órfãos incluídos) mais antigos que ttl segundos."""
+    removed = 0
+    if not ARTIFACT_DIR.exists():
+        return removed
+    limite = time.time() - ttl
+    for path in ARTIFACT_DIR.glob("*/*"):
+        try:
+            if path.stat().st_mtime < limite:
+                path.unlink()
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+__all__ = [
+    "ArtifactNotFound",
+    "ARTIFACT_DIR",
+    "ARTIFACT_TTL",
+    "novo_id",
+    "nome_arquivo",
+    "url",
+    "media_type",
+    "gravar",
+    "registrar",
+    "local_path",
+    "materializar",
+    "etag",
+    "gc",
+]
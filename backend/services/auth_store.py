@@ -0,0 +1,123 @@
+"""
+Camada de dados da autenticação por código (services/auth).
+
+Cada fluxo é um único comando SQL (CTEs encadeadas), uma ida ao banco só:
+  - solicitar_codigo: busca o usuário, aplica o intervalo mínimo entre
+    pedidos, grava o código e enfileira o e-mail (mail_outbox);
+  - consumir_codigo: busca o código mais recente do usuário, marca como
+    consumido se ainda vale e grava o last_login_iat da nova sessão.
+O asyncpg prepara e guarda os comandos por conexão (statement cache do pool).
+
+Workers: purge() apaga códigos vencidos/consumidos há mais de
+LOGIN_CODE_RETENTION segundos (agendada no beat).
+"""
+import os
+from typing import Optional
+
+import asyncpg
+
+from database.postgres_sync import psycopg2, sync_cursor
+
+LOGIN_CODE_RETENTION = int(os.getenv("LOGIN_CODE_RETENTION", str(24 * 60 * 60)))
+
+SOLICITAR_SQL = """
+WITH usuario AS (
+    SELECT id FROM app_user WHERE email = $1 AND is_active
+), recente AS (
+    SELECT 1 FROM login_code c JOIN usuario u ON c.user_id = u.id
+     WHERE c.created_at > now() - make_interval(secs => $4)
+     LIMIT 1
+), novo AS (
+    INSERT INTO login_code (user_id, code, expires_at, request_ip)
+    SELECT id, $2, now() + make_interval(mins => $5), $3::inet FROM usuario
+     WHERE NOT EXISTS (SELECT 1 FROM recente)
+    RETURNING user_id
+), email AS (
+    INSERT INTO mail_outbox (to_addr, subject, body)
+    SELECT $1, $6, $7 FROM novo
+     WHERE $7::text IS NOT NULL
+    RETURNING id
+)
+SELECT (SELECT id FROM usuario)          AS user_id,
+       EXISTS (SELECT 1 FROM novo)       AS criado,
+       EXISTS (SELECT 1 FROM email)      AS enfileirado
+"""
+
+CONSUMIR_SQL = """
+WITH usuario AS (
+    SELECT id FROM app_user WHERE email = $1 AND is_active
+), codigo AS (
+    SELECT c.id, c.user_id, c.expires_at, c.consumed_at
+      FROM login_code c JOIN usuario u ON c.user_id = u.id
+     WHERE c.code = $2
+     ORDER BY c.created_at DESC
+     LIMIT 1
+       FOR UPDATE OF c
+), consumido AS (
+    UPDATE login_code SET consumed_at = now()
+      FROM codigo
+     WHERE login_code.id = codigo.id
+       AND codigo.consumed_at IS NULL
+       AND codigo.expires_at >= now()
+    RETURNING login_code.user_id
+), sessao AS (
+    UPDATE app_user SET last_login_iat = $3
+      FROM consumido
+     WHERE app_user.id = consumido.user_id
+    RETURNING app_user.id
+)
+SELECT (SELECT id FROM usuario)                  AS user_id,
+       EXISTS (SELECT 1 FROM codigo)             AS encontrado,
+       (SELECT consumed_at FROM codigo)          AS consumed_at,
+       (SELECT expires_at FROM codigo)           AS expires_at,
+       EXISTS (SELECT 1 FROM sessao)             AS autenticado
+"""
+
+
+async def solicitar_codigo(
+    conn: asyncpg.Connection,
+    email: str,
+    code: str,
+    ip: Optional[str],
+    intervalo_min: int,
+    ttl_min: int,
+    assunto: str,
+    corpo: Optional[str],
+) -> asyncpg.Record:
+    """
+    (user_id, criado, enfileirado): user_id None se o e-mail não está
+    cadastrado; criado False se houve pedido há menos de intervalo_min
+    segundos. Com corpo=None o código é gravado mas nenhum e-mail é enfileirado.
+    """
+    return await conn.fetchrow(SOLICITAR_SQL, email, code, ip, intervalo_min, ttl_min, assunto, corpo)
+
+
+async def consumir_codigo(conn: asyncpg.Connection, email: str, code: str, iat: int) -> asyncpg.Record:
+    """
+    (user_id, encontrado, consumed_at, expires_at, autenticado): autenticado True só se
+    o código existia, não tinha sido usado e não venceu; aí last_login_iat = iat.
+    """
+    return await conn.fetchrow(CONSUMIR_SQL, email, code, iat)
+
+
+def purge(older_than: int = LOGIN_CODE_RETENTION) -> int:
+    """Remove códigos vencidos ou consumidos há mais de older_than segundos."""
+    if psycopg2 is None:
+        return 0
+    try:
+        with sync_cursor() as cur:
+            cur.execute(
+                """
+                DELETE FROM login_code
+                 WHERE expires_at < now() - make_interval(secs => %s)
+                    OR consumed_at < now() - make_interval(secs => %s)
+                """,
+                (older_than, older_than),
+            )
+            return cur.rowcount
+    except psycopg2.Error as e:
+        print(f"⚠️ Falha ao limpar códigos de login: {e}")
+        return 0
+
+
+__all__ = ["LOGIN_CODE_RETENTION", "solicitar_codigo", "consumir_codigo", "purge"]
@@ -0,0 +1,184 @@
+"""
+Lotes de PDFs: um job de relatório por arquivo, agrupados por batch_id.
+
+A API grava o lote e os itens (PENDING) no Postgres e chama o despachante.
+O despachante (task Celery, disparada na criação do lote, ao fim de cada job
+e periodicamente pelo beat) enfileira no máximo BATCH_MAX_INFLIGHT jobs de
+lote ao mesmo tempo, em prioridade de lote: um lote de centenas de autos não
+inunda as filas de OCR/LLM nem passa à frente dos pedidos interativos.
+"""
+import os
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import asyncpg
+
+from database.postgres import _dsn_from_env, conexao, transacao
+from database.postgres_sync import sync_cursor
+
+BATCH_MAX_INFLIGHT = int(os.getenv("BATCH_MAX_INFLIGHT", "4"))
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "500"))
+
+# Estados de item: PENDING (aguardando vaga) → QUEUED (enfileirado) → SUCCESS | FAILURE
+CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS batch_job (
+    id         TEXT PRIMARY KEY,
+    total      INT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS batch_item (
+    batch_id   TEXT NOT NULL REFERENCES batch_job(id) ON DELETE CASCADE,
+    idx        INT NOT NULL,
+    filename   TEXT NOT NULL,
+    blob_key   TEXT NOT NULL,
+    task_id    TEXT,
+    status     TEXT NOT NULL DEFAULT 'PENDING',
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (batch_id, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_batch_item_ativos
+    ON batch_item(status) WHERE status IN ('PENDING', 'QUEUED');
+"""
+
+# Chave do advisory lock: um despachante por vez no cluster
+_DISPATCH_LOCK = 0x5D1_0BA7
+
+
+async def ensure_batch_schema():
+    """Cria as tabelas de lote (conexão efêmera, roda no mestre)."""
+    conn = await asyncpg.connect(dsn=_dsn_from_env())
+    try:
+        await conn.execute(CREATE_SQL)
+    finally:
+        await conn.close()
+
+
+# ────────────────────────────── lado da API ──────────────────────────────
+async def criar_lote(itens: List[Tuple[str, str]]) -> str:
+    """Grava o lote com os itens (filename, blob_key) e retorna o batch_id."""
+    batch_id = uuid.uuid4().hex
+    async with transacao() as conn:
+        await conn.execute("INSERT INTO batch_job (id, total) VALUES ($1, $2)", batch_id, len(itens))
+        await conn.executemany(
+            "INSERT INTO batch_item (batch_id, idx, filename, blob_key) VALUES ($1, $2, $3, $4)",
+            [(batch_id, i, nome, key) for i, (nome, key) in enumerate(itens)],
+        )
+    return batch_id
+
+
+async def status_lote(batch_id: str) -> Optional[List[asyncpg.Record]]:
+    """Itens do lote com o último progresso de cada job (None se o lote não existe)."""
+    async with conexao() as conn:
+        if not await conn.fetchval("SELECT 1 FROM batch_job WHERE id=$1", batch_id):
+            return None
+        return await conn.fetch(
+            """
+            SELECT i.idx, i.filename, i.task_id, i.status, p.progress
+              FROM batch_item i
+              LEFT JOIN task_progress p ON p.task_id = i.task_id
+             WHERE i.batch_id = $1
+             ORDER BY i.idx
+            """,
+            batch_id,
+        )
+
+
+# ───────────────────────────── lado do worker ─────────────────────────────
+def despachar(
+    estado: Callable[[str], str],
+    enfileirar: Callable[[str, str, str], None],
+    max_inflight: int = BATCH_MAX_INFLIGHT,
+) -> Dict[str, int]:
+    """
+    Atualiza o estado dos itens enfileirados e preenche as vagas livres.
+
+    estado(task_id) -> estado Celery; enfileirar(task_id, blob_key, filename)
+    publica o job. Os itens são marcados QUEUED (com task_id pré-gerado) antes
+    de publicar; se a publicação falhar, voltam a PENDING.
+    """
+    with sync_cursor(transaction=True) as cur:
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (_DISPATCH_LOCK,))
+        if not cur.fetchone()[0]:
+            return {"concluidos": 0, "enfileirados": 0}
+
+        cur.execute("SELECT batch_id, idx, task_id FROM batch_item WHERE status = 'QUEUED'")
+        concluidos = 0
+        em_voo = 0
+        for batch_id, idx, task_id in cur.fetchall():
+            st = estado(task_id)
+            if st in ("SUCCESS", "FAILURE", "REVOKED"):
+                cur.execute(
+                    "UPDATE batch_item SET status=%s, updated_at=now() WHERE batch_id=%s AND idx=%s",
+                    ("SUCCESS" if st == "SUCCESS" else "FAILURE", batch_id, idx),
+                )
+                concluidos += 1
+            else:
+                em_voo += 1
+
+        vagas = max(0, max_inflight - em_voo)
+        novos: List[Tuple[str, int, str, str, str]] = []
+        if vagas:
+            cur.execute(
+                """
+                SELECT i.batch_id, i.idx, i.blob_key, i.filename
+                  FROM batch_item i JOIN batch_job b ON b.id = i.batch_id
+                 WHERE i.status = 'PENDING'
+                 ORDER BY b.created_at, i.idx
+                 LIMIT %s
+                """,
+                (vagas,),
+            )
+            for batch_id, idx, blob_key, filename in cur.fetchall():
+                task_id = uuid.uuid4().hex
+                cur.execute(
+                    "UPDATE batch_item SET status='QUEUED', task_id=%s, updated_at=now() "
+                    "WHERE batch_id=%s AND idx=%s",
+                    (task_id, batch_id, idx),
+                )
+                novos.append((batch_id, idx, task_id, blob_key, filename))
+
+    # publica só depois do COMMIT: o job nunca termina antes de o item existir como QUEUED
+    enfileirados = 0
+    for batch_id, idx, task_id, blob_key, filename in novos:
+        try:
+            enfileirar(task_id, blob_key, filename)
+            enfileirados += 1
+        except Exception as e:
+            print(f"⚠️ Falha ao enfileirar {filename} do lote {batch_id}: {e}")
+            with sync_cursor() as cur:
+                cur.execute(
+                    "UPDATE batch_item SET status='PENDING', task_id=NULL WHERE batch_id=%s AND idx=%s",
+                    (batch_id, idx),
+                )
+    return {"concluidos": concluidos, "enfileirados": enfileirados}
+
+
+def purge(older_than: int) -> int:
+    """Remove lotes criados há mais de older_than segundos (itens em cascata)."""
+    with sync_cursor() as cur:
+        cur.execute(
+            "DELETE FROM batch_job WHERE created_at < now() - make_interval(secs => %s)",
+            (older_than,),
+        )
+        return cur.rowcount
+
+
+def resumo(itens: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Contagem agregada por estado."""
+    contagem = {"total": len(itens), "pendentes": 0, "em_andamento": 0, "concluidos": 0, "falhas": 0}
+    chave = {"PENDING": "pendentes", "QUEUED": "em_andamento", "SUCCESS": "concluidos", "FAILURE": "falhas"}
+    for item in itens:
+        contagem[chave.get(item["status"], "em_andamento")] += 1
+    return contagem
+
+
+__all__ = [
+    "BATCH_MAX_INFLIGHT",
+    "MAX_BATCH_FILES",
+    "ensure_batch_schema",
+    "criar_lote",
+    "status_lote",
+    "despachar",
+    "purge",
+    "resumo",
+]
@@ -0,0 +1,166 @@
+"""
+Blob store endereçado por conteúdo para payloads grandes (PDFs, DOCX de
+referência) trocados entre a API e os workers Celery.
+
+A API grava o arquivo uma vez e enfileira só a chave (SHA-256 do conteúdo);
+o worker busca pela chave. Assim as mensagens JSON do RabbitMQ ficam com
+poucos bytes, qualquer que seja o tamanho do arquivo.
+
+Backends:
+  - local (padrão): diretório em BLOB_DIR, no volume compartilhado entre API
+    e workers no docker-compose;
+  - s3: qualquer serviço compatível (MinIO local, S3), ativado com
+    BLOB_S3_BUCKET (boto3 opcional; BLOB_S3_ENDPOINT para o MinIO).
+
+Blobs não são apagados ao fim da task (a mesma chave pode estar em uso por
+outro job do mesmo conteúdo): gc() remove os que passaram de BLOB_TTL,
+alinhado por padrão à expiração dos resultados do Celery.
+"""
+import os
+import time
+import shutil
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+from utils import sha256_file
+
+try:
+    import boto3
+except ImportError:  # boto3 só é necessário com BLOB_S3_BUCKET
+    boto3 = None
+
+BLOB_DIR = Path(os.getenv("BLOB_DIR", "/tmp/uploads/blobs"))
+BLOB_TTL = int(os.getenv("BLOB_TTL", str(24 * 60 * 60)))  # = CeleryConfig.RESULT_EXPIRES
+BLOB_S3_BUCKET = os.getenv("BLOB_S3_BUCKET")
+BLOB_S3_ENDPOINT = os.getenv("BLOB_S3_ENDPOINT")
+BLOB_S3_PREFIX = os.getenv("BLOB_S3_PREFIX", "blobs/")
+
+
+class BlobNotFound(FileNotFoundError):
+    """Chave inexistente ou já coletada pelo gc."""
+
+
+def _local_path(key: str) -> Path:
+    if len(key) != 64 or not all(c in "0123456789abcdef" for c in key):
+        raise ValueError(f"Chave de blob inválida: {key!r}")
+    return BLOB_DIR / key[:2] / key
+
+
+_s3_client = None
+
+
+def _s3():
+    global _s3_client
+    if _s3_client is None:
+        if boto3 is None:
+            raise RuntimeError("BLOB_S3_BUCKET definido, mas boto3 não está instalado")
+        _s3_client = boto3.client("s3", endpoint_url=BLOB_S3_ENDPOINT)
+    return _s3_client
+
+
+def put_file(src: Path, sha256: Optional[str] = None, move: bool = True) -> str:
+    """
+    Armazena o arquivo e retorna a chave. Com `move`, o arquivo local é
+    movido (mesmo volume: só um rename) e deixa de existir em `src`.
+    """
+    key = sha256 or sha256_file(Path(src))
+    if BLOB_S3_BUCKET:
+        _s3().upload_file(str(src), BLOB_S3_BUCKET, BLOB_S3_PREFIX + key)
+        if move:
+            Path(src).unlink(missing_ok=True)
+        return key
+
+    dest = _local_path(key)
+    if dest.exists():
+        os.utime(dest)  # renova o TTL do conteúdo já armazenado
+        if move:
+            Path(src).unlink(missing_ok=True)
+        return key
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f"{key}.{os.getpid()}.tmp")
+    if move:
+        shutil.move(str(src), tmp)
+    else:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+    return key
+
+
+def put_bytes(data: bytes) -> str:
+    """Armazena bytes já em memória (ex.: DOCX pequenos) e retorna a chave."""
+    key = hashlib.sha256(data).hexdigest()
+    if BLOB_S3_BUCKET:
+        _s3().put_object(Bucket=BLOB_S3_BUCKET, Key=BLOB_S3_PREFIX + key, Body=data)
+        return key
+    dest = _local_path(key)
+    if dest.exists():
+        os.utime(dest)
+        return key
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f"{key}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, dest)
+    return key
+
+
+def local_path(key: str) -> Path:
+    """
+    Caminho local do blob para leitura. No backend s3, baixa para BLOB_DIR
+    (cache local do worker) na primeira vez.
+    """
+    path = _local_path(key)
+    if path.exists():
+        return path
+    if not BLOB_S3_BUCKET:
+        raise BlobNotFound(f"Blob {key} não encontrado (expirado?)")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{key}.{os.getpid()}.tmp")
+    try:
+        _s3().download_file(BLOB_S3_BUCKET, BLOB_S3_PREFIX + key, str(tmp))
+    except Exception as e:
+        tmp.unlink(missing_ok=True)
+        raise BlobNotFound(f"Blob {key} não encontrado no bucket: {e}") from e
+    os.replace(tmp, path)
+    return path
+
+
+def get_bytes(key: str) -> bytes:
+    """Conteúdo do blob em memória."""
+    return local_path(key).read_bytes()
+
+
+def delete(key: str) -> None:
+    _local_path(key).unlink(missing_ok=True)
+    if BLOB_S3_BUCKET:
+        _s3().delete_object(Bucket=BLOB_S3_BUCKET, Key=BLOB_S3_PREFIX + key)
+
+
+def gc(ttl: int = BLOB_TTL) -> int:
+    """Remove blobs locais mais antigos que ttl segundos; retorna quantos."""
+    removed = 0
+    if not BLOB_DIR.exists():
+        return removed
+    limite = time.time() - ttl
+    for path in BLOB_DIR.glob("*/*"):
+        try:
+            if path.stat().st_mtime < limite:
+                path.unlink()
+                removed += 1
+        except OSError:
+            pass
+    # No s3, a expiração fica a cargo da lifecycle rule do bucket (prefixo BLOB_S3_PREFIX)
+    return removed
+
+
+__all__ = [
+    "BlobNotFound",
+    "put_file",
+    "put_bytes",
+    "local_path",
+    "get_bytes",
+    "delete",
+    "gc",
+    "BLOB_DIR",
+    "BLOB_TTL",
+]
@@ -0,0 +1,95 @@
+"""
+Checkpoints de estágio das tasks Celery, por (job_id, estágio), no Postgres.
+
+Um retry do Celery reexecuta a task inteira com o mesmo id; com run_stage()
+cada estágio concluído (OCR, busca, chamada paga ao LLM...) devolve a saída
+gravada e a task recomeça no primeiro estágio incompleto. A saída precisa
+ser serializável em JSON.
+"""
+import json
+from typing import Any, Callable, Optional, TypeVar
+
+from database.postgres_sync import sync_cursor
+
+T = TypeVar("T")
+
+CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS task_checkpoint (
+    job_id     TEXT NOT NULL,
+    stage      TEXT NOT NULL,
+    payload    JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (job_id, stage)
+);
+CREATE INDEX IF NOT EXISTS idx_task_checkpoint_created ON task_checkpoint(created_at);
+"""
+
+_schema_ok = False
+_MISSING = object()
+
+
+def _json_default(v: Any) -> Any:
+    # escalares numpy (scores do rerank) e afins
+    if hasattr(v, "item"):
+        return v.item()
+    return str(v)
+
+
+def _cursor():
+    global _schema_ok
+    ctx = sync_cursor()
+    if not _schema_ok:
+        with sync_cursor() as cur:
+            cur.execute(CREATE_SQL)
+        _schema_ok = True
+    return ctx
+
+
+def load(job_id: str, stage: str, default: Any = None) -> Any:
+    """Saída gravada do estágio, ou default se ainda não concluído."""
+    with _cursor() as cur:
+        cur.execute("SELECT payload FROM task_checkpoint WHERE job_id=%s AND stage=%s", (job_id, stage))
+        row = cur.fetchone()
+    return default if row is None else row[0]
+
+
+def save(job_id: str, stage: str, value: Any) -> None:
+    with _cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO task_checkpoint (job_id, stage, payload) VALUES (%s, %s, %s::jsonb)
+            ON CONFLICT (job_id, stage) DO UPDATE SET payload = EXCLUDED.payload, created_at = now()
+            """,
+            (job_id, stage, json.dumps(value, ensure_ascii=False, default=_json_default)),
+        )
+
+
+def run_stage(job_id: str, stage: str, fn: Callable[[], T], on_resume: Optional[Callable[[str], None]] = None) -> T:
+    """Executa fn() só se o estágio ainda não tiver checkpoint; grava a saída."""
+    value = load(job_id, stage, _MISSING)
+    if value is not _MISSING:
+        if on_resume:
+            on_resume(stage)
+        return value
+    value = fn()
+    save(job_id, stage, value)
+    return value
+
+
+def clear(job_id: str) -> None:
+    """Descarta os checkpoints do job (chamar quando ele termina com sucesso)."""
+    with _cursor() as cur:
+        cur.execute("DELETE FROM task_checkpoint WHERE job_id=%s", (job_id,))
+
+
+def purge(older_than: int) -> int:
+    """Remove checkpoints de jobs abandonados há mais de older_than segundos."""
+    with _cursor() as cur:
+        cur.execute(
+            "DELETE FROM task_checkpoint WHERE created_at < now() - make_interval(secs => %s)",
+            (older_than,),
+        )
+        return cur.rowcount
+
+
+__all__ = ["load", "save", "run_stage", "clear", "purge"]
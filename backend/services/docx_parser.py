@@ -1,22 +1,40 @@
+import os
+import zipfile
 from io import BytesIO
-from typing import Dict, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Sequence, Union
+
+from lxml import etree
 from docx import Document
 
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_W_P = f"{{{W_NS}}}p"
+_W_BODY = f"{{{W_NS}}}body"
+# Runs do parágrafo como o python-docx os enxerga (fora de caixas de texto/desenhos)
+_RUNS = etree.XPath(
+    "./w:r | ./w:hyperlink/w:r | ./w:ins/w:r | ./w:smartTag/w:r",
+    namespaces={"w": W_NS},
+)
+_TEXTO_RUN = {f"{{{W_NS}}}t": None, f"{{{W_NS}}}tab": "\t", f"{{{W_NS}}}br": "\n", f"{{{W_NS}}}cr": "\n"}
 
-def _parse_document(doc: Document) -> Dict[str, str]:
+DOCX_PARSE_WORKERS = int(os.getenv("DOCX_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+_executor = ThreadPoolExecutor(max_workers=DOCX_PARSE_WORKERS, thread_name_prefix="docx-parse")
+
+
+def _secoes(paragrafos: Iterable[str]) -> Dict[str, str]:
     """
-    Extrai seções 'relatorio', 'fundamentacao' e 'dispositivo' de um Document do python-docx.
+    Extrai seções 'relatorio', 'fundamentacao' e 'dispositivo' de uma sequência de parágrafos.
     Retorna um dicionário com as chaves:
       - 'relatorio'
       - 'fundamentacao'
       - 'dispositivo'
     Cada valor é o texto concatenado da respectiva seção.
     """
-    secoes = {"relatorio": "", "fundamentacao": "", "dispositivo": ""}
+    secoes: Dict[str, List[str]] = {"relatorio": [], "fundamentacao": [], "dispositivo": []}
     secao_atual: Union[str, None] = None
 
-    for para in doc.paragraphs:
-        texto = para.text.strip()
+    for texto in paragrafos:
+        texto = texto.strip()
         if not texto:
             continue
 
@@ -34,9 +52,50 @@ def _parse_document(doc: Document) -> Dict[str, str]:
 
         # Adiciona texto à seção atual
         if secao_atual:
-            secoes[secao_atual] += texto + "\n"
+            secoes[secao_atual].append(texto + "\n")
+
+    return {nome: "".join(partes) for nome, partes in secoes.items()}
 
-    return secoes
+
+def _parse_document(doc: Document) -> Dict[str, str]:
+    """Extrai as seções de um Document do python-docx (caminho de fallback)."""
+    return _secoes(para.text for para in doc.paragraphs)
+
+
+def _texto_paragrafo(p: etree._Element) -> str:
+    partes = []
+    for run in _RUNS(p):
+        for filho in run:
+            if filho.tag in _TEXTO_RUN:
+                fixo = _TEXTO_RUN[filho.tag]
+                partes.append((filho.text or "") if fixo is None else fixo)
+    return "".join(partes)
+
+
+def _iter_paragrafos(origem: Union[str, BinaryIO]) -> Iterator[str]:
+    """
+    Texto dos parágrafos do corpo lendo word/document.xml em streaming direto
+    do ZIP: cada parágrafo é descartado assim que lido, sem montar a árvore toda.
+    """
+    with zipfile.ZipFile(origem) as zf, zf.open("word/document.xml") as xml:
+        for _, p in etree.iterparse(xml, events=("end",), tag=_W_P, huge_tree=True):
+            pai = p.getparent()
+            if pai is None or pai.tag != _W_BODY:
+                continue  # parágrafos de tabelas: o python-docx também os ignora
+            yield _texto_paragrafo(p)
+            # libera o parágrafo e tudo que veio antes dele no corpo (tabelas inclusive)
+            p.clear()
+            while p.getprevious() is not None:
+                del pai[0]
+
+
+def _parse(origem: Union[str, BinaryIO], fallback) -> Dict[str, str]:
+    try:
+        return _secoes(_iter_paragrafos(origem))
+    except (zipfile.BadZipFile, KeyError, etree.XMLSyntaxError) as e:
+        # DOCX fora do padrão: o python-docx é mais tolerante (ou dá o erro certo)
+        print(f"⚠️ Parser rápido de DOCX falhou ({e}); usando python-docx")
+        return _parse_document(fallback())
 
 
 def parse_docx_file(path: str) -> Dict[str, str]:
@@ -46,8 +105,7 @@ def parse_docx_file(path: str) -> Dict[str, str]:
     :param path: caminho para o arquivo .docx
     :return: dict com as seções extraídas
     """
-    doc = Document(path)
-    return _parse_document(doc)
+    return _parse(path, lambda: Document(path))
 
 
 def parse_docx_bytes(data: bytes) -> Dict[str, str]:
@@ -57,5 +115,14 @@ def parse_docx_bytes(data: bytes) -> Dict[str, str]:
     :param data: conteúdo binário do .docx
     :return: dict com as seções extraídas
     """
-    doc = Document(BytesIO(data))
-    return _parse_document(doc)
+    return _parse(BytesIO(data), lambda: Document(BytesIO(data)))
+
+
+def parse_docx_many(arquivos: Sequence[bytes]) -> List[Dict[str, str]]:
+    """
+    Extrai as seções de vários .docx em paralelo (o lxml libera o GIL durante
+    o parse), na ordem recebida. O primeiro erro é propagado.
+    """
+    if len(arquivos) <= 1:
+        return [parse_docx_bytes(data) for data in arquivos]
+    return list(_executor.map(parse_docx_bytes, arquivos))
@@ -0,0 +1,324 @@
+"""
+Renderização dos DOCX da sentença e das referências em memória.
+
+Os documentos saem de um template-base com o estilo do TJPE (A4, margens,
+Times New Roman, títulos em preto), carregado uma vez por processo: as partes
+fixas do pacote (estilos, numeração, tema...) ficam em memória como bytes e o
+word/document.xml fica parseado. Cada renderização copia essa árvore, insere
+os parágrafos de uma vez a partir de protótipos e regrava só o document.xml,
+sem reabrir o template nem montar o documento parágrafo a parágrafo pelo
+python-docx. DOCX_TEMPLATE_PATH aponta para um template próprio do tribunal
+(precisa ter os estilos Normal e Heading1..3).
+
+Os bytes vão direto para o destino (arquivo do artefato ou do ZIP), sem
+arquivos intermediários em /tmp. renderizar() é o ponto de entrada dos artefatos
+preguiçosos (services/artifacts.py): a API e os workers só registram os
+dados, e o DOCX/ZIP é gerado no primeiro download.
+"""
+import os
+import re
+import copy
+import zipfile
+import threading
+from io import BytesIO
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from lxml import etree
+
+DOCX_TEMPLATE_PATH = os.getenv("DOCX_TEMPLATE_PATH")
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+# Tipos de bloco → (estilo, alinhamento, negrito)
+_FORMATOS = {
+    "titulo": ("Heading1", "center", False),
+    "processo": ("Normal", "center", True),
+    "secao": ("Heading2", None, False),
+    "subsecao": ("Heading3", None, False),
+    "texto": ("Normal", None, False),
+    "vazio": ("Normal", None, False),
+}
+
+Bloco = Tuple[str, str]  # (tipo, texto)
+
+# Caracteres que o XML não aceita (vêm às vezes do OCR/LLM)
+_XML_INVALIDO = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+# Quebra de linha e tabulação dentro do parágrafo viram <w:br/> e <w:tab/>
+# (como no add_paragraph do python-docx); no <w:t> o Word as mostraria como espaço
+_QUEBRAS_RE = re.compile(r"(\r\n|[\r\n\t])")
+_SECAO_RE = re.compile(r"(?:FUNDAMENTAÇÃO|DISPOSITIVO|MÉRITO)", re.IGNORECASE)
+_TEM_SECOES_RE = re.compile(r"FUNDAMENTAÇÃO|DISPOSITIVO", re.IGNORECASE)
+
+
+def _w(tag: str) -> str:
+    return f"{{{W_NS}}}{tag}"
+
+
+def _template_padrao() -> bytes:
+    """Template-base com o estilo do TJPE, montado uma vez a partir do padrão do python-docx."""
+    from docx import Document
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Inches, Pt, RGBColor
+
+    doc = Document()
+    
+    # Configurações de página
+    section = doc.sections[0]
+    section.page_height = Inches(11.69)  # A4
+    section.page_width = Inches(8.27)    # A4
+    section.left_margin = Inches(1.18)   # 3cm
+    section.right_margin = Inches(0.79)  # 2cm
+    section.top_margin = Inches(0.79)    # 2cm
+    section.bottom_margin = Inches(0.79) # 2cm
+    
+    normal = doc.styles["Normal"]
+    normal.font.name = "Times New Roman"
+    normal.font.size = Pt(12)
+    normal.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+    normal.paragraph_format.line_spacing = 1.5
+    normal.paragraph_format.space_after = Pt(6)
+    
+    for nome, tamanho in (("Heading 1", 14), ("Heading 2", 12), ("Heading 3", 12)):
+        estilo = doc.styles[nome]
+        estilo.font.name = "Times New Roman"
+        estilo.font.size = Pt(tamanho)
+        estilo.font.bold = True
+        estilo.font.color.rgb = RGBColor(0, 0, 0)
+        estilo.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.LEFT
+    
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+class _Template:
+    """Pacote DOCX-base: partes fixas em bytes + document.xml parseado e com o corpo vazio."""
+
+    def __init__(self, data: bytes):
+        with zipfile.ZipFile(BytesIO(data)) as z:
+            self.partes = [(info.filename, z.read(info)) for info in z.infolist()]
+        xml = dict(self.partes)["word/document.xml"]
+        self.arvore = etree.fromstring(xml)
+        corpo = self.arvore.find(_w("body"))
+        for el in list(corpo):
+            if el.tag != _w("sectPr"):
+                corpo.remove(el)
+        self.prototipos = {tipo: self._prototipo(*fmt) for tipo, fmt in _FORMATOS.items()}
+
+    @staticmethod
+    def _prototipo(estilo: str, alinhamento: Optional[str], negrito: bool) -> etree._Element:
+        p = etree.Element(_w("p"))
+        ppr = etree.SubElement(p, _w("pPr"))
+        etree.SubElement(ppr, _w("pStyle"), {_w("val"): estilo})
+        if alinhamento:
+            etree.SubElement(ppr, _w("jc"), {_w("val"): alinhamento})
+        r = etree.SubElement(p, _w("r"))
+        if negrito:
+            etree.SubElement(etree.SubElement(r, _w("rPr")), _w("b"))
+        etree.SubElement(r, _w("t"), {_XML_SPACE: "preserve"})
+        return p
+
+    def _paragrafo(self, tipo: str, texto: str) -> etree._Element:
+        p = copy.deepcopy(self.prototipos[tipo])
+        if not texto:
+            p.remove(p.find(_w("r")))
+            return p
+        r = p.find(_w("r"))
+        t = r.find(_w("t"))
+        partes = _QUEBRAS_RE.split(_XML_INVALIDO.sub("", texto))
+        if len(partes) == 1:
+            t.text = partes[0]
+            return p
+        r.remove(t)
+        for parte in partes:
+            if parte == "\t":
+                etree.SubElement(r, _w("tab"))
+            elif parte in ("\n", "\r", "\r\n"):
+                etree.SubElement(r, _w("br"))
+            elif parte:
+                etree.SubElement(r, _w("t"), {_XML_SPACE: "preserve"}).text = parte
+        return p
+
+    def render(self, blocos: Iterable[Bloco]) -> bytes:
+        arvore = copy.deepcopy(self.arvore)
+        corpo = arvore.find(_w("body"))
+        sect_pr = corpo.find(_w("sectPr"))
+        paragrafos = [self._paragrafo(tipo, texto) for tipo, texto in blocos]
+        # o sectPr precisa continuar sendo o último filho do corpo
+        posicao = corpo.index(sect_pr) if sect_pr is not None else len(corpo)
+        corpo[posicao:posicao] = paragrafos
+        document_xml = etree.tostring(arvore, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as z:
+            for nome, dados in self.partes:
+                z.writestr(nome, document_xml if nome == "word/document.xml" else dados)
+        return buffer.getvalue()
+
+
+_template: Optional[_Template] = None
+_template_lock = threading.Lock()
+
+
+def _base() -> _Template:
+    global _template
+    with _template_lock:
+        if _template is None:
+            if DOCX_TEMPLATE_PATH:
+                with open(DOCX_TEMPLATE_PATH, "rb") as f:
+                    _template = _Template(f.read())
+            else:
+                _template = _Template(_template_padrao())
+        return _template
+
+
+def _paragrafos(texto: str) -> List[Bloco]:
+    return [("texto", p.strip()) for p in texto.split("\n\n") if p.strip()]
+
+
+def classificar_sentenca(fundamentacao_dispositivo: str) -> List[Bloco]:
+    """
+    Blocos da fundamentação/dispositivo numa passada: parágrafos que começam
+    por FUNDAMENTAÇÃO, DISPOSITIVO ou MÉRITO viram títulos de seção; sem
+    nenhuma seção explícita, entra o título "FUNDAMENTAÇÃO E DISPOSITIVO".
+    """
+    blocos: List[Bloco] = []
+    tem_secoes = False
+    for paragrafo in fundamentacao_dispositivo.split("\n\n"):
+        texto = paragrafo.strip()
+        if not texto:
+            continue
+        blocos.append(("secao" if _SECAO_RE.match(texto) else "texto", texto))
+        tem_secoes = tem_secoes or _TEM_SECOES_RE.search(texto) is not None
+    if blocos and not tem_secoes:
+        blocos.insert(0, ("secao", "FUNDAMENTAÇÃO E DISPOSITIVO"))
+    return blocos
+
+
+def blocos_sentenca(
+    relatorio: str,
+    fundamentacao_dispositivo: str,
+    numero_processo: Optional[str] = None
+) -> List[Bloco]:
+    """Estrutura da sentença: título, nº do processo, relatório e fundamentação/dispositivo."""
+    blocos: List[Bloco] = [("titulo", "SENTENÇA")]
+    if numero_processo:
+        blocos.append(("processo", f"Processo nº {numero_processo}"))
+    blocos.append(("vazio", ""))
+    
+    if relatorio and relatorio.strip():
+        blocos.append(("secao", "RELATÓRIO"))
+        blocos.extend(_paragrafos(relatorio))
+        blocos.append(("vazio", ""))
+    
+    if fundamentacao_dispositivo and fundamentacao_dispositivo.strip():
+        blocos.extend(classificar_sentenca(fundamentacao_dispositivo))
+    return blocos
+
+
+def render_sentenca(
+    relatorio: str,
+    fundamentacao_dispositivo: str,
+    numero_processo: Optional[str] = None
+) -> bytes:
+    """
+    Monta a sentença completa em DOCX com formatação adequada
+    
+    Args:
+        relatorio: O relatório do processo
+        fundamentacao_dispositivo: A fundamentação e dispositivo gerados
+        numero_processo: Número do processo (opcional)
+        
+    Returns:
+        bytes: Conteúdo do arquivo DOCX
+    """
+    return _base().render(blocos_sentenca(relatorio, fundamentacao_dispositivo, numero_processo))
+
+
+def render_referencia(i: int, doc: Dict) -> Tuple[str, bytes]:
+    """Monta o DOCX de um documento de referência em memória: (nome no ZIP, bytes)"""
+    doc_id = doc.get('id', f'documento_{i}')
+    blocos: List[Bloco] = [
+        ("titulo", f"Documento de Referência {i}"),
+        ("texto", f"ID: {doc_id}"),
+        ("vazio", ""),
+    ]
+    
+    # Adiciona as seções se existirem
+    for campo, titulo in (('relatorio', "RELATÓRIO"), ('fundamentacao', "FUNDAMENTAÇÃO"), ('dispositivo', "DISPOSITIVO")):
+        if doc.get(campo):
+            blocos.append(("secao", titulo))
+            blocos.extend(_paragrafos(doc[campo]))
+            if campo != 'dispositivo':
+                blocos.append(("vazio", ""))
+    
+    # Adiciona informações de score se disponíveis
+    if doc.get('score') is not None or doc.get('rerank_score') is not None:
+        blocos.append(("vazio", ""))
+        blocos.append(("subsecao", "INFORMAÇÕES DE RELEVÂNCIA"))
+        if doc.get('score') is not None:
+            blocos.append(("texto", f"Score de similaridade: {doc['score']:.4f}"))
+        if doc.get('rerank_score') is not None:
+            blocos.append(("texto", f"Score de re-ranking: {doc['rerank_score']:.4f}"))
+    
+    # Remove caracteres problemáticos do doc_id
+    doc_id_limpo = str(doc_id).replace('/', '_').replace('\\', '_')
+    return f"referencia_{i:02d}_{doc_id_limpo}.docx", _base().render(blocos)
+
+
+def _referencias(docs: List[Dict]) -> Iterator[Tuple[str, bytes]]:
+    for i, doc in enumerate(docs, 1):
+        yield render_referencia(i, doc)
+
+
+def escrever_referencias_zip(docs: List[Dict], destino: Union[str, BinaryIO]) -> None:
+    """Escreve o ZIP das referências no destino (caminho ou arquivo aberto), um DOCX por vez."""
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for nome, conteudo in _referencias(docs):
+            zipf.writestr(nome, conteudo)
+
+
+# ─────────────────────────── artefatos preguiçosos ───────────────────────────
+def spec_sentenca(relatorio: str, fundamentacao_dispositivo: str, numero_processo: Optional[str]) -> Dict[str, Any]:
+    return {
+        "relatorio": relatorio,
+        "fundamentacao_dispositivo": fundamentacao_dispositivo,
+        "numero_processo": numero_processo,
+    }
+
+
+def spec_referencias(docs: Iterable[Dict]) -> Dict[str, Any]:
+    # só os campos que entram no DOCX (os docs da busca trazem embeddings etc.)
+    campos = ("id", "relatorio", "fundamentacao", "dispositivo", "score", "rerank_score")
+    return {"docs": [{k: d.get(k) for k in campos if d.get(k) is not None} for d in docs]}
+
+
+def renderizar(tipo: str, spec: Dict[str, Any], arquivo_path: str) -> None:
+    """Gera o artefato `tipo` a partir do spec registrado (chamado no primeiro download)."""
+    if tipo == "sentenca":
+        with open(arquivo_path, "wb") as f:
+            f.write(render_sentenca(**spec))
+    elif tipo == "referencias":
+        try:
+            escrever_referencias_zip(spec["docs"], arquivo_path)
+        except Exception as e:
+            print(f"Erro ao criar ZIP de referências: {e}")
+            # ZIP só com o erro, para não quebrar o download
+            with zipfile.ZipFile(arquivo_path, 'w') as zipf:
+                zipf.writestr("erro.txt", f"Erro ao processar documentos de referência: {str(e)}")
+    else:
+        raise ValueError(f"Tipo de artefato sem renderizador: {tipo}")
+
+
+__all__ = [
+    "DOCX_TEMPLATE_PATH",
+    "classificar_sentenca",
+    "blocos_sentenca",
+    "render_sentenca",
+    "render_referencia",
+    "escrever_referencias_zip",
+    "spec_sentenca",
+    "spec_referencias",
+    "renderizar",
+]
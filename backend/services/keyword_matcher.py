@@ -0,0 +1,119 @@
+"""
+Classificação de páginas/documentos por palavras-chave numa única varredura.
+
+Todas as palavras-chave de um dicionário {classe: [palavras]} viram uma
+expressão regular só (alternativas da mais longa para a mais curta, dentro de
+um lookahead), aplicada ao texto em minúsculas (texto.lower(), como a busca
+por substring): o texto é percorrido uma vez e cada posição reporta a palavra
+mais longa que começa ali — as mais curtas que também começam ali são seus
+prefixos, já conhecidos na compilação. O resultado é o mesmo de testar
+`kw in texto.lower()` palavra por palavra (inclusive ocorrências
+sobrepostas, ex.: "julgo" dentro de "julgo procedente"), com contagens e
+posições por classe.
+
+Lotes (classificar_lote) são juntados com um separador que não aparece em
+nenhuma palavra-chave e varridos de uma vez; as ocorrências voltam para cada
+texto pelos offsets.
+"""
+import bisect
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+SEPARADOR = "\x00"
+
+# (posição no texto, palavra-chave)
+Ocorrencia = Tuple[int, str]
+
+
+@dataclass
+class Resultado:
+    """Ocorrências de um texto por classe."""
+
+    posicoes: Dict[str, List[Ocorrencia]] = field(default_factory=dict)
+
+    @property
+    def contagens(self) -> Dict[str, int]:
+        """Número de ocorrências por classe (todas, com repetição)."""
+        return {c: len(oc) for c, oc in self.posicoes.items()}
+
+    @property
+    def distintas(self) -> Dict[str, int]:
+        """Palavras-chave diferentes encontradas por classe."""
+        return {c: len({kw for _, kw in oc}) for c, oc in self.posicoes.items()}
+
+
+class KeywordMatcher:
+    """Matcher compilado de um dicionário {classe: [palavras-chave]} (sem diferenciar maiúsculas)."""
+
+    def __init__(self, keywords: Mapping[str, Sequence[str]]):
+        self.classes = list(keywords)
+        self._classes_de: Dict[str, List[str]] = {}
+        for classe, kws in keywords.items():
+            for kw in kws:
+                kw = kw.lower()
+                if SEPARADOR in kw:
+                    raise ValueError(f"palavra-chave com separador: {kw!r}")
+                destino = self._classes_de.setdefault(kw, [])
+                if classe not in destino:
+                    destino.append(classe)
+
+        palavras = sorted(self._classes_de, key=len, reverse=True)
+        # palavras que casam na mesma posição da mais longa: os prefixos dela
+        self._na_posicao: Dict[str, List[str]] = {
+            kw: [p for p in palavras if kw.startswith(p)] for kw in palavras
+        }
+        alternativas = "|".join(re.escape(p) for p in palavras)
+        # sem IGNORECASE: ele casa 'ſ' com 's', o que texto.lower() não faz
+        self._regex = re.compile(f"(?=({alternativas}))") if palavras else None
+
+    def _varrer(self, texto: str) -> List[Tuple[int, str]]:
+        if self._regex is None:
+            return []
+        low = texto.lower()
+        # lower() muda o tamanho de alguns caracteres ('İ' → 'i̇'): posição no
+        # texto em minúsculas → posição no texto original
+        origem = None if len(low) == len(texto) else [
+            i for i, ch in enumerate(texto) for _ in ch.lower()
+        ]
+        return [
+            (m.start() if origem is None else origem[m.start()], kw)
+            for m in self._regex.finditer(low)
+            for kw in self._na_posicao[m.group(1)]
+        ]
+
+    def _resultado(self, ocorrencias: List[Tuple[int, str]], inicio: int = 0) -> Resultado:
+        res = Resultado({c: [] for c in self.classes})
+        for pos, kw in ocorrencias:
+            for classe in self._classes_de[kw]:
+                res.posicoes[classe].append((pos - inicio, kw))
+        return res
+
+    def classificar(self, texto: str) -> Resultado:
+        return self._resultado(self._varrer(texto))
+
+    def classificar_lote(self, textos: Sequence[str]) -> List[Resultado]:
+        """Um Resultado por texto, com uma única varredura sobre o lote."""
+        textos = [t or "" for t in textos]
+        if not textos:
+            return []
+        inicios: List[int] = []
+        pos = 0
+        for t in textos:
+            inicios.append(pos)
+            pos += len(t) + len(SEPARADOR)
+
+        por_texto: List[List[Tuple[int, str]]] = [[] for _ in textos]
+        for p, kw in self._varrer(SEPARADOR.join(textos)):
+            por_texto[bisect.bisect_right(inicios, p) - 1].append((p, kw))
+        return [self._resultado(oc, ini) for oc, ini in zip(por_texto, inicios)]
+
+    def primeira_classe(self, res: Resultado, padrao: Optional[str] = "outros") -> Optional[str]:
+        """Primeira classe (na ordem do dicionário) com alguma ocorrência."""
+        for classe in self.classes:
+            if res.posicoes.get(classe):
+                return classe
+        return padrao
+
+
+__all__ = ["KeywordMatcher", "Resultado", "Ocorrencia"]
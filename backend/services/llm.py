@@ -1,44 +1,54 @@
 import os
 import random
-import time
-import math
 import asyncio
-from typing import Callable, Optional, List, Dict, Any
-from openai import OpenAI
-from anthropic import Anthropic
+import weakref
+from typing import Callable, Optional, List, Dict, Any, Tuple
+from openai import AsyncOpenAI
+from anthropic import AsyncAnthropic
+
+from services import llm_cache, model_router
+from services.model_router import Tier
+from services.token_budget import (
+    TokenBudgetError,
+    allocate_context_budget,
+    cap_output_tokens,
+    context_budget,
+    rank_score,
+)
 
 # Providers
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai").strip().lower()  # 'openai' | 'anthropic'
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-5").strip()
 LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.2"))
 LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "128000"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "600"))
 desired = LLM_MAX_TOKENS
-_openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY")) if LLM_PROVIDER == "openai" else None
-_anthropic = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY")) if LLM_PROVIDER == "anthropic" else None
 
-if LLM_PROVIDER == "openai":
-    try:
-        from openai import OpenAI  # SDK v1
-        _openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    except Exception as e:
-        raise RuntimeError(f"Falha ao inicializar OpenAI client: {e}")
-elif LLM_PROVIDER == "anthropic":
-    try:
-        from anthropic import Anthropic
-        _anthropic = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-    except Exception as e:
-        raise RuntimeError(f"Falha ao inicializar Anthropic client: {e}")
-else:
+if LLM_PROVIDER not in ("openai", "anthropic"):
     raise ValueError(f"LLM_PROVIDER inválido: {LLM_PROVIDER}")
 
-def _approx_tokens(txt: str) -> int:
-    # heurística: ~4 chars por token (ajuste se quiser)
-    return max(1, math.ceil(len(txt) / 4))
+# Um cliente por (event loop, provider): o pool httpx do SDK fica preso ao loop
+# em que abriu as conexões. No FastAPI há um loop por worker; no Celery, um por thread.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
 
-def _context_window_from_env(model: str) -> int:
-    # permite override específico por modelo, ex.: LLM_CONTEXT_WINDOW_GPT_5=128000
-    model_key = model.upper().replace("-", "_").replace(".", "_")
-    return int(os.getenv(f"LLM_CONTEXT_WINDOW_{model_key}", os.getenv("LLM_CONTEXT_WINDOW", "32000")))
+
+def _get_client(provider: str = LLM_PROVIDER):
+    """Retorna o cliente assíncrono do provider, compartilhado no loop corrente."""
+    loop = asyncio.get_running_loop()
+    por_provider = _clients.setdefault(loop, {})
+    client = por_provider.get(provider)
+    if client is None:
+        try:
+            if provider == "openai":
+                client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=LLM_TIMEOUT, max_retries=0)
+            elif provider == "anthropic":
+                client = AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), timeout=LLM_TIMEOUT, max_retries=0)
+            else:
+                raise ValueError(f"provider inválido: {provider}")
+        except Exception as e:
+            raise RuntimeError(f"Falha ao inicializar {provider} client: {e}")
+        por_provider[provider] = client
+    return client
 
 def _length_param_name(model: str) -> str:
     # modelos de raciocínio → max_completion_tokens; demais → max_tokens
@@ -46,12 +56,9 @@ def _length_param_name(model: str) -> str:
     return "max_completion_tokens" if m.startswith(("gpt-5", "o1", "o3", "o4-mini")) else "max_tokens"
 
 def _cap_limit_tokens(model: str, messages, desired: int) -> int:
-    ctx_window = _context_window_from_env(model)
-    in_tokens = sum(_approx_tokens(m.get("content", "")) for m in messages)
-    safety = int(os.getenv("LLM_SAFETY_TOKENS", "512"))
-    available = ctx_window - in_tokens - safety
-    # evita negativo e limita ao desejado
-    return max(1, min(desired, max(1, available)))
+    # conta com o tokenizer real e respeita janela/teto de saída do modelo;
+    # levanta TokenBudgetError em vez de mandar uma requisição que seria rejeitada
+    return cap_output_tokens(model, messages, desired)
 
 
 # ===================== Grounding / Prompt =====================
@@ -75,47 +82,45 @@ def _safe_pick(d: Dict[str, Any], keys: List[str], default: str = "") -> str:
             return v
     return default
 
-def _trim_text(s: str, max_chars: int) -> str:
-    if len(s) <= max_chars:
-        return s
-    return s[: max_chars - 3] + "..."
+def _doc_block(i: int, doc: Dict[str, Any]) -> Tuple[str, str]:
+    titulo = _safe_pick(doc, ["titulo", "title", "nome"], default=f"Documento {i+1}")
+    # 👇 juntar relatorio, fundamentacao, dispositivo
+    conteudo = ""
+    for k in ["conteudo", "content", "texto", "trecho", "body", "relatorio", "fundamentacao", "dispositivo"]:
+        v = doc.get(k)
+        if isinstance(v, str) and v.strip():
+            conteudo += v.strip() + "\n\n"
+    return titulo, (conteudo.strip() or "[sem conteúdo]")
 
-def build_context(exemplos: List[Dict[str, Any]], *, max_docs: int = 5, max_chars_per_doc: int = 10000) -> str:
+def build_context(
+    exemplos: List[Dict[str, Any]],
+    *,
+    max_docs: int = 5,
+    max_tokens: Optional[int] = None,
+    model: str = LLM_MODEL,
+) -> str:
+    """
+    Monta o bloco CONTEXTO. Com max_tokens, os documentos entram por ordem de
+    score de rerank até esgotar o orçamento (o último pode ser truncado).
+    """
     if not exemplos:
         return "(nenhum documento fornecido)"
 
-    blocos = []
-    for i, doc in enumerate(exemplos[:max_docs]):
-        titulo = _safe_pick(doc, ["titulo", "title", "nome"], default=f"Documento {i+1}")
-        # 👇 juntar relatorio, fundamentacao, dispositivo
-        conteudo = ""
-        for k in ["conteudo", "content", "texto", "trecho", "body", "relatorio", "fundamentacao", "dispositivo"]:
-            v = doc.get(k)
-            if isinstance(v, str) and v.strip():
-                conteudo += v.strip() + "\n\n"
-        conteudo = _trim_text(conteudo.strip(), max_chars_per_doc) if conteudo else "[sem conteúdo]"
-        blocos.append(f"Documento {i+1}: {titulo}\n---\n{conteudo}\n")
-
-    return "\n\n".join(blocos)
-
-def _montar_mensagens_sentenca(relatorio: str, contexto: str, instrucoes_usuario: Optional[str]) -> List[Dict[str, str]]:
-    relatorio = (relatorio or "").strip()
-    contexto = (contexto or "").strip()
-    instr = (instrucoes_usuario or "").strip()
-    instr_block = f"INSTRUÇÕES ADICIONAIS DO USUÁRIO:\n{instr}\n\n" if instr else ""
-
-    user_msg = f"""
-TAREFA: Gerar sentença (fundamentação + dispositivo) **estritamente** baseada no CONTEXTO.
-
-NOVO RELATÓRIO:
-{relatorio}
-
-{instr_block}
-=== CONTEXTO (única fonte de verdade) ===
-
-{contexto}
-=== FIM DO CONTEXTO ===
-
+    # mais relevantes primeiro (sort estável: uploads sem score mantêm a ordem)
+    ordenados = sorted(exemplos, key=rank_score, reverse=True)[:max_docs]
+    pares = [(doc, "{}\n---\n{}\n".format(*_doc_block(i, doc))) for i, doc in enumerate(ordenados)]
+    if max_tokens is not None:
+        pares = allocate_context_budget(pares, max_tokens, model)
+        if not pares:
+            return "(nenhum documento coube no orçamento de contexto)"
+
+    return "\n\n".join(f"Documento {i+1}: {texto}" for i, (_, texto) in enumerate(pares))
+
+# Bloco estático (estrutura + conclusão obrigatória + instruções finais).
+# Vai logo após o system prompt e é byte a byte idêntico entre chamadas, para
+# aproveitar o cache de prefixo dos provedores (Anthropic cache_control,
+# cache automático de prefixo da OpenAI). Nada dinâmico pode entrar aqui.
+ESTRUTURA_SENTENCA = """
 ## ESTRUTURA DA SENTENÇA
 
 ### 0. JULGAMENTO ANTECIPADO
@@ -171,9 +176,32 @@ Juíza de Direito"
 - **Não omita** nenhum dos elementos obrigatórios da sentença.
 - As citações de leis, doutrina e jurisprudência devem ser exatamente iguais às dos documentos de referência.
 """
+
+def _montar_mensagens_sentenca(relatorio: str, contexto: str, instrucoes_usuario: Optional[str]) -> List[Dict[str, Any]]:
+    relatorio = (relatorio or "").strip()
+    contexto = (contexto or "").strip()
+    instr = (instrucoes_usuario or "").strip()
+    instr_block = f"INSTRUÇÕES ADICIONAIS DO USUÁRIO:\n{instr}\n\n" if instr else ""
+
+    dinamico = f"""
+TAREFA: Gerar sentença (fundamentação + dispositivo) **estritamente** baseada no CONTEXTO, seguindo a ESTRUTURA DA SENTENÇA acima.
+
+NOVO RELATÓRIO:
+{relatorio}
+
+{instr_block}
+=== CONTEXTO (única fonte de verdade) ===
+
+{contexto}
+=== FIM DO CONTEXTO ===
+"""
+    # prefixo estático primeiro; a parte variável só no último bloco
     return [
         {"role": "system", "content": SYSTEM_PROMPT_SENTENCA},
-        {"role": "user", "content": user_msg},
+        {"role": "user", "content": [
+            {"type": "text", "text": ESTRUTURA_SENTENCA},
+            {"type": "text", "text": dinamico},
+        ]},
     ]
 
 
@@ -184,8 +212,8 @@ def _extract_text_from_response(content: Any) -> str:
     try:
         parts = []
         for block in content or []:
-            # Estrutura comum: {"type": "text", "text": "..."}
-            t = block.get("text") if isinstance(block, dict) else None
+            # Estrutura comum: TextBlock(type="text", text="...") ou {"type": "text", "text": "..."}
+            t = block.get("text") if isinstance(block, dict) else getattr(block, "text", None)
             if isinstance(t, str) and t:
                 parts.append(t)
         return "".join(parts)
@@ -193,58 +221,181 @@ def _extract_text_from_response(content: Any) -> str:
         return ""
 
 
-def _call_llm(*, messages: List[Dict[str, str]], on_progress: Optional[Callable[[str], None]] = None) -> str:
+def _split_system(messages: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+    """Anthropic recebe o system prompt como parâmetro, não como mensagem."""
+    system = "\n\n".join(m["content"] for m in messages if m.get("role") == "system")
+    rest = [m for m in messages if m.get("role") != "system"]
+    return system, rest
+
+
+def _anthropic_payload(messages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Converte para o formato Anthropic marcando o fim do prefixo estático com
+    cache_control: system + primeiro bloco de texto do usuário ficam em cache.
+    """
+    system, chat = _split_system(messages)
+    system_blocks = [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}] if system else []
+    out: List[Dict[str, Any]] = []
+    marcado = False
+    for m in chat:
+        content = m.get("content")
+        if isinstance(content, list) and not marcado and m.get("role") == "user" and content:
+            content = [dict(b) for b in content]
+            content[0]["cache_control"] = {"type": "ephemeral"}
+            marcado = True
+        out.append({"role": m["role"], "content": content})
+    return system_blocks, out
+
+
+def _registrar_uso(resp: Any, tier: Tier, on_usage: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Extrai contagens de tokens (inclusive acertos de cache) da resposta e registra."""
+    usage = getattr(resp, "usage", None)
+    if tier.provider == "openai":
+        details = getattr(usage, "prompt_tokens_details", None)
+        info = {
+            "input_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+            "cache_creation_tokens": 0,
+            "output_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        }
+    else:
+        info = {
+            "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+            "cached_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+            "cache_creation_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+        }
+    info.update(provider=tier.provider, model=tier.model)
+    print(
+        f"📊 LLM {tier}: entrada={info['input_tokens']} "
+        f"cache_hit={info['cached_tokens']} cache_write={info['cache_creation_tokens']} "
+        f"saída={info['output_tokens']}"
+    )
+    if on_usage:
+        try:
+            on_usage(info)
+        except Exception:
+            pass
+    return info
+
+
+def _tiers() -> List[Tier]:
+    # LLM_TIERS_SENTENCA define a cadeia; sem ela, LLM_PROVIDER/LLM_MODEL é o tier único
+    return model_router.tiers_for("sentenca", LLM_MODEL, LLM_PROVIDER)
+
+
+def _cache_key(tier: Tier, messages: List[Dict[str, Any]]) -> str:
+    # mesmo prompt + mesmos parâmetros → mesma resposta (retries, reconexões)
+    params = {"max_tokens": LLM_MAX_TOKENS, "temperature": LLM_TEMPERATURE, "seed": os.getenv("LLM_SEED")}
+    return llm_cache.cache_key(tier.provider, tier.model, params, messages)
+
+
+async def _call_tier(
+    tier: Tier,
+    messages: List[Dict[str, Any]],
+    on_progress: Optional[Callable[[str], None]] = None,
+    on_usage: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> str:
+    """Uma tentativa num tier; erros sobem para o roteador decidir o failover."""
+    param_name = _length_param_name(tier.model)
+    limit = _cap_limit_tokens(tier.model, messages, LLM_MAX_TOKENS)
+    client = _get_client(tier.provider)
+
+    if on_progress:
+        on_progress(f"🤖 Consultando {tier.provider.capitalize()} ({tier.model})...")
+
+    if tier.provider == "openai":
+        kwargs = {
+            "model": tier.model,
+            "messages": messages,
+            param_name: limit,
+        }
+
+        # gpt-5 não aceita temperature ≠ 1
+        if not tier.model.startswith("gpt-5"):
+            kwargs["temperature"] = LLM_TEMPERATURE
+
+        seed_env = os.getenv("LLM_SEED")
+        if seed_env and seed_env.isdigit():
+            kwargs["seed"] = int(seed_env)
+
+        # cache de prefixo da OpenAI é automático; a chave só melhora o roteamento
+        cache_key = os.getenv("LLM_PROMPT_CACHE_KEY")
+        if cache_key:
+            kwargs["extra_body"] = {"prompt_cache_key": cache_key}
+
+        resp = await client.chat.completions.create(**kwargs)
+        _registrar_uso(resp, tier, on_usage)
+        text = (resp.choices[0].message.content or "").strip()
+
+    else:  # anthropic
+        system, chat = _anthropic_payload(messages)
+        resp = await client.messages.create(
+            model=tier.model,
+            max_tokens=limit,
+            temperature=LLM_TEMPERATURE,
+            system=system,
+            messages=chat,
+        )
+        _registrar_uso(resp, tier, on_usage)
+        text = (_extract_text_from_response(getattr(resp, "content", [])) or "").strip()
+
+    llm_cache.set(_cache_key(tier, messages), text)
+    return text
+
+
+async def _call_llm(
+    *,
+    messages: List[Dict[str, Any]],
+    on_progress: Optional[Callable[[str], None]] = None,
+    on_usage: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> str:
     max_retries = 5
     base_delay = 1
-    param_name = _length_param_name(LLM_MODEL)
-    limit = _cap_limit_tokens(LLM_MODEL, messages, LLM_MAX_TOKENS)
-    
+    tiers = _tiers()
+
+    for tier in tiers:
+        cached = llm_cache.get(_cache_key(tier, messages))
+        if cached is not None:
+            if on_progress: on_progress("♻️ Usando sentença em cache...")
+            return cached
+
     for attempt in range(max_retries):
         try:
-            if on_progress:
-                on_progress(f"🤖 Consultando {LLM_PROVIDER.capitalize()} ({LLM_MODEL})... (Tentativa {attempt+1})")
-
-            if LLM_PROVIDER == "openai":
-           
-                kwargs = {
-                    "model": LLM_MODEL,
-                    "messages": messages,
-                    param_name: limit,           
-                }
-
-                # gpt-5 não aceita temperature ≠ 1
-                if not LLM_MODEL.startswith("gpt-5"):
-                    kwargs["temperature"] = LLM_TEMPERATURE
-
-                seed_env = os.getenv("LLM_SEED")
-                if seed_env and seed_env.isdigit():
-                    kwargs["seed"] = int(seed_env)
-
-                resp = _openai.chat.completions.create(**kwargs)
-                return (resp.choices[0].message.content or "").strip()
-
-            else:  # anthropic
-                resp = _anthropic.messages.create(
-                    model=LLM_MODEL,
-                    max_tokens=LLM_MAX_TOKENS,
-                    temperature=LLM_TEMPERATURE,
-                    messages=messages,
-                )
-                # extrai texto dos blocks:
-                text = "".join([b.get("text","") for b in getattr(resp, "content", []) if isinstance(b, dict)])
-                return (text or "").strip()
+            if on_progress and attempt:
+                on_progress(f"🔁 Nova rodada de tentativas ({attempt+1}/{max_retries})...")
+            _, text = await model_router.route_async(
+                "sentenca",
+                lambda tier: _call_tier(tier, messages, on_progress, on_usage),
+                tiers,
+                on_progress=on_progress,
+            )
+            return text
 
         except Exception as e:
-            # backoff simples para erros transitórios
-            transient = ["529", "overloaded", "500", "503", "rate_limit", "timeout"]
-            if any(t in str(e).lower() for t in transient) and attempt < max_retries - 1:
+            # todos os tiers sobrecarregados: backoff e nova rodada (sem prender o loop)
+            if model_router.is_failover_error(e) and attempt < max_retries - 1:
                 delay = base_delay * (2 ** attempt) + random.uniform(0, 1)
                 if on_progress: on_progress(f"⏳ API indisponível. Tentando de novo em {delay:.2f}s...")
-                time.sleep(delay)
+                await asyncio.sleep(delay)
             else:
-                if on_progress: on_progress(f"❌ Erro na chamada da API {LLM_PROVIDER}: {e}")
-                return f"Erro na chamada da API {LLM_PROVIDER}: {e}"
-    return "Erro: A chamada da API falhou após múltiplas tentativas."
+                # propaga: o texto de um erro não pode virar sentença (nem checkpoint do Celery)
+                if on_progress: on_progress(f"❌ Erro na chamada da API {tiers[0].provider}: {e}")
+                raise
+
+
+def _context_budget(tiers: List[Tier], fixas: List[Dict[str, Any]]) -> Tuple[int, str]:
+    """Orçamento de referências que serve a todos os tiers (o mais restritivo)."""
+    budgets = []
+    for tier in tiers:
+        try:
+            budgets.append((context_budget(tier.model, fixas, LLM_MAX_TOKENS), tier.model))
+        except TokenBudgetError:
+            continue  # tier não comporta nem o fixo; o roteador pula para o próximo
+    if not budgets:
+        return context_budget(tiers[0].model, fixas, LLM_MAX_TOKENS), tiers[0].model
+    return min(budgets)
+
 
 # ===================== Função principal =====================
 
@@ -255,21 +406,24 @@ async def gerar_sentenca_llm(
     docs: Optional[List[Dict[str, Any]]] = None,   # <- retrocompatível com main.py
     instrucoes_usuario: Optional[str] = None,
     on_progress: Optional[Callable[[str], None]] = None,
+    on_usage: Optional[Callable[[Dict[str, Any]], None]] = None,
 ) -> str:
     if exemplos is None and docs is not None:
         exemplos = docs
 
     if on_progress: on_progress("📚 Preparando CONTEXTO...")
-    contexto = build_context(exemplos or [])
+    # o que sobra da janela, depois do fixo e da reserva de saída, vai para as referências
+    fixas = _montar_mensagens_sentenca(relatorio, "", instrucoes_usuario)
+    orcamento, modelo_ref = _context_budget(_tiers(), fixas)
+    contexto = build_context(exemplos or [], max_tokens=orcamento, model=modelo_ref)
 
     if on_progress: on_progress("✍️ Montando mensagens...")
     messages = _montar_mensagens_sentenca(relatorio, contexto, instrucoes_usuario)
 
     if on_progress: on_progress("🎯 Gerando sentença...")
 
-    # roda a chamada bloqueante em thread, já que o endpoint é async
-    loop = asyncio.get_running_loop()
-    resultado = await loop.run_in_executor(None, lambda: _call_llm(messages=messages, on_progress=on_progress))
+    # chamada nativamente assíncrona: não ocupa thread do executor padrão
+    resultado = await _call_llm(messages=messages, on_progress=on_progress, on_usage=on_usage)
 
     if on_progress: on_progress("✅ Sentença gerada com sucesso!")
     return resultado
@@ -278,4 +432,5 @@ async def gerar_sentenca_llm(
 __all__ = [
     "gerar_sentenca_llm",
     "build_context",
+    "TokenBudgetError",
 ]
@@ -0,0 +1,100 @@
+"""
+Cache determinístico de respostas de LLM, chaveado por
+(provider, modelo, parâmetros, hash das mensagens).
+
+Compartilhado por services/llm.py e pelo pipeline de relatório: um retry do
+Celery ou uma reconexão do cliente que reemite o mesmo prompt recebe a
+resposta já paga. Um arquivo JSON por chave num diretório (um volume
+compartilhado entre API e workers no docker-compose), com TTL por mtime.
+Respostas de erro nunca são gravadas.
+"""
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes", "t")
+LLM_CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", "/tmp/llm_cache"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 60 * 60)))  # 7 dias
+
+# Prefixos das mensagens de fallback/erro que os módulos devolvem como texto
+_ERROR_PREFIXES = (
+    "erro",
+    "documento processado com",
+    "relatório: processo analisado",
+)
+
+
+def cache_key(provider: str, model: str, params: Dict[str, Any], messages: Any) -> str:
+    """Hash estável da requisição completa (JSON canônico)."""
+    payload = json.dumps(
+        {"provider": provider, "model": model, "params": params, "messages": messages},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(text: Optional[str]) -> bool:
+    """Só respostas não vazias e que não sejam mensagens de erro/fallback."""
+    if not isinstance(text, str) or not text.strip():
+        return False
+    return not text.strip().lower().startswith(_ERROR_PREFIXES)
+
+
+def _path(key: str) -> Path:
+    return LLM_CACHE_DIR / key[:2] / f"{key}.json"
+
+
+def get(key: str) -> Optional[str]:
+    """Retorna a resposta em cache ou None (expirada conta como ausente)."""
+    if not LLM_CACHE_ENABLED:
+        return None
+    path = _path(key)
+    try:
+        if time.time() - path.stat().st_mtime > LLM_CACHE_TTL:
+            path.unlink(missing_ok=True)
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))["text"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def set(key: str, text: str) -> None:
+    """Grava a resposta (escrita atômica); ignora textos de erro."""
+    if not LLM_CACHE_ENABLED or not is_cacheable(text):
+        return
+    path = _path(key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"text": text, "created_at": time.time()}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️ Falha ao gravar cache de LLM: {e}")
+
+
+def purge_expired() -> int:
+    """
+    Remove entradas expiradas (e temporários de escritas interrompidas);
+    retorna quantas foram apagadas. Agendada no beat (tasks.limpar_cache_llm).
+    """
+    removed = 0
+    if not LLM_CACHE_DIR.exists():
+        return removed
+    limite = time.time() - LLM_CACHE_TTL
+    for path in [*LLM_CACHE_DIR.glob("*/*.json"), *LLM_CACHE_DIR.glob("*/*.tmp")]:
+        try:
+            if path.stat().st_mtime < limite:
+                path.unlink()
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+__all__ = ["cache_key", "is_cacheable", "get", "set", "purge_expired"]
@@ -0,0 +1,179 @@
+"""
+Fila de e-mails de saída no Postgres, enviada em segundo plano.
+
+Quem envia grava a mensagem em mail_outbox no próprio comando da requisição
+(o pedido de código de login insere na fila dentro do SOLICITAR_SQL de
+services/auth_store) e chama sender.avisar(): o handler HTTP não espera o
+SMTP. O MailSender é uma task asyncio por worker da API que pega as mensagens
+vencidas com FOR UPDATE SKIP LOCKED (vários workers não enviam a mesma),
+envia pela conexão SMTP persistente em uma thread dedicada e apaga a linha.
+
+Falhas voltam para a fila com backoff exponencial; depois de MAIL_MAX_ATTEMPTS
+tentativas (ou numa recusa 5xx) a linha fica com status 'dead' e last_error,
+como dead-letter, sem o corpo (que traz o código de login). Uma mensagem
+pega por um worker que morreu volta a ficar disponível quando vence o prazo
+de reserva (MAIL_CLAIM_LEASE). Workers: purge() apaga as linhas 'dead' com
+mais de MAIL_DEAD_RETENTION segundos (junto da limpeza dos códigos de login).
+"""
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import asyncpg
+
+from database.postgres import _dsn_from_env, conexao
+from database.postgres_sync import psycopg2, sync_cursor
+from services.smtp_client import MAIL_FROM, SmtpConexao, erro_permanente, mensagem
+
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_RETRY_BASE = float(os.getenv("MAIL_RETRY_BASE", "30"))        # 30s, 60s, 120s, ...
+MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", "15"))  # varredura de retries
+MAIL_CLAIM_LEASE = int(os.getenv("MAIL_CLAIM_LEASE", "120"))
+MAIL_BATCH = int(os.getenv("MAIL_BATCH", "20"))
+MAIL_DEAD_RETENTION = int(os.getenv("MAIL_DEAD_RETENTION", str(7 * 24 * 60 * 60)))
+
+CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS mail_outbox (
+    id              BIGSERIAL PRIMARY KEY,
+    to_addr         TEXT NOT NULL,
+    subject         TEXT NOT NULL,
+    body            TEXT,
+    status          TEXT NOT NULL DEFAULT 'pending',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    last_error      TEXT,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    created_at      TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_mail_outbox_pending ON mail_outbox(next_attempt_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_mail_outbox_dead ON mail_outbox(created_at) WHERE status = 'dead';
+-- linhas 'dead' ficam sem o corpo
+ALTER TABLE mail_outbox ALTER COLUMN body DROP NOT NULL;
+"""
+
+CLAIM_SQL = """
+UPDATE mail_outbox SET next_attempt_at = now() + make_interval(secs => $2)
+ WHERE id IN (
+       SELECT id FROM mail_outbox
+        WHERE status = 'pending' AND next_attempt_at <= now()
+        ORDER BY next_attempt_at
+        LIMIT $1
+          FOR UPDATE SKIP LOCKED)
+RETURNING id, to_addr, subject, body, attempts
+"""
+
+FAIL_SQL = """
+UPDATE mail_outbox
+   SET attempts        = attempts + 1,
+       last_error      = $2,
+       status          = CASE WHEN $3 OR attempts + 1 >= $4 THEN 'dead' ELSE 'pending' END,
+       body            = CASE WHEN $3 OR attempts + 1 >= $4 THEN NULL ELSE body END,
+       next_attempt_at = now() + make_interval(secs => $5 * power(2, attempts))
+ WHERE id = $1
+RETURNING status
+"""
+
+
+async def ensure_mail_schema():
+    """Cria a fila de e-mails (conexão efêmera, roda no mestre)."""
+    conn = await asyncpg.connect(dsn=_dsn_from_env())
+    try:
+        await conn.execute(CREATE_SQL)
+    finally:
+        await conn.close()
+
+
+class MailSender:
+    """Envio em segundo plano da mail_outbox, um por worker da API."""
+
+    def __init__(self, smtp: Optional[SmtpConexao] = None):
+        self.smtp = smtp or SmtpConexao()
+        # uma thread só: a conexão SMTP não é thread-safe e o envio é sequencial
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp")
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    def avisar(self) -> None:
+        """Há mensagem nova na fila (no-op se o sender não roda neste processo)."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wake.clear()
+            try:
+                processadas = await self._rodada()
+            except Exception as e:
+                print(f"⚠️ Fila de e-mails indisponível: {e}")
+                processadas = 0
+            if processadas:
+                continue  # pode haver mais vencidas
+            try:
+                await asyncio.wait_for(self._wake.wait(), MAIL_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                await loop.run_in_executor(self._executor, self.smtp.fechar_se_ociosa)
+
+    async def _rodada(self) -> int:
+        async with conexao() as conn:
+            lote = await conn.fetch(CLAIM_SQL, MAIL_BATCH, MAIL_CLAIM_LEASE)
+
+        loop = asyncio.get_running_loop()
+        for row in lote:
+            msg = mensagem(MAIL_FROM, row["to_addr"], row["subject"], row["body"])
+            try:
+                await loop.run_in_executor(self._executor, self.smtp.enviar, msg)
+            except Exception as e:
+                await self._falhou(row, e)
+                continue
+            async with conexao() as conn:
+                await conn.execute("DELETE FROM mail_outbox WHERE id = $1", row["id"])
+        return len(lote)
+
+    async def _falhou(self, row: asyncpg.Record, exc: Exception) -> None:
+        async with conexao() as conn:
+            status = await conn.fetchval(
+                FAIL_SQL, row["id"], f"{type(exc).__name__}: {exc}",
+                erro_permanente(exc), MAIL_MAX_ATTEMPTS, MAIL_RETRY_BASE,
+            )
+        if status == "dead":
+            print(f"❌ E-mail para {row['to_addr']} desistido após {row['attempts'] + 1} tentativa(s): {exc}")
+        else:
+            print(f"⚠️ Falha ao enviar e-mail para {row['to_addr']} (tentativa {row['attempts'] + 1}): {exc}")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.smtp.fechar)
+
+
+sender = MailSender()
+
+
+def purge(older_than: int = MAIL_DEAD_RETENTION) -> int:
+    """Remove mensagens 'dead' criadas há mais de older_than segundos."""
+    if psycopg2 is None:
+        return 0
+    try:
+        with sync_cursor() as cur:
+            cur.execute(
+                "DELETE FROM mail_outbox WHERE status = 'dead' AND created_at < now() - make_interval(secs => %s)",
+                (older_than,),
+            )
+            return cur.rowcount
+    except psycopg2.Error as e:
+        print(f"⚠️ Falha ao limpar e-mails desistidos: {e}")
+        return 0
+
+
+__all__ = ["ensure_mail_schema", "MailSender", "sender", "purge", "MAIL_DEAD_RETENTION"]
@@ -0,0 +1,244 @@
+"""
+Roteador de modelos compartilhado por services/llm.py (sentença) e pelo
+pipeline de relatório (resumos e relatório final).
+
+Cada tipo de tarefa tem uma lista ordenada de tiers (provider, modelo, timeout).
+O roteador chama o primeiro tier; em timeout/SLO estourado ou sobrecarga
+(429/500/503/529...) passa ao próximo. Com hedge configurado, se o tier em
+andamento não responder em N segundos, dispara o próximo em paralelo e fica
+com quem terminar primeiro.
+
+Configuração por env (TASK em maiúsculas: SENTENCA, SUMMARY, REPORT):
+    LLM_TIERS_SENTENCA="openai:gpt-5@600,anthropic:claude-sonnet-4-5@600"
+    LLM_HEDGE_AFTER_SENTENCA=90
+Sem LLM_TIERS_<TASK>, o tier único é o modelo padrão passado pelo chamador.
+"""
+import os
+import time
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from services.token_budget import TokenBudgetError
+
+T = TypeVar("T")
+
+DEFAULT_TIER_TIMEOUT = float(os.getenv("LLM_TIER_TIMEOUT", os.getenv("LLM_TIMEOUT", "600")))
+
+# Status/mensagens que indicam sobrecarga ou indisponibilidade passageira
+_FAILOVER_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+_FAILOVER_MARKERS = ["529", "overloaded", "500", "503", "rate_limit", "timeout", "timed out"]
+
+# Threads para as chamadas síncronas (pipeline): um tier abandonado por
+# timeout continua até o timeout do próprio cliente, sem bloquear o chamador.
+_sync_pool = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_ROUTER_THREADS", "16")), thread_name_prefix="llm-tier")
+
+
+@dataclass(frozen=True)
+class Tier:
+    provider: str  # 'openai' | 'anthropic'
+    model: str
+    timeout: float = DEFAULT_TIER_TIMEOUT
+
+    def __str__(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+
+class AllTiersFailed(RuntimeError):
+    """Todos os tiers falharam com erros de failover (timeout/sobrecarga)."""
+
+    def __init__(self, task: str, errors: List[Tuple[Tier, BaseException]]):
+        self.task = task
+        self.errors = errors
+        detalhes = "; ".join(f"{tier}: {e or type(e).__name__}" for tier, e in errors)
+        super().__init__(f"Todos os modelos falharam para '{task}': {detalhes}")
+
+
+def infer_provider(model: str) -> str:
+    """Provider a partir do prefixo do nome do modelo."""
+    m = model.lower()
+    if m.startswith("claude"):
+        return "anthropic"
+    if m.startswith(("gpt", "o1", "o3", "o4", "chatgpt")):
+        return "openai"
+    raise ValueError(f"Não foi possível inferir o provider do modelo '{model}'")
+
+
+def parse_tiers(spec: str, default_timeout: float = DEFAULT_TIER_TIMEOUT) -> List[Tier]:
+    """Lê "provider:modelo@timeout,..." (provider e timeout opcionais)."""
+    tiers: List[Tier] = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        timeout = default_timeout
+        if "@" in item:
+            item, t = item.rsplit("@", 1)
+            timeout = float(t)
+        if ":" in item:
+            provider, model = item.split(":", 1)
+        else:
+            provider, model = infer_provider(item), item
+        tiers.append(Tier(provider.strip().lower(), model.strip(), timeout))
+    return tiers
+
+
+def tiers_for(task: str, default_model: str, default_provider: Optional[str] = None) -> List[Tier]:
+    """Tiers configurados para a tarefa, ou o modelo padrão como tier único."""
+    spec = os.getenv(f"LLM_TIERS_{task.upper()}")
+    if spec:
+        tiers = parse_tiers(spec)
+        if tiers:
+            return tiers
+    return [Tier(default_provider or infer_provider(default_model), default_model)]
+
+
+def hedge_after(task: str) -> Optional[float]:
+    """Segundos sem resposta antes de disparar o próximo tier (None = sem hedge)."""
+    v = float(os.getenv(f"LLM_HEDGE_AFTER_{task.upper()}", "0") or 0)
+    return v if v > 0 else None
+
+
+def is_failover_error(exc: BaseException) -> bool:
+    """Erros que justificam tentar o próximo tier (ou repetir a rodada)."""
+    if isinstance(exc, AllTiersFailed):
+        # nova rodada só se algum tier falhou por algo passageiro: prompt
+        # maior que a janela de todos os tiers daria o mesmo erro de novo
+        return any(not isinstance(e, TokenBudgetError) for _, e in exc.errors)
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError, TokenBudgetError)):
+        return True
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if status in _FAILOVER_STATUS:
+        return True
+    return any(t in str(exc).lower() for t in _FAILOVER_MARKERS)
+
+
+async def route_async(
+    task: str,
+    call: Callable[[Tier], Awaitable[T]],
+    tiers: List[Tier],
+    on_progress: Optional[Callable[[str], None]] = None,
+) -> Tuple[Tier, T]:
+    """Executa call(tier) com failover e hedge; retorna (tier que respondeu, resultado)."""
+    hedge = hedge_after(task)
+    pending: Dict["asyncio.Task[T]", Tier] = {}
+    errors: List[Tuple[Tier, BaseException]] = []
+    proximo = 0
+
+    def _launch() -> None:
+        nonlocal proximo
+        tier = tiers[proximo]
+        proximo += 1
+        pending[asyncio.ensure_future(asyncio.wait_for(call(tier), tier.timeout))] = tier
+
+    _launch()
+    try:
+        while pending:
+            timeout = hedge if hedge and proximo < len(tiers) else None
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # hedge: sem resposta em N s → dispara o próximo tier em paralelo
+                if on_progress: on_progress(f"⏱️ {pending[next(iter(pending))]} lento; acionando {tiers[proximo]}...")
+                _launch()
+                continue
+            for fut in done:
+                tier = pending.pop(fut)
+                try:
+                    return tier, fut.result()
+                except Exception as e:
+                    if not is_failover_error(e):
+                        raise
+                    errors.append((tier, e))
+                    print(f"⚠️ [{task}] {tier} falhou ({e or type(e).__name__}); tentando próximo tier")
+                    if proximo < len(tiers):
+                        if on_progress: on_progress(f"🔀 {tier} indisponível; usando {tiers[proximo]}...")
+                        _launch()
+    finally:
+        for fut in pending:
+            fut.cancel()
+    raise AllTiersFailed(task, errors)
+
+
+def route_sync(
+    task: str,
+    call: Callable[[Tier], T],
+    tiers: List[Tier],
+) -> Tuple[Tier, T]:
+    """Versão síncrona (threads) de route_async, para o pipeline de relatório."""
+    hedge = hedge_after(task)
+    # prazo de cada chamada: definido quando ela começa a rodar numa thread,
+    # não no submit (a espera na fila do _sync_pool não conta contra o SLO)
+    pending: Dict[Any, Tuple[Tier, "Future[float]"]] = {}
+    errors: List[Tuple[Tier, BaseException]] = []
+    proximo = 0
+    hedge_em: Optional[float] = None
+
+    def _launch() -> None:
+        nonlocal proximo, hedge_em
+        tier = tiers[proximo]
+        proximo += 1
+        hedge_em = time.monotonic() + hedge if hedge else None
+        inicio: "Future[float]" = Future()
+
+        def _rodar() -> T:
+            inicio.set_result(time.monotonic() + tier.timeout)
+            return call(tier)
+
+        pending[_sync_pool.submit(_rodar)] = (tier, inicio)
+
+    _launch()
+    while pending:
+        agora = time.monotonic()
+        limites = [i.result() for _, i in pending.values() if i.done()]
+        if hedge_em is not None and proximo < len(tiers):
+            limites.append(hedge_em)
+        timeout = max(0.0, min(limites) - agora) if limites else None
+        # chamadas ainda na fila: o início delas também acorda o laço (prazo novo)
+        na_fila = [i for _, i in pending.values() if not i.done()]
+        done, _ = wait(list(pending) + na_fila, timeout=timeout, return_when=FIRST_COMPLETED)
+        done = [f for f in done if f in pending]
+        if not done:
+            agora = time.monotonic()
+            vencidos = [f for f, (_, i) in pending.items() if i.done() and agora >= i.result()]
+            hedge_vencido = hedge_em is not None and proximo < len(tiers) and agora >= hedge_em
+            if not vencidos and not hedge_vencido:
+                continue  # uma chamada saiu da fila e ganhou prazo
+            # estourou o SLO de algum tier e/ou o prazo do hedge
+            for fut in vencidos:
+                tier, _ = pending.pop(fut)
+                fut.cancel()
+                errors.append((tier, TimeoutError(f"sem resposta em {tier.timeout:.0f}s")))
+                print(f"⚠️ [{task}] {tier} excedeu {tier.timeout:.0f}s; tentando próximo tier")
+            if proximo < len(tiers):
+                _launch()
+            continue
+        for fut in done:
+            tier, _ = pending.pop(fut)
+            try:
+                result = fut.result()
+            except Exception as e:
+                if not is_failover_error(e):
+                    raise
+                errors.append((tier, e))
+                print(f"⚠️ [{task}] {tier} falhou ({e}); tentando próximo tier")
+                if proximo < len(tiers):
+                    _launch()
+                continue
+            for outro in pending:
+                outro.cancel()
+            return tier, result
+    raise AllTiersFailed(task, errors)
+
+
+__all__ = [
+    "Tier",
+    "AllTiersFailed",
+    "infer_provider",
+    "parse_tiers",
+    "tiers_for",
+    "hedge_after",
+    "is_failover_error",
+    "route_async",
+    "route_sync",
+]
@@ -0,0 +1,102 @@
+"""
+Single-flight dos jobs Celery de relatório, por hash do PDF, no Postgres.
+
+O pipeline do worker é um canvas (OCR em shards, resumos em paralelo) que
+roda em vários processos: o flock de services/single_flight não serve.
+Antes de disparar o canvas o job registra o PDF em pdf_inflight; um job
+concorrente para o mesmo hash vira seguidor (tasks.pdf.acompanhar) e
+espera o relatório do líder em vez de repetir OCR + LLM.
+
+Cada estágio do líder renova o registro (manter); se o líder falhar de vez
+o registro é liberado, e um registro sem renovação há PDF_INFLIGHT_TTL
+segundos (worker morto) pode ser assumido por outro job.
+"""
+import os
+from typing import Optional
+
+from database.postgres_sync import sync_cursor
+
+PDF_INFLIGHT_TTL = int(os.getenv("PDF_INFLIGHT_TTL", str(45 * 60)))
+
+CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS pdf_inflight (
+    blob_key   TEXT PRIMARY KEY,
+    job_id     TEXT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_pdf_inflight_job ON pdf_inflight(job_id);
+"""
+
+# Assume o PDF se está livre, já é deste job ou o líder parou de renovar
+ASSUMIR_SQL = """
+INSERT INTO pdf_inflight (blob_key, job_id) VALUES (%s, %s)
+ON CONFLICT (blob_key) DO UPDATE SET job_id = EXCLUDED.job_id, updated_at = now()
+ WHERE pdf_inflight.job_id = EXCLUDED.job_id
+    OR pdf_inflight.updated_at < now() - make_interval(secs => %s)
+RETURNING job_id
+"""
+
+_schema_ok = False
+
+
+def _cursor():
+    global _schema_ok
+    ctx = sync_cursor()
+    if not _schema_ok:
+        with sync_cursor() as cur:
+            cur.execute(CREATE_SQL)
+        _schema_ok = True
+    return ctx
+
+
+def assumir(blob_key: str, job_id: str, ttl: int = PDF_INFLIGHT_TTL) -> str:
+    """Id do job líder do PDF: o próprio job_id se ele assumiu, senão o do job em andamento."""
+    with _cursor() as cur:
+        while True:
+            cur.execute(ASSUMIR_SQL, (blob_key, job_id, ttl))
+            if cur.fetchone() is not None:
+                return job_id
+            cur.execute("SELECT job_id FROM pdf_inflight WHERE blob_key=%s", (blob_key,))
+            row = cur.fetchone()
+            if row is not None:
+                return row[0]
+            # o líder liberou entre os dois comandos: tenta assumir de novo
+
+
+def lider(blob_key: str, ttl: int = PDF_INFLIGHT_TTL) -> Optional[str]:
+    """Job que está processando o PDF (None se ninguém, ou se o líder parou de renovar)."""
+    with _cursor() as cur:
+        cur.execute(
+            """
+            SELECT job_id FROM pdf_inflight
+             WHERE blob_key=%s AND updated_at >= now() - make_interval(secs => %s)
+            """,
+            (blob_key, ttl),
+        )
+        row = cur.fetchone()
+    return None if row is None else row[0]
+
+
+def manter(job_id: str) -> None:
+    """Renova o registro do líder (início de cada estágio do canvas)."""
+    with _cursor() as cur:
+        cur.execute("UPDATE pdf_inflight SET updated_at = now() WHERE job_id=%s", (job_id,))
+
+
+def liberar(job_id: str) -> None:
+    """Remove o registro do job (relatório gravado no cache ou falha definitiva)."""
+    with _cursor() as cur:
+        cur.execute("DELETE FROM pdf_inflight WHERE job_id=%s", (job_id,))
+
+
+def purge(ttl: int = PDF_INFLIGHT_TTL) -> int:
+    """Remove registros de líderes que pararam de renovar (workers mortos)."""
+    with _cursor() as cur:
+        cur.execute(
+            "DELETE FROM pdf_inflight WHERE updated_at < now() - make_interval(secs => %s)",
+            (ttl,),
+        )
+        return cur.rowcount
+
+
+__all__ = ["PDF_INFLIGHT_TTL", "assumir", "lider", "manter", "liberar", "purge"]
@@ -0,0 +1,110 @@
+"""
+Histórico de execução por fila e por task, no Postgres.
+
+Workers: ao fim de cada task, registrar() atualiza médias móveis
+exponenciais (EWMA) do tempo de execução e da espera na fila, além da
+espera e do início do último job. O autoscaler usa os tempos médios para
+estimar o trabalho acumulado; a API usa tudo para as métricas de backlog.
+"""
+import os
+from typing import Dict, List, Tuple
+
+import asyncpg
+
+from database.postgres import _dsn_from_env, conexao
+from database.postgres_sync import psycopg2, sync_cursor
+
+# Peso da amostra nova nas médias móveis
+QUEUE_STATS_ALPHA = float(os.getenv("QUEUE_STATS_ALPHA", "0.2"))
+
+CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS queue_stats (
+    queue           TEXT NOT NULL,
+    task_name       TEXT NOT NULL,
+    runtime_ewma    DOUBLE PRECISION NOT NULL,
+    wait_ewma       DOUBLE PRECISION NOT NULL,
+    last_wait       DOUBLE PRECISION NOT NULL,
+    last_started_at TIMESTAMPTZ NOT NULL,
+    samples         BIGINT NOT NULL DEFAULT 1,
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (queue, task_name)
+);
+"""
+
+UPSERT_SQL = """
+INSERT INTO queue_stats (queue, task_name, runtime_ewma, wait_ewma, last_wait, last_started_at)
+VALUES (%(fila)s, %(task)s, %(duracao)s, %(espera)s, %(espera)s, to_timestamp(%(inicio)s))
+ON CONFLICT (queue, task_name) DO UPDATE SET
+    runtime_ewma    = queue_stats.runtime_ewma + %(alpha)s * (EXCLUDED.runtime_ewma - queue_stats.runtime_ewma),
+    wait_ewma       = queue_stats.wait_ewma + %(alpha)s * (EXCLUDED.wait_ewma - queue_stats.wait_ewma),
+    last_wait       = EXCLUDED.last_wait,
+    last_started_at = GREATEST(queue_stats.last_started_at, EXCLUDED.last_started_at),
+    samples         = queue_stats.samples + 1,
+    updated_at      = now();
+"""
+
+
+async def ensure_queue_stats_schema():
+    """Cria a tabela de histórico (conexão efêmera, roda no mestre)."""
+    conn = await asyncpg.connect(dsn=_dsn_from_env())
+    try:
+        await conn.execute(CREATE_SQL)
+    finally:
+        await conn.close()
+
+
+# ───────────────────────────── lado do worker ─────────────────────────────
+_schema_ok = False
+
+
+def registrar(fila: str, task_name: str, inicio: float, espera: float, duracao: float) -> None:
+    """Soma uma execução ao histórico (inicio em epoch; espera/duracao em segundos)."""
+    global _schema_ok
+    if psycopg2 is None:
+        return
+    try:
+        with sync_cursor() as cur:
+            if not _schema_ok:
+                cur.execute(CREATE_SQL)
+                _schema_ok = True
+            cur.execute(UPSERT_SQL, {
+                "fila": fila, "task": task_name, "inicio": inicio,
+                "espera": max(0.0, espera), "duracao": duracao, "alpha": QUEUE_STATS_ALPHA,
+            })
+    except psycopg2.Error as e:
+        print(f"⚠️ Falha ao registrar execução de {task_name}: {e}")
+
+
+def tempos_medios() -> Dict[str, Tuple[float, int]]:
+    """
+    Tempo médio de execução por fila (média das tasks da fila ponderada
+    pelo nº de execuções) e o total de amostras: {fila: (segundos, amostras)}.
+    """
+    with sync_cursor() as cur:
+        cur.execute(
+            """
+            SELECT queue, SUM(runtime_ewma * samples) / SUM(samples), SUM(samples)
+              FROM queue_stats GROUP BY queue
+            """
+        )
+        return {fila: (float(media), int(n)) for fila, media, n in cur.fetchall()}
+
+
+# ────────────────────────────── lado da API ──────────────────────────────
+async def estatisticas() -> List[asyncpg.Record]:
+    """Histórico de todas as tasks, com a idade da última amostra de cada uma."""
+    async with conexao() as conn:
+        try:
+            return await conn.fetch(
+                """
+                SELECT queue, task_name, runtime_ewma, wait_ewma, last_wait, samples,
+                       EXTRACT(EPOCH FROM now() - last_started_at) AS since_last_start
+                  FROM queue_stats
+                 ORDER BY queue, task_name
+                """
+            )
+        except asyncpg.UndefinedTableError:
+            return []
+
+
+__all__ = ["ensure_queue_stats_schema", "registrar", "tempos_medios", "estatisticas"]
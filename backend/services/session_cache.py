@@ -0,0 +1,122 @@
+"""
+Cache por processo do last_login_iat de cada usuário (sessão única).
+
+get_current_user compara o iat do token com o last_login_iat do usuário; em
+vez de ir ao Postgres em toda requisição autenticada, o valor fica em memória
+por SESSION_CACHE_TTL segundos. Um trigger em app_user emite NOTIFY no canal
+app_user_session a cada novo login ("<user_id>:<iat>") e uma conexão em
+LISTEN por processo atualiza o cache na hora: o login em outro dispositivo
+derruba a sessão antiga em todos os workers sem esperar o TTL.
+
+O last_login_iat só cresce, então o cache guarda sempre o maior valor visto
+(uma leitura antiga do banco nunca sobrescreve uma notificação mais nova).
+Sem a conexão LISTEN, o cache é esvaziado e cada chamada consulta o banco.
+"""
+import os
+import time
+import asyncio
+from typing import Dict, Optional, Tuple
+
+import asyncpg
+
+from database.postgres import _dsn_from_env, conexao
+
+SESSION_CHANNEL = "app_user_session"
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "300"))
+# Espera antes de tentar de novo a conexão LISTEN depois de uma falha
+SESSION_LISTEN_RETRY = float(os.getenv("SESSION_LISTEN_RETRY", "30"))
+
+# Trigger que publica os novos logins (criado junto com o schema de auth)
+NOTIFY_SQL = f"""
+CREATE OR REPLACE FUNCTION app_user_session_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{SESSION_CHANNEL}', NEW.id::text || ':' || COALESCE(NEW.last_login_iat, 0));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS app_user_session_notify ON app_user;
+CREATE TRIGGER app_user_session_notify
+    AFTER UPDATE OF last_login_iat ON app_user
+    FOR EACH ROW EXECUTE FUNCTION app_user_session_notify();
+"""
+
+
+class SessionCache:
+    """last_login_iat por usuário com TTL, atualizado por LISTEN/NOTIFY."""
+
+    def __init__(self, ttl: float = SESSION_CACHE_TTL):
+        self.ttl = ttl
+        self._conn: Optional[asyncpg.Connection] = None
+        self._lock = asyncio.Lock()
+        self._cache: Dict[str, Tuple[int, float]] = {}
+        self._retry_em = 0.0
+
+    async def _ensure(self) -> bool:
+        """Garante a conexão LISTEN; False se não der (o cache fica desligado)."""
+        if self._conn is not None and not self._conn.is_closed():
+            return True
+        if time.monotonic() < self._retry_em:
+            return False
+        async with self._lock:
+            if self._conn is not None and not self._conn.is_closed():
+                return True
+            self._cache.clear()  # notificações podem ter sido perdidas
+            try:
+                conn = await asyncpg.connect(dsn=_dsn_from_env())
+                await conn.add_listener(SESSION_CHANNEL, self._on_notify)
+                conn.add_termination_listener(self._on_terminate)
+            except (OSError, asyncpg.PostgresError) as e:
+                print(f"⚠️ LISTEN de sessões indisponível ({e}); validando no banco")
+                self._conn = None
+                self._retry_em = time.monotonic() + SESSION_LISTEN_RETRY
+                return False
+            self._conn = conn
+            return True
+
+    def _on_notify(self, conn, pid, channel, payload: str) -> None:
+        user_id, _, iat = payload.rpartition(":")
+        self._store(user_id, int(iat))
+
+    def _on_terminate(self, conn) -> None:
+        self._conn = None
+        self._cache.clear()
+
+    def atualizar(self, user_id: str, iat: int) -> None:
+        """Novo login feito neste processo: vale já, sem esperar o NOTIFY."""
+        if self._conn is not None:
+            self._store(user_id, iat)
+
+    def _store(self, user_id: str, iat: int) -> None:
+        atual = self._cache.get(user_id)
+        if atual is not None and atual[0] > iat:
+            iat = atual[0]
+        self._cache[user_id] = (iat, time.monotonic() + self.ttl)
+
+    async def last_login_iat(self, user_id: str) -> Optional[int]:
+        """last_login_iat do usuário (None se não existe); só vai ao banco em cache miss."""
+        ouvindo = await self._ensure()
+        if ouvindo:
+            hit = self._cache.get(user_id)
+            if hit is not None and hit[1] > time.monotonic():
+                return hit[0]
+
+        async with conexao() as conn:
+            iat = await conn.fetchval("SELECT last_login_iat FROM app_user WHERE id = $1", user_id)
+        if iat is None:
+            return None
+        if ouvindo:
+            self._store(user_id, iat)
+            return self._cache[user_id][0]
+        return iat
+
+    async def close(self) -> None:
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+        self._cache.clear()
+
+
+cache = SessionCache()
+
+
+__all__ = ["SESSION_CHANNEL", "SESSION_CACHE_TTL", "NOTIFY_SQL", "SessionCache", "cache"]
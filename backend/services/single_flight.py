@@ -0,0 +1,179 @@
+"""
+Single-flight por chave (hash do PDF): pedidos simultâneos para o mesmo
+conteúdo executam o pipeline uma única vez.
+
+Dois níveis:
+  - no processo: o primeiro pedido vira líder; os demais se inscrevem no
+    progresso do líder (recebendo o histórico já emitido) e esperam o resultado;
+  - entre processos (API x workers Celery): flock num arquivo de lock em
+    SINGLE_FLIGHT_DIR, um volume compartilhado no docker-compose. Quem não
+    consegue o lock acompanha o arquivo de progresso do líder e, quando o lock
+    é liberado, consulta o cache de resultado antes de calcular por conta própria
+    (se o líder morreu ou falhou, o próximo assume).
+"""
+import os
+import time
+import fcntl
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+SINGLE_FLIGHT_DIR = Path(os.getenv("SINGLE_FLIGHT_DIR", "/tmp/inflight"))
+POLL_INTERVAL = float(os.getenv("SINGLE_FLIGHT_POLL", "0.5"))
+
+ProgressFn = Callable[[str], None]
+
+
+class _Flight:
+    """Execução em andamento no processo: resultado + fan-out de progresso."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._history: List[str] = []
+        self._listeners: List[ProgressFn] = []
+
+    def subscribe(self, fn: ProgressFn) -> None:
+        with self._lock:
+            for msg in self._history:
+                fn(msg)
+            self._listeners.append(fn)
+
+    def publish(self, msg: str) -> None:
+        with self._lock:
+            self._history.append(msg)
+            for fn in self._listeners:
+                try:
+                    fn(msg)
+                except Exception as e:
+                    print(f"⚠️ Falha ao repassar progresso: {e}")
+
+
+_flights: Dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+
+
+def run(
+    key: str,
+    compute: Callable[[ProgressFn], str],
+    on_progress: Optional[ProgressFn] = None,
+    cached: Callable[[], Optional[str]] = lambda: None,
+) -> str:
+    """
+    Executa compute(progress) uma vez por chave. Pedidos concorrentes com a
+    mesma chave recebem o mesmo resultado e o mesmo fluxo de progresso.
+    `cached` consulta o resultado já persistido (usado após esperar outro processo).
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if on_progress:
+        flight.subscribe(on_progress)
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _run_locked(key, compute, flight.publish, cached)
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+def _open_lock(path: Path) -> int:
+    """Abre e trava o arquivo de lock, garantindo que ainda é o do caminho."""
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise
+        try:
+            # o líder anterior pode ter removido o arquivo entre open e flock
+            if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+
+def _tail(path: Path, pos: int, publish: ProgressFn) -> int:
+    """Repassa as linhas novas do arquivo de progresso do líder."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            if os.fstat(f.fileno()).st_size < pos:
+                pos = 0  # arquivo recriado por outro líder
+            f.seek(pos)
+            while True:
+                line = f.readline()
+                if not line.endswith("\n"):
+                    break
+                publish(line.rstrip("\n"))
+                pos = f.tell()
+    except FileNotFoundError:
+        pass
+    return pos
+
+
+def _run_locked(
+    key: str,
+    compute: Callable[[ProgressFn], str],
+    publish: ProgressFn,
+    cached: Callable[[], Optional[str]],
+) -> str:
+    SINGLE_FLIGHT_DIR.mkdir(parents=True, exist_ok=True)
+    lock_path = SINGLE_FLIGHT_DIR / f"{key}.lock"
+    progress_path = SINGLE_FLIGHT_DIR / f"{key}.progress"
+
+    pos = 0
+    aguardou = False
+    while True:
+        try:
+            fd = _open_lock(lock_path)
+            break
+        except BlockingIOError:
+            if not aguardou:
+                publish("⏳ Este PDF já está sendo processado; acompanhando o job em andamento...")
+                aguardou = True
+            pos = _tail(progress_path, pos, publish)
+            time.sleep(POLL_INTERVAL)
+
+    try:
+        # o líder pode ter terminado entre a consulta ao cache e o lock
+        hit = cached()
+        if hit is not None:
+            if aguardou:
+                publish("♻️ Usando o resultado do job em andamento")
+            return hit
+
+        with open(progress_path, "w", encoding="utf-8") as pf:
+            def _publish(msg: str) -> None:
+                publish(msg)
+                pf.write(msg.replace("\n", " ") + "\n")
+                pf.flush()
+
+            return compute(_publish)
+    finally:
+        # remove enquanto ainda detém o lock; quem abrir o caminho depois cria outro
+        for p in (progress_path, lock_path):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+        os.close(fd)
+
+
+__all__ = ["run", "SINGLE_FLIGHT_DIR"]
@@ -0,0 +1,118 @@
+"""
+Conexão SMTP persistente para o envio de e-mails (services/mailer).
+
+Abrir a conexão (TCP + EHLO + STARTTLS + AUTH) custa mais que enviar a
+mensagem; SmtpConexao abre uma vez e reaproveita entre envios, fecha depois
+de SMTP_IDLE segundos parada e reconecta se o servidor derrubou a conexão.
+Não é thread-safe: o mailer a usa a partir de uma única thread.
+
+Para testes/desenvolvimento, qualquer servidor SMTP local serve de dublê
+(ex.: `python -m aiosmtpd -n -l localhost:1025`): SMTP_STARTTLS=0 e sem
+SMTP_USERNAME a conexão não negocia TLS nem autentica.
+"""
+import os
+import ssl
+import time
+import smtplib
+from email.message import EmailMessage
+from typing import Optional
+
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") not in ("0", "false", "False")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "15"))
+SMTP_IDLE = float(os.getenv("SMTP_IDLE", "60"))
+MAIL_FROM = os.getenv("MAIL_FROM")
+
+
+def mensagem(remetente: str, destinatario: str, assunto: str, corpo: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = remetente
+    msg["To"] = destinatario
+    msg["Subject"] = assunto
+    msg.set_content(corpo)
+    return msg
+
+
+def erro_permanente(exc: BaseException) -> bool:
+    """Recusas 5xx (destinatário inexistente, mensagem rejeitada) não adiantam repetir."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 500 <= exc.smtp_code < 600 and not isinstance(exc, smtplib.SMTPAuthenticationError)
+    return False
+
+
+class SmtpConexao:
+    """Uma conexão SMTP reaproveitada entre envios."""
+
+    def __init__(
+        self,
+        host: Optional[str] = SMTP_HOST,
+        port: int = SMTP_PORT,
+        username: Optional[str] = SMTP_USERNAME,
+        password: Optional[str] = SMTP_PASSWORD,
+        starttls: bool = SMTP_STARTTLS,
+        timeout: float = SMTP_TIMEOUT,
+        idle: float = SMTP_IDLE,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle = idle
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._usada_em = 0.0
+
+    def _abrir(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls(context=ssl.create_default_context())
+            if self.username and self.password:
+                smtp.login(self.username, self.password)
+        except BaseException:
+            smtp.close()
+            raise
+        return smtp
+
+    def enviar(self, msg: EmailMessage) -> None:
+        """Envia pela conexão aberta, reconectando uma vez se ela tiver caído."""
+        self.fechar_se_ociosa()
+        for tentativa in range(2):
+            if self._smtp is None:
+                self._smtp = self._abrir()
+                self._usada_em = time.monotonic()
+            try:
+                self._smtp.send_message(msg)
+                self._usada_em = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._smtp = None
+                if tentativa:
+                    raise
+            except smtplib.SMTPRecipientsRefused:
+                raise  # a conexão continua boa
+            except (smtplib.SMTPException, OSError):
+                self.fechar()  # estado da sessão incerto: a próxima abre outra
+                raise
+
+    def fechar_se_ociosa(self) -> None:
+        if self._smtp is not None and time.monotonic() - self._usada_em > self.idle:
+            self.fechar()
+
+    def fechar(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            smtp.close()
+
+
+__all__ = ["SMTP_HOST", "MAIL_FROM", "mensagem", "erro_permanente", "SmtpConexao"]
@@ -0,0 +1,234 @@
+"""
+Canal de progresso das tasks Celery no Postgres.
+
+Workers (síncronos, psycopg2): ProgressReporter grava a última mensagem do
+job na tabela task_progress e emite NOTIFY; as escritas são limitadas a uma
+a cada PROGRESS_MIN_INTERVAL segundos por job, e mensagens que chegam nesse
+intervalo são coalescidas (vale a mais recente, gravada ao fim do intervalo).
+
+API (asyncpg): get_progress() lê o estado atual e ProgressHub mantém uma
+única conexão em LISTEN por processo, repassando as notificações para as
+conexões SSE de /tasks/{id}/events.
+"""
+import os
+import time
+import asyncio
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+import asyncpg
+
+from database.postgres import _dsn_from_env, conexao
+from database.postgres_sync import psycopg2, sync_cursor
+
+PROGRESS_CHANNEL = "task_progress"
+PROGRESS_MIN_INTERVAL = float(os.getenv("PROGRESS_MIN_INTERVAL", "1.0"))
+
+CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS task_progress (
+    task_id    TEXT PRIMARY KEY,
+    progress   TEXT,
+    seq        BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_task_progress_updated ON task_progress(updated_at);
+"""
+
+UPSERT_SQL = """
+INSERT INTO task_progress (task_id, progress) VALUES (%s, %s)
+ON CONFLICT (task_id) DO UPDATE
+   SET progress = EXCLUDED.progress, seq = task_progress.seq + 1, updated_at = now();
+SELECT pg_notify(%s, %s);
+"""
+
+
+async def ensure_progress_schema():
+    """Cria a tabela de progresso (conexão efêmera, roda no mestre)."""
+    conn = await asyncpg.connect(dsn=_dsn_from_env())
+    try:
+        await conn.execute(CREATE_SQL)
+    finally:
+        await conn.close()
+
+
+# ───────────────────────────── lado do worker ─────────────────────────────
+_schema_ok = False
+
+
+def _write(task_id: str, msg: Optional[str]) -> None:
+    """Uma escrita (upsert + NOTIFY; só NOTIFY se msg=None); tenta de novo se a conexão caiu."""
+    global _schema_ok
+    if psycopg2 is None:
+        return
+    for tentativa in range(2):
+        try:
+            with sync_cursor() as cur:
+                if not _schema_ok:
+                    cur.execute(CREATE_SQL)
+                    _schema_ok = True
+                if msg is None:
+                    cur.execute("SELECT pg_notify(%s, %s)", (PROGRESS_CHANNEL, task_id))
+                else:
+                    cur.execute(UPSERT_SQL, (task_id, msg, PROGRESS_CHANNEL, task_id))
+            return
+        except psycopg2.Error as e:
+            if tentativa:
+                print(f"⚠️ Falha ao gravar progresso de {task_id}: {e}")
+
+
+class ProgressReporter:
+    """Progresso de um job com escritas limitadas e coalescidas."""
+
+    def __init__(self, task_id: str, min_interval: float = PROGRESS_MIN_INTERVAL):
+        self.task_id = task_id
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+        self._pending: Optional[str] = None
+        self._timer: Optional[threading.Timer] = None
+
+    def __call__(self, msg: str) -> None:
+        with self._lock:
+            wait = self._last_write + self.min_interval - time.monotonic()
+            if wait > 0:
+                # dentro do intervalo: guarda só a mais recente e agenda a escrita
+                self._pending = msg
+                if self._timer is None:
+                    self._timer = threading.Timer(wait, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            self._last_write = time.monotonic()
+        _write(self.task_id, msg)
+
+    def flush(self) -> None:
+        """Grava a mensagem pendente, se houver (fim do intervalo ou da task)."""
+        with self._lock:
+            msg, self._pending = self._pending, None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if msg is None:
+                return
+            self._last_write = time.monotonic()
+        _write(self.task_id, msg)
+
+
+_reporters: Dict[str, ProgressReporter] = {}
+_reporters_lock = threading.Lock()
+
+
+def reporter(task_id: str) -> ProgressReporter:
+    """Reporter do job neste processo (estágios do mesmo job compartilham o limite)."""
+    with _reporters_lock:
+        rep = _reporters.get(task_id)
+        if rep is None:
+            rep = _reporters[task_id] = ProgressReporter(task_id)
+        return rep
+
+
+def flush(task_id: str) -> None:
+    """Grava o pendente e descarta o reporter do job (chamar ao fim da task)."""
+    with _reporters_lock:
+        rep = _reporters.pop(task_id, None)
+    if rep is not None:
+        rep.flush()
+
+
+def done(task_id: str) -> None:
+    """Fim do job: grava o pendente e avisa os ouvintes para lerem o resultado."""
+    flush(task_id)
+    _write(task_id, None)
+
+
+def ultimo(task_id: str) -> Optional[Tuple[int, str]]:
+    """(seq, mensagem) mais recente do job, lida pelo worker (None se não houver)."""
+    if psycopg2 is None:
+        return None
+    try:
+        with sync_cursor() as cur:
+            cur.execute("SELECT seq, progress FROM task_progress WHERE task_id=%s", (task_id,))
+            row = cur.fetchone()
+    except psycopg2.Error as e:
+        print(f"⚠️ Falha ao ler progresso de {task_id}: {e}")
+        return None
+    return None if row is None or row[1] is None else (row[0], row[1])
+
+
+def purge(older_than: int) -> int:
+    """Remove o progresso de jobs sem atualização há mais de older_than segundos."""
+    if psycopg2 is None:
+        return 0
+    try:
+        with sync_cursor() as cur:
+            cur.execute(
+                "DELETE FROM task_progress WHERE updated_at < now() - make_interval(secs => %s)",
+                (older_than,),
+            )
+            return cur.rowcount
+    except psycopg2.Error as e:
+        print(f"⚠️ Falha ao limpar progresso: {e}")
+        return 0
+
+
+# ────────────────────────────── lado da API ──────────────────────────────
+async def get_progress(task_id: str) -> Optional[asyncpg.Record]:
+    """Último progresso gravado do job (progress, seq, updated_at) ou None."""
+    async with conexao() as conn:
+        return await conn.fetchrow(
+            "SELECT progress, seq, updated_at FROM task_progress WHERE task_id=$1", task_id
+        )
+
+
+class ProgressHub:
+    """Uma conexão LISTEN por processo, com fan-out por task_id para o SSE."""
+
+    def __init__(self):
+        self._conn: Optional[asyncpg.Connection] = None
+        self._lock = asyncio.Lock()
+        self._subs: Dict[str, Set[asyncio.Queue]] = {}
+
+    async def _ensure(self) -> None:
+        async with self._lock:
+            if self._conn is None or self._conn.is_closed():
+                self._conn = await asyncpg.connect(dsn=_dsn_from_env())
+                await self._conn.add_listener(PROGRESS_CHANNEL, self._on_notify)
+
+    def _on_notify(self, conn, pid, channel, task_id: str) -> None:
+        for q in self._subs.get(task_id, ()):
+            q.put_nowait(task_id)
+
+    async def subscribe(self, task_id: str) -> asyncio.Queue:
+        await self._ensure()
+        q: asyncio.Queue = asyncio.Queue()
+        self._subs.setdefault(task_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, task_id: str, q: asyncio.Queue) -> None:
+        subs = self._subs.get(task_id)
+        if subs:
+            subs.discard(q)
+            if not subs:
+                self._subs.pop(task_id, None)
+
+    async def close(self) -> None:
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+
+
+hub = ProgressHub()
+
+
+__all__ = [
+    "ensure_progress_schema",
+    "ProgressReporter",
+    "reporter",
+    "flush",
+    "done",
+    "ultimo",
+    "purge",
+    "get_progress",
+    "ProgressHub",
+    "hub",
+]
@@ -0,0 +1,245 @@
+"""
+Orçamento de tokens para chamadas de LLM: contagem com o tokenizer real
+(tiktoken, cacheado por modelo), janelas de contexto conhecidas e
+distribuição do orçamento entre relatório, instruções e documentos de referência.
+"""
+import os
+import math
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken é opcional; sem ele caímos numa heurística conservadora
+    tiktoken = None
+
+
+class TokenBudgetError(ValueError):
+    """A requisição não cabe na janela de contexto do modelo (seria rejeitada pela API)."""
+
+
+# Janela de contexto total (entrada + saída) por prefixo de modelo.
+# O prefixo mais longo que casar vence: "gpt-4o-mini" antes de "gpt-4o".
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-5": 400_000,
+    "gpt-4.1": 1_047_576,
+    "gpt-4o": 128_000,
+    "gpt-4o-mini": 128_000,
+    "gpt-4-turbo": 128_000,
+    "gpt-4": 8_192,
+    "gpt-3.5-turbo": 16_385,
+    "o1": 200_000,
+    "o3": 200_000,
+    "o4-mini": 200_000,
+    "claude": 200_000,
+}
+
+# Máximo de tokens de saída aceito por prefixo de modelo.
+MODEL_MAX_OUTPUT_TOKENS: Dict[str, int] = {
+    "gpt-5": 128_000,
+    "gpt-4.1": 32_768,
+    "gpt-4o": 16_384,
+    "gpt-4o-mini": 16_384,
+    "gpt-4-turbo": 4_096,
+    "gpt-4": 8_192,
+    "gpt-3.5-turbo": 4_096,
+    "o1": 100_000,
+    "o3": 100_000,
+    "o4-mini": 100_000,
+    "claude-3-5": 8_192,
+    "claude-3-7": 64_000,
+    "claude-sonnet-4": 64_000,
+    "claude-opus-4": 32_000,
+    "claude": 4_096,
+}
+
+# Tokens extras que a API cobra por mensagem (papel + delimitadores)
+TOKENS_PER_MESSAGE = 4
+SAFETY_TOKENS = int(os.getenv("LLM_SAFETY_TOKENS", "512"))
+MIN_OUTPUT_TOKENS = int(os.getenv("LLM_MIN_OUTPUT_TOKENS", "4096"))
+# Claude não tem tokenizer público: contamos com cl100k e aplicamos uma margem
+ANTHROPIC_TOKEN_FACTOR = float(os.getenv("LLM_ANTHROPIC_TOKEN_FACTOR", "1.2"))
+# Heurística sem tiktoken: texto jurídico em PT fica perto de 3 chars/token
+FALLBACK_CHARS_PER_TOKEN = 3.0
+
+
+def _lookup(table: Dict[str, int], model: str) -> Optional[int]:
+    m = model.lower()
+    matches = [k for k in table if m.startswith(k)]
+    if not matches:
+        return None
+    return table[max(matches, key=len)]
+
+
+def _model_env_key(model: str) -> str:
+    return model.upper().replace("-", "_").replace(".", "_")
+
+
+def context_window(model: str) -> int:
+    """Janela de contexto do modelo (override por env > tabela > LLM_CONTEXT_WINDOW)."""
+    # permite override específico por modelo, ex.: LLM_CONTEXT_WINDOW_GPT_5=128000
+    override = os.getenv(f"LLM_CONTEXT_WINDOW_{_model_env_key(model)}")
+    if override:
+        return int(override)
+    known = _lookup(MODEL_CONTEXT_WINDOWS, model)
+    if known:
+        return known
+    return int(os.getenv("LLM_CONTEXT_WINDOW", "32000"))
+
+
+def max_output_tokens(model: str) -> Optional[int]:
+    """Limite de tokens de saída do modelo, se conhecido."""
+    override = os.getenv(f"LLM_MAX_OUTPUT_{_model_env_key(model)}")
+    if override:
+        return int(override)
+    return _lookup(MODEL_MAX_OUTPUT_TOKENS, model)
+
+
+@lru_cache(maxsize=32)
+def _encoding_for(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        m = model.lower()
+        name = "o200k_base" if m.startswith(("gpt-5", "gpt-4o", "gpt-4.1", "o1", "o3", "o4")) else "cl100k_base"
+        return tiktoken.get_encoding(name)
+
+
+def _is_anthropic(model: str) -> bool:
+    return model.lower().startswith("claude")
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Conta tokens de um texto com o tokenizer do modelo."""
+    if not text:
+        return 0
+    enc = _encoding_for(model)
+    if enc is None:
+        n = math.ceil(len(text) / FALLBACK_CHARS_PER_TOKEN)
+    else:
+        n = len(enc.encode(text, disallowed_special=()))
+    if _is_anthropic(model):
+        n = math.ceil(n * ANTHROPIC_TOKEN_FACTOR)
+    return n
+
+
+def count_message_tokens(messages: List[Dict[str, Any]], model: str) -> int:
+    """Conta os tokens de entrada de uma lista de mensagens chat."""
+    total = 3  # priming da resposta do assistente
+    for m in messages:
+        content = m.get("content", "")
+        if isinstance(content, list):
+            content = "".join(b.get("text", "") for b in content if isinstance(b, dict))
+        total += TOKENS_PER_MESSAGE + count_tokens(content or "", model)
+    return total
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str, suffix: str = "...") -> str:
+    """Corta o texto para caber em max_tokens (aproximado no fim para Anthropic)."""
+    if max_tokens <= 0 or not text:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    enc = _encoding_for(model)
+    budget = max_tokens
+    if _is_anthropic(model):
+        budget = int(max_tokens / ANTHROPIC_TOKEN_FACTOR)
+    budget = max(0, budget - 1)  # espaço para o sufixo
+    if enc is None:
+        return text[: int(budget * FALLBACK_CHARS_PER_TOKEN)] + suffix
+    return enc.decode(enc.encode(text, disallowed_special=())[:budget]) + suffix
+
+
+def output_reserve(model: str, desired: int) -> int:
+    """Tokens de saída a reservar: o desejado, limitado pelo teto do modelo."""
+    cap = max_output_tokens(model)
+    return min(desired, cap) if cap else desired
+
+
+def cap_output_tokens(model: str, messages: List[Dict[str, Any]], desired: int) -> int:
+    """
+    Calcula o limite de saída que cabe na janela. Levanta TokenBudgetError se
+    não sobrar nem o mínimo de saída (a API rejeitaria ou truncaria a sentença).
+    """
+    in_tokens = count_message_tokens(messages, model)
+    available = context_window(model) - in_tokens - SAFETY_TOKENS
+    limit = min(output_reserve(model, desired), available)
+    if limit < min(MIN_OUTPUT_TOKENS, desired):
+        raise TokenBudgetError(
+            f"Entrada com {in_tokens} tokens não cabe na janela de {context_window(model)} "
+            f"tokens de {model} (restariam {max(0, available)} para a saída)."
+        )
+    return limit
+
+
+def context_budget(model: str, fixed_messages: List[Dict[str, Any]], desired: int) -> int:
+    """
+    Tokens disponíveis para os documentos de referência, dado o que é fixo na
+    requisição (system prompt, relatório, instruções) e a saída a reservar.
+    Se a reserva desejada não couber, ela encolhe até metade do espaço livre,
+    nunca abaixo de MIN_OUTPUT_TOKENS.
+    """
+    available = context_window(model) - count_message_tokens(fixed_messages, model) - SAFETY_TOKENS
+    min_out = min(MIN_OUTPUT_TOKENS, desired)
+    if available < min_out:
+        raise TokenBudgetError(
+            f"Relatório e instruções já excedem a janela de {context_window(model)} tokens de {model}."
+        )
+    reserve = min(output_reserve(model, desired), max(min_out, available // 2))
+    return max(0, available - reserve)
+
+
+def rank_score(doc: Dict[str, Any]) -> float:
+    """Score usado para priorizar documentos (rerank > score do ES)."""
+    for k in ("score_rerank", "rerank_score", "score_es", "score"):
+        v = doc.get(k)
+        if isinstance(v, (int, float)):
+            return float(v)
+    return 0.0
+
+
+def allocate_context_budget(
+    docs: List[Tuple[Dict[str, Any], str]],
+    budget_tokens: int,
+    model: str,
+    *,
+    min_doc_tokens: int = 256,
+) -> List[Tuple[Dict[str, Any], str]]:
+    """
+    Distribui budget_tokens entre os documentos, do maior para o menor score.
+    Recebe pares (doc, texto) e devolve os pares que couberem, com o último
+    truncado se necessário, preservando a ordem por relevância.
+    """
+    ranked = sorted(docs, key=lambda dt: rank_score(dt[0]), reverse=True)
+    out: List[Tuple[Dict[str, Any], str]] = []
+    remaining = budget_tokens
+    for doc, texto in ranked:
+        if remaining < min_doc_tokens:
+            break
+        n = count_tokens(texto, model)
+        if n <= remaining:
+            out.append((doc, texto))
+            remaining -= n
+        else:
+            out.append((doc, truncate_to_tokens(texto, remaining, model)))
+            remaining = 0
+    return out
+
+
+__all__ = [
+    "TokenBudgetError",
+    "MODEL_CONTEXT_WINDOWS",
+    "MODEL_MAX_OUTPUT_TOKENS",
+    "context_window",
+    "max_output_tokens",
+    "count_tokens",
+    "count_message_tokens",
+    "truncate_to_tokens",
+    "output_reserve",
+    "cap_output_tokens",
+    "context_budget",
+    "rank_score",
+    "allocate_context_budget",
+]
@@ -0,0 +1,134 @@
+"""
+Recebimento de uploads em streaming: o corpo é gravado em disco em blocos e o
+SHA-256 é calculado durante a escrita. O pico de memória por upload fica no
+tamanho de um bloco, qualquer que seja o tamanho do PDF.
+"""
+import os
+import uuid
+import hashlib
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import HTTPException, UploadFile
+
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 1 MiB
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "/tmp/uploads"))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "200")) * 1024 * 1024
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_MB", "4096")) * 1024 * 1024
+
+
+@dataclass
+class StoredUpload:
+    """Upload já persistido: caminho em disco + hash do conteúdo."""
+    path: Path
+    sha256: str
+    size: int
+    filename: str
+
+
+async def salvar_upload(
+    upload: UploadFile,
+    dest_dir: Optional[Path] = None,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    suffix: str = ".pdf",
+) -> StoredUpload:
+    """
+    Copia o UploadFile para dest_dir em blocos de CHUNK_SIZE, calculando o
+    SHA-256 incrementalmente. Aborta com 413 assim que passar de max_bytes.
+    """
+    dest_dir = dest_dir or UPLOAD_DIR
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    path = dest_dir / f"{uuid.uuid4().hex}{suffix}"
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Arquivo muito grande. Máximo: {max_bytes // (1024 * 1024)}MB",
+                    )
+                h.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return StoredUpload(path=path, sha256=h.hexdigest(), size=size, filename=upload.filename or path.name)
+
+
+def extrair_pdfs_zip(
+    zip_path: Path,
+    dest_dir: Optional[Path] = None,
+    max_files: int = 500,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    max_total_bytes: int = MAX_BATCH_BYTES,
+) -> List[StoredUpload]:
+    """
+    Extrai os PDFs de um ZIP, um a um e em blocos (com hash), para dest_dir.
+    Ignora diretórios e arquivos que não sejam .pdf; os limites (max_bytes por
+    PDF, max_total_bytes no ZIP todo) são conferidos sobre os bytes
+    descompactados de fato, não sobre o cabeçalho do ZIP. Em qualquer erro
+    nada fica em dest_dir, nem o PDF que estava sendo escrito.
+    """
+    dest_dir = dest_dir or UPLOAD_DIR
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    extraidos: List[StoredUpload] = []
+    path: Optional[Path] = None
+    total = 0
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            membros = [m for m in zf.infolist() if not m.is_dir() and m.filename.lower().endswith(".pdf")]
+            if len(membros) > max_files:
+                raise HTTPException(status_code=413, detail=f"ZIP com mais de {max_files} PDFs")
+            for m in membros:
+                path = dest_dir / f"{uuid.uuid4().hex}.pdf"
+                h = hashlib.sha256()
+                size = 0
+                with zf.open(m) as src, open(path, "wb") as f:
+                    while True:
+                        chunk = src.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                        total += len(chunk)
+                        if size > max_bytes:
+                            raise HTTPException(
+                                status_code=413,
+                                detail=f"{m.filename}: arquivo muito grande. Máximo: {max_bytes // (1024 * 1024)}MB",
+                            )
+                        if total > max_total_bytes:
+                            raise HTTPException(
+                                status_code=413,
+                                detail=f"ZIP muito grande descompactado. Máximo: {max_total_bytes // (1024 * 1024)}MB",
+                            )
+                        h.update(chunk)
+                        f.write(chunk)
+                extraidos.append(StoredUpload(path=path, sha256=h.hexdigest(), size=size, filename=Path(m.filename).name))
+                path = None
+    except BaseException as exc:
+        # BadZipFile também pode vir no meio da extração (CRC de um membro)
+        if path is not None:
+            path.unlink(missing_ok=True)
+        for up in extraidos:
+            up.path.unlink(missing_ok=True)
+        if isinstance(exc, zipfile.BadZipFile):
+            raise HTTPException(status_code=400, detail="ZIP inválido") from exc
+        raise
+    return extraidos
+
+
+__all__ = [
+    "StoredUpload",
+    "salvar_upload",
+    "extrair_pdfs_zip",
+    "UPLOAD_DIR",
+    "MAX_UPLOAD_BYTES",
+    "MAX_BATCH_BYTES",
+]
@@ -0,0 +1,52 @@
+"""
+ZIP gerado em streaming: cada arquivo é comprimido e entregue ao cliente
+assim que fica pronto, sem montar o ZIP inteiro em memória ou em disco.
+"""
+import zipfile
+from typing import Iterable, Iterator, Tuple, Union
+
+
+class _Sink:
+    """Destino não-posicionável: zipfile grava com data descriptors e nós drenamos o buffer."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+
+    def write(self, data: bytes) -> int:
+        self._buf += data
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+def zip_stream(
+    arquivos: Iterable[Tuple[str, Union[str, bytes]]],
+    compression: int = zipfile.ZIP_DEFLATED,
+) -> Iterator[bytes]:
+    """Gera os bytes de um ZIP a partir de pares (nome, conteúdo)."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, mode="w", compression=compression) as zf:
+        for nome, conteudo in arquivos:
+            if isinstance(conteudo, str):
+                conteudo = conteudo.encode("utf-8")
+            zf.writestr(nome, conteudo)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    chunk = sink.drain()  # diretório central
+    if chunk:
+        yield chunk
+
+
+__all__ = ["zip_stream"]
@@ -2,11 +2,25 @@
 Módulo de tasks Celery para processamento assíncrono
 """
 from .celery_app import celery_app
-from .pdf_tasks import processar_pdf_task, gerar_sentenca_task, buscar_documentos_task
+from .pdf_tasks import (
+    processar_pdf_task,
+    acompanhar_relatorio_task,
+    ocr_shard_task,
+    montar_secoes_task,
+    resumir_secao_task,
+    montar_relatorio_task,
+    gerar_sentenca_task,
+    buscar_documentos_task,
+)
 
 __all__ = [
     'celery_app',
     'processar_pdf_task',
+    'acompanhar_relatorio_task',
+    'ocr_shard_task',
+    'montar_secoes_task',
+    'resumir_secao_task',
+    'montar_relatorio_task',
     'gerar_sentenca_task',
     'buscar_documentos_task',
 ]
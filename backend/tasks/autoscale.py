@@ -0,0 +1,137 @@
+"""
+Autoscaling dos workers pela profundidade das filas e pelo histórico de execução.
+
+O autoscaler padrão do Celery olha só as mensagens já reservadas pelo worker,
+que com prefetch 1 nunca passam do nº de processos: o pool cresce de um em um.
+BacklogAutoscaler consulta no broker quantas mensagens esperam nas filas do
+worker, multiplica pelo tempo médio das tasks dessas filas (services/queue_stats)
+e dimensiona o pool para drenar o backlog em AUTOSCALE_DRAIN_TARGET segundos,
+entre os limites de --autoscale=max,min.
+
+Só pools que crescem/encolhem (prefork) usam o autoscaler; o worker de LLM
+(threads) mantém concorrência fixa, já que threads ociosas quase não custam.
+"""
+import math
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from celery.worker import state
+from celery.worker.autoscale import Autoscaler
+
+from services import queue_stats
+from .config import CeleryConfig
+
+
+def capacidade_alvo(
+    mensagens: int,
+    tempo_medio: float,
+    ocupados: int,
+    minimo: int,
+    maximo: int,
+    meta_drenagem: float = CeleryConfig.AUTOSCALE_DRAIN_TARGET,
+) -> int:
+    """Nº de processos para drenar `mensagens` em `meta_drenagem` segundos, sem matar os ocupados."""
+    alvo = math.ceil(mensagens * tempo_medio / meta_drenagem) if mensagens else 0
+    return max(minimo, min(maximo, max(alvo, ocupados)))
+
+
+def profundidade(app, filas: Iterable[str]) -> Dict[str, Tuple[Optional[int], Optional[int]]]:
+    """Mensagens prontas e consumidores por fila no broker ((None, None) se a fila não existe)."""
+    resultado: Dict[str, Tuple[Optional[int], Optional[int]]] = {}
+    with app.connection_for_read() as conn:
+        for fila in filas:
+            # declaração passiva: não cria a fila; um canal por fila porque o erro fecha o canal
+            try:
+                with conn.channel() as ch:
+                    _, mensagens, consumidores = ch.queue_declare(queue=fila, passive=True)
+                resultado[fila] = (mensagens, consumidores)
+            except Exception:
+                resultado[fila] = (None, None)
+    return resultado
+
+
+class BacklogAutoscaler(Autoscaler):
+    """Autoscaler por backlog: profundidade das filas × tempo médio das tasks."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._alvo: Optional[int] = None
+        self._avaliado_em = 0.0
+
+    def _filas(self):
+        return list(self.worker.app.amqp.queues.consume_from)
+
+    def _calcular_alvo(self) -> int:
+        filas = self._filas()
+        mensagens = sum(n or 0 for n, _ in profundidade(self.worker.app, filas).values())
+        medias = queue_stats.tempos_medios()
+        amostras = [medias[f] for f in filas if f in medias]
+        if amostras:
+            tempo_medio = sum(m * n for m, n in amostras) / sum(n for _, n in amostras)
+        else:
+            tempo_medio = CeleryConfig.AUTOSCALE_DEFAULT_RUNTIME
+        return capacidade_alvo(
+            mensagens, tempo_medio, len(state.active_requests),
+            self.min_concurrency, self.max_concurrency,
+        )
+
+    def _maybe_scale(self, req=None):
+        # chamado a cada mensagem recebida: a consulta ao broker/banco é refeita a cada intervalo
+        agora = time.monotonic()
+        if self._alvo is None or agora - self._avaliado_em >= CeleryConfig.AUTOSCALE_INTERVAL:
+            self._avaliado_em = agora
+            try:
+                self._alvo = self._calcular_alvo()
+            except Exception as e:
+                print(f"⚠️ Autoscaler sem métricas ({e}); usando o critério padrão")
+                self._alvo = None
+                return super()._maybe_scale(req)
+
+        procs = self.processes
+        if self._alvo > procs:
+            print(f"📈 Autoscaler: {procs} → {self._alvo} processos")
+            self.scale_up(self._alvo - procs)
+            return True
+        if self._alvo < procs:
+            # scale_down respeita o keepalive desde o último crescimento
+            self.scale_down(procs - self._alvo)
+            return True
+
+
+# ─────────────────────── histórico de execução (sinais) ───────────────────────
+_execucoes: Dict[str, Tuple[str, float, float]] = {}
+_execucoes_lock = threading.Lock()
+
+
+@before_task_publish.connect
+def _marcar_publicacao(sender=None, headers=None, **kwargs):
+    # mensagens com eta/countdown (retries) não contam como espera na fila
+    if headers is not None and not headers.get("eta"):
+        headers.setdefault("enqueued_at", time.time())
+
+
+@task_prerun.connect
+def _inicio_execucao(task_id=None, task=None, **kwargs):
+    if task is None or task.name.startswith("celery."):
+        return
+    req = task.request
+    publicado = getattr(req, "enqueued_at", None) or (getattr(req, "headers", None) or {}).get("enqueued_at")
+    inicio = time.time()
+    fila = (req.delivery_info or {}).get("routing_key") or CeleryConfig.TASK_DEFAULT_QUEUE
+    with _execucoes_lock:
+        _execucoes[task_id] = (fila, inicio, inicio - float(publicado) if publicado else 0.0)
+
+
+@task_postrun.connect
+def _fim_execucao(task_id=None, task=None, **kwargs):
+    with _execucoes_lock:
+        execucao = _execucoes.pop(task_id, None)
+    if execucao is None:
+        return
+    fila, inicio, espera = execucao
+    queue_stats.registrar(fila, task.name, inicio, espera, time.time() - inicio)
+
+
+__all__ = ["BacklogAutoscaler", "capacidade_alvo", "profundidade"]
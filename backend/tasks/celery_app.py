@@ -2,6 +2,7 @@
 Configuração da aplicação Celery
 """
 from celery import Celery
+from kombu import Queue
 from .config import CeleryConfig
 
 # Criar instância do Celery
@@ -26,9 +27,62 @@ celery_app.conf.update(
     task_default_retry_delay=CeleryConfig.TASK_DEFAULT_RETRY_DELAY,
     worker_prefetch_multiplier=CeleryConfig.WORKER_PREFETCH_MULTIPLIER,
     worker_max_tasks_per_child=CeleryConfig.WORKER_MAX_TASKS_PER_CHILD,
+    worker_autoscaler=CeleryConfig.WORKER_AUTOSCALER,
     result_expires=CeleryConfig.RESULT_EXPIRES,
+    task_routes=CeleryConfig.TASK_ROUTES,
+    task_queues=[
+        Queue(name, routing_key=name, queue_arguments={'x-max-priority': CeleryConfig.QUEUE_MAX_PRIORITY})
+        for name in (
+            CeleryConfig.QUEUE_OCR,
+            CeleryConfig.QUEUE_LLM,
+            CeleryConfig.QUEUE_RETRIEVAL,
+            CeleryConfig.TASK_DEFAULT_QUEUE,
+        )
+    ],
+    task_default_queue=CeleryConfig.TASK_DEFAULT_QUEUE,
+    task_queue_max_priority=CeleryConfig.QUEUE_MAX_PRIORITY,
+    task_default_priority=CeleryConfig.TASK_DEFAULT_PRIORITY,
+    task_inherit_parent_priority=True,
+    beat_schedule={
+        'limpar-blobs': {
+            'task': 'tasks.limpar_blobs',
+            'schedule': CeleryConfig.BLOB_GC_INTERVAL,
+        },
+        'limpar-progresso': {
+            'task': 'tasks.limpar_progresso',
+            'schedule': CeleryConfig.BLOB_GC_INTERVAL,
+        },
+        'limpar-artefatos': {
+            'task': 'tasks.limpar_artefatos',
+            'schedule': CeleryConfig.BLOB_GC_INTERVAL,
+        },
+        'limpar-checkpoints': {
+            'task': 'tasks.limpar_checkpoints',
+            'schedule': CeleryConfig.BLOB_GC_INTERVAL,
+        },
+        'limpar-codigos-login': {
+            'task': 'tasks.limpar_codigos_login',
+            'schedule': CeleryConfig.BLOB_GC_INTERVAL,
+        },
+        'limpar-cache-llm': {
+            'task': 'tasks.limpar_cache_llm',
+            'schedule': CeleryConfig.BLOB_GC_INTERVAL,
+        },
+        'limpar-lotes': {
+            'task': 'tasks.limpar_lotes',
+            'schedule': CeleryConfig.BLOB_GC_INTERVAL,
+        },
+        # rede de segurança: o despacho normal é disparado pelo fim de cada job
+        'despachar-lotes': {
+            'task': 'tasks.despachar_lotes',
+            'schedule': CeleryConfig.BATCH_DISPATCH_INTERVAL,
+        },
+    },
 )
 
+# Sinais do histórico de execução (publicação na API, execução nos workers)
+from . import autoscale  # noqa: E402,F401
+
 # Auto-discover tasks
 celery_app.autodiscover_tasks(['tasks'])
 
@@ -39,6 +39,42 @@ class CeleryConfig:
     WORKER_PREFETCH_MULTIPLIER: int = 1
     WORKER_MAX_TASKS_PER_CHILD: int = 1000
     
+    # Filas por tipo de carga: OCR (CPU) não segura buscas curtas nem chamadas de LLM
+    QUEUE_OCR: str = 'cpu-ocr'
+    QUEUE_LLM: str = 'llm-io'
+    QUEUE_RETRIEVAL: str = 'retrieval'
+    TASK_DEFAULT_QUEUE: str = 'maintenance'  # tarefas do beat
+    TASK_ROUTES: dict = {
+        'tasks.processar_pdf': {'queue': QUEUE_OCR},
+        'tasks.pdf.ocr_shard': {'queue': QUEUE_OCR},
+        'tasks.pdf.montar_secoes': {'queue': QUEUE_OCR},
+        'tasks.pdf.resumir_secao': {'queue': QUEUE_LLM},
+        'tasks.pdf.montar_relatorio': {'queue': QUEUE_LLM},
+        'tasks.pdf.acompanhar': {'queue': QUEUE_LLM},
+        'tasks.gerar_sentenca': {'queue': QUEUE_LLM},
+        'tasks.buscar_documentos': {'queue': QUEUE_RETRIEVAL},
+    }
+    
+    # Prioridades (RabbitMQ: 0 = menor, QUEUE_MAX_PRIORITY = maior).
+    # Pedidos interativos passam à frente de lotes na mesma fila; os
+    # estágios do canvas herdam a prioridade da task que os disparou.
+    QUEUE_MAX_PRIORITY: int = 10
+    PRIORITY_INTERACTIVE: int = int(os.getenv('CELERY_PRIORITY_INTERACTIVE', 8))
+    PRIORITY_BATCH: int = int(os.getenv('CELERY_PRIORITY_BATCH', 2))
+    TASK_DEFAULT_PRIORITY: int = 5
+    
+    # Autoscaling (limites vêm de --autoscale=max,min em cada worker)
+    WORKER_AUTOSCALER: str = 'tasks.autoscale:BacklogAutoscaler'
+    AUTOSCALE_DRAIN_TARGET: float = float(os.getenv('AUTOSCALE_DRAIN_TARGET', 5 * 60))  # drenar o backlog em 5 min
+    AUTOSCALE_INTERVAL: float = float(os.getenv('AUTOSCALE_INTERVAL', 10))  # reconsulta broker/histórico
+    AUTOSCALE_DEFAULT_RUNTIME: float = float(os.getenv('AUTOSCALE_DEFAULT_RUNTIME', 60))  # sem histórico
+    
     # Result Expiration
     RESULT_EXPIRES: int = 24 * 60 * 60  # 24 horas
+    
+    # Coleta de blobs (payloads das tasks) expirados
+    BLOB_GC_INTERVAL: int = int(os.getenv('BLOB_GC_INTERVAL', 60 * 60))  # 1 hora
+    
+    # Reavaliação periódica das vagas dos lotes
+    BATCH_DISPATCH_INTERVAL: int = int(os.getenv('BATCH_DISPATCH_INTERVAL', 30))
 
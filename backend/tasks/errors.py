@@ -0,0 +1,50 @@
+"""
+Classificação de erros das tasks: permanentes falham na hora (repetir daria
+o mesmo resultado); os demais (rede, sobrecarga, banco) entram em retry.
+"""
+import zipfile
+
+from celery import Task
+from pydantic import ValidationError
+from pypdf.errors import PdfReadError
+
+from services.blob_store import BlobNotFound
+from services.model_router import AllTiersFailed, is_failover_error
+from services.token_budget import TokenBudgetError
+
+
+class NonRetryableError(Exception):
+    """Erro de entrada/validação que nenhuma nova tentativa resolveria."""
+
+
+# Só erros de validação explícitos. ValueError/KeyError/TypeError genéricos
+# ficam de fora: JSONDecodeError e UnicodeDecodeError (blob truncado, resposta
+# instável) são ValueError e costumam passar numa nova tentativa.
+PERMANENT_ERRORS = (
+    NonRetryableError,
+    PdfReadError,
+    BlobNotFound,
+    zipfile.BadZipFile,
+    TokenBudgetError,
+    ValidationError,
+)
+
+
+def is_permanent(exc: BaseException) -> bool:
+    if isinstance(exc, AllTiersFailed):
+        # todos os tiers recusaram o prompt pelo orçamento de tokens: não adianta repetir
+        return not is_failover_error(exc)
+    return isinstance(exc, PERMANENT_ERRORS)
+
+
+def retry_or_fail(task: Task, exc: BaseException, countdown: int) -> BaseException:
+    """
+    Uso: `raise retry_or_fail(self, exc, countdown=60)`. Erros permanentes
+    são devolvidos como estão (a task falha); os demais viram self.retry().
+    """
+    if is_permanent(exc):
+        return exc
+    return task.retry(exc=exc, countdown=countdown)
+
+
+__all__ = ["NonRetryableError", "PERMANENT_ERRORS", "is_permanent", "retry_or_fail"]
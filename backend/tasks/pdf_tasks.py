@@ -4,37 +4,126 @@ Tasks Celery para processamento de PDFs e geração de sentenças
 import os
 import uuid
 import json
-from pathlib import Path as FSPath
+import asyncio
+import threading
 from typing import List, Optional, Dict, Any
-from celery import Task
+from celery import Task, chord, group
 from celery.utils.log import get_task_logger
 
 from .celery_app import celery_app
-from .models import ProcessarPDFResult, GerarSentencaResult, TaskStatus
-from preprocessing.process_report_pipeline import Config, generate as gerar_relatorio
+from .config import CeleryConfig
+from .errors import NonRetryableError, is_permanent, retry_or_fail
+from .models import ProcessarPDFResult, GerarSentencaResult
+from preprocessing.process_report_pipeline import (
+    Config,
+    finalize_report,
+    ocr_pages,
+    pages_from_texts,
+    prepare_summary_chunks,
+    read_cached_report,
+    report_cache_path,
+    scan_pdf_text,
+    summarize_section,
+)
 from services.retrieval_rerank import recuperar_documentos_similares as semantic_search_rerank
 from services.llm import gerar_sentenca_llm
-from services.docx_utils import salvar_sentenca_como_docx, salvar_docs_referencia
-from services.docx_parser import parse_docx_bytes
+from services.docx_render import spec_referencias, spec_sentenca
+from services.docx_parser import parse_docx_many
+from services import artifacts, auth_store, batches, blob_store, checkpoints, llm_cache, mailer, pdf_inflight, task_progress
 from utils import (
     extrair_numero_processo,
     gerar_nome_arquivo_sentenca,
     gerar_nome_arquivo_referencias,
     decodificar_unicode,
-    limpar_arquivo_temporario,
 )
 
 logger = get_task_logger(__name__)
 
+# Páginas por shard de OCR (cada shard é uma task na fila de OCR)
+OCR_SHARD_PAGES = int(os.getenv("OCR_SHARD_PAGES", "25"))
+
+# Intervalo com que um job seguidor consulta o relatório do líder (mesmo PDF)
+PDF_FOLLOW_POLL = int(os.getenv("PDF_FOLLOW_POLL", "5"))
+
+# Um event loop persistente por thread do worker: reaproveita o cliente
+# assíncrono do LLM entre tasks em vez de recriar loop/conexões a cada chamada.
+_loop_local = threading.local()
+
+
+def run_async(coro):
+    """Executa uma corrotina no loop persistente da thread atual do worker."""
+    loop = getattr(_loop_local, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _loop_local.loop = loop
+    return loop.run_until_complete(coro)
+
 
 class CallbackTask(Task):
-    """Task com callback de progresso"""
+    """
+    Task com callback de progresso. Só a task que termina o job (o id que o
+    cliente consulta) chega aqui com task_id == job_id; estágios com id
+    próprio usam StageTask.
+    """
     
     def on_success(self, retval, task_id, args, kwargs):
         logger.info(f'Task {task_id} succeeded: {retval}')
+        task_progress.done(task_id)
+    
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        logger.error(f'Task {task_id} failed: {exc}')
+        task_progress.done(task_id)
+
+
+class StageTask(Task):
+    """
+    Estágio paralelo de um job (shard de OCR, resumo de seção), com id
+    próprio e o job_id como primeiro argumento. O progresso do job é gravado
+    pelo próprio estágio (task_progress.flush(job_id) ao terminar); na falha
+    definitiva os ouvintes do job são avisados para lerem o erro.
+    """
+    
+    def on_success(self, retval, task_id, args, kwargs):
+        logger.info(f'Task {task_id} succeeded')
     
     def on_failure(self, exc, task_id, args, kwargs, einfo):
         logger.error(f'Task {task_id} failed: {exc}')
+        task_progress.done(args[0])
+
+
+def _progresso(task: Task, job_id: str, msg: str) -> None:
+    """
+    Publica progresso no id do job (o que o cliente consulta), não no do
+    estágio. Vai para o canal de progresso (escritas limitadas e coalescidas),
+    não para o result backend.
+    """
+    task_progress.reporter(job_id)(msg)
+
+
+def _substituir(task: Task, job_id: str, sig) -> BaseException:
+    """
+    task.replace(sig) gravando antes o progresso pendente do job: a task
+    substituída não passa por on_success, e o reporter ficaria no processo.
+    """
+    task_progress.flush(job_id)
+    return task.replace(sig)
+
+
+def _falhar_estagio(task: Task, job_id: str, exc: BaseException, countdown: int) -> BaseException:
+    """
+    retry_or_fail() dos estágios do relatório: na falha definitiva (erro
+    permanente ou retries esgotados) libera o PDF para outro job assumir.
+    """
+    if is_permanent(exc) or task.request.retries >= task.max_retries:
+        pdf_inflight.liberar(job_id)
+    return retry_or_fail(task, exc, countdown)
+
+
+def _resultado_relatorio(texto: str) -> Dict[str, Any]:
+    return ProcessarPDFResult(
+        relatorio=texto,
+        numero_processo=extrair_numero_processo(texto),
+    ).dict()
 
 
 @celery_app.task(
@@ -44,66 +133,229 @@ class CallbackTask(Task):
     max_retries=3,
     default_retry_delay=60
 )
-def processar_pdf_task(self, pdf_data: bytes, filename: str) -> Dict[str, Any]:
+def processar_pdf_task(self, blob_key: str, filename: str) -> Dict[str, Any]:
     """
-    Processa um PDF e extrai o relatório do processo
+    Processa um PDF e extrai o relatório do processo.
+    
+    Lê o texto direto das páginas e se substitui pelo canvas:
+        chord(OCR por faixa de páginas) → montar_secoes
+        → chord(resumo por seção) → montar_relatorio
+    O resultado final fica no id desta task (Task.replace herda o id).
+    Se outro job já processa o mesmo PDF, esta task vira seguidora dele
+    (acompanhar_relatorio_task) em vez de disparar outro canvas.
     
     Args:
-        pdf_data: Bytes do arquivo PDF
+        blob_key: Chave do PDF no blob store (SHA-256 do conteúdo)
         filename: Nome do arquivo original
         
     Returns:
         Dict com relatorio e numero_processo
     """
-    tmp_id = uuid.uuid4().hex
-    tmp_path = f"/tmp/{tmp_id}.pdf"
-    
+    job_id = self.request.id
     try:
-        # Atualiza status para PROCESSING
-        self.update_state(
-            state=TaskStatus.PROCESSING,
-            meta={'progress': 'Salvando arquivo PDF...'}
-        )
-        
-        # Salva arquivo temporário
-        with open(tmp_path, "wb") as f:
-            f.write(pdf_data)
-        
-        self.update_state(
-            state=TaskStatus.PROCESSING,
-            meta={'progress': 'Processando PDF e extraindo texto...'}
-        )
-        
-        # Processa o PDF
-        cfg = Config()
+        # A chave é o hash do conteúdo: serve direto como digest do cache
+        cached = read_cached_report(blob_key)
+        if cached is not None:
+            _progresso(self, job_id, "♻️ Usando relatório em cache...")
+            return _resultado_relatorio(cached)
         
-        def on_progress(msg: str):
-            """Callback de progresso"""
-            self.update_state(
-                state=TaskStatus.PROCESSING,
-                meta={'progress': msg}
-            )
-        
-        texto = gerar_relatorio(FSPath(tmp_path), cfg, on_progress=on_progress)
-        
-        # Extrai número do processo se presente
-        numero_processo = extrair_numero_processo(texto)
-        
-        resultado = ProcessarPDFResult(
-            relatorio=texto,
-            numero_processo=numero_processo
-        )
-        
-        return resultado.dict()
+        lider = pdf_inflight.assumir(blob_key, job_id)
+        if lider != job_id:
+            _progresso(self, job_id, "⏳ Este PDF já está sendo processado; acompanhando o job em andamento...")
+        else:
+            extracao = checkpoints.run_stage(job_id, 'extracao', lambda: _extrair(self, job_id, blob_key))
     
     except Exception as exc:
         logger.error(f"Erro no processamento do PDF: {exc}", exc_info=True)
-        # Retry automático
-        raise self.retry(exc=exc, countdown=60)
+        # Retry automático (PDF corrompido/ausente falha na hora)
+        raise _falhar_estagio(self, job_id, exc, countdown=60)
+    
+    if lider != job_id:
+        raise _substituir(self, job_id, acompanhar_relatorio_task.si(blob_key, filename, lider))
+    
+    texts_key, pages_to_ocr = extracao['texts_key'], extracao['pages_to_ocr']
+    secoes = montar_secoes_task.s(job_id, blob_key, texts_key)
+    if not pages_to_ocr:
+        raise _substituir(self, job_id, secoes.clone(args=([],)))
+    
+    shards = [pages_to_ocr[i:i + OCR_SHARD_PAGES] for i in range(0, len(pages_to_ocr), OCR_SHARD_PAGES)]
+    _progresso(self, job_id, f"⚙️ OCR de {len(pages_to_ocr)} páginas em {len(shards)} partes...")
+    raise _substituir(self, job_id, chord(
+        group(ocr_shard_task.s(job_id, blob_key, shard) for shard in shards),
+        secoes,
+    ))
+
+
+def _extrair(task: Task, job_id: str, blob_key: str) -> Dict[str, Any]:
+    _progresso(task, job_id, 'Processando PDF e extraindo texto...')
+    texts, pages_to_ocr = scan_pdf_text(
+        blob_store.local_path(blob_key), Config(), on_progress=lambda m: _progresso(task, job_id, m)
+    )
+    # Texto das páginas vai para o blob store; a mensagem leva só a chave
+    texts_key = blob_store.put_bytes(json.dumps(texts, ensure_ascii=False).encode("utf-8"))
+    return {'texts_key': texts_key, 'pages_to_ocr': pages_to_ocr}
+
+
+@celery_app.task(
+    bind=True,
+    base=CallbackTask,
+    name='tasks.pdf.acompanhar',
+    max_retries=None,
+)
+def acompanhar_relatorio_task(
+    self,
+    blob_key: str,
+    filename: str,
+    lider_id: str,
+    seq: int = 0,
+) -> Dict[str, Any]:
+    """
+    Job seguidor de outro que processa o mesmo PDF: repassa o progresso do
+    líder e devolve o relatório quando ele chega ao cache. Cada consulta é
+    um retry com countdown (não prende um slot do worker esperando).
+    """
+    job_id = self.request.id
+    try:
+        cached = read_cached_report(blob_key)
+        if cached is not None:
+            _progresso(self, job_id, "♻️ Usando o resultado do job em andamento")
+            return _resultado_relatorio(cached)
+        atual = pdf_inflight.lider(blob_key)
+        ultimo = task_progress.ultimo(lider_id)
+    except Exception as exc:
+        logger.error(f"Erro ao acompanhar o job {lider_id}: {exc}", exc_info=True)
+        raise retry_or_fail(self, exc, countdown=PDF_FOLLOW_POLL)
+    
+    if atual != lider_id:
+        # o líder falhou (ou parou de renovar) sem gravar o relatório: este job processa
+        raise _substituir(self, job_id, processar_pdf_task.si(blob_key, filename))
+    
+    if ultimo is not None and ultimo[0] != seq:
+        seq = ultimo[0]
+        _progresso(self, job_id, ultimo[1])
+    task_progress.flush(job_id)
+    raise self.retry(args=(blob_key, filename, lider_id, seq), countdown=PDF_FOLLOW_POLL)
+
+
+@celery_app.task(
+    bind=True,
+    base=StageTask,
+    name='tasks.pdf.ocr_shard',
+    max_retries=3,
+    default_retry_delay=30
+)
+def ocr_shard_task(self, job_id: str, blob_key: str, pages: List[int]) -> Dict[str, str]:
+    """OCR de uma faixa de páginas; só esta faixa é refeita se falhar."""
+    def ocr() -> Dict[str, str]:
+        textos = ocr_pages(blob_store.local_path(blob_key), pages, parallel=False)
+        return {str(page): text for page, text in textos.items()}
+    
+    try:
+        pdf_inflight.manter(job_id)
+        textos = checkpoints.run_stage(job_id, f"ocr_{pages[0]}_{pages[-1]}", ocr)
+        _progresso(self, job_id, f"🔍 OCR das páginas {pages[0]}–{pages[-1]} concluído")
+        return textos
+    except Exception as exc:
+        logger.error(f"Erro no OCR das páginas {pages[0]}–{pages[-1]}: {exc}", exc_info=True)
+        raise _falhar_estagio(self, job_id, exc, countdown=30)
+    finally:
+        task_progress.flush(job_id)
+
+
+@celery_app.task(
+    bind=True,
+    base=CallbackTask,
+    name='tasks.pdf.montar_secoes',
+    max_retries=3,
+    default_retry_delay=30
+)
+def montar_secoes_task(
+    self,
+    ocr_results: List[Dict[str, str]],
+    job_id: str,
+    blob_key: str,
+    texts_key: str,
+) -> Dict[str, Any]:
+    """Junta o OCR ao texto das páginas, agrupa por peça e dispara os resumos."""
+    try:
+        pdf_inflight.manter(job_id)
+        cfg = Config()
+        texts = json.loads(blob_store.get_bytes(texts_key))
+        for shard in ocr_results:
+            for page, text in shard.items():
+                texts[int(page) - 1] = text
+        
+        chunks, process_number, section_id_map = prepare_summary_chunks(pages_from_texts(texts), cfg)
+    except Exception as exc:
+        logger.error(f"Erro ao agrupar as peças: {exc}", exc_info=True)
+        raise _falhar_estagio(self, job_id, exc, countdown=30)
+    
+    if process_number:
+        _progresso(self, job_id, f"📋 Processo nº {process_number} identificado")
+    relatorio = montar_relatorio_task.s(job_id, blob_key, process_number)
+    if not chunks:
+        raise _substituir(self, job_id, relatorio.clone(args=([],)))
     
+    _progresso(self, job_id, f"🧠 Resumindo {len(chunks)} partes do processo em paralelo...")
+    # o chord entrega os resultados na ordem do header: o prompt do relatório
+    # fica determinístico e um retry acerta o cache de respostas do LLM
+    raise _substituir(self, job_id, chord(
+        group(resumir_secao_task.s(job_id, label, texto, section_id_map) for label, texto in chunks),
+        relatorio,
+    ))
+
+
+@celery_app.task(
+    bind=True,
+    base=StageTask,
+    name='tasks.pdf.resumir_secao',
+    max_retries=3,
+    default_retry_delay=30
+)
+def resumir_secao_task(
+    self,
+    job_id: str,
+    label: str,
+    texto: str,
+    section_id_map: Dict[str, str],
+) -> str:
+    """Resume uma parte de seção (uma chamada de LLM)."""
+    try:
+        pdf_inflight.manter(job_id)
+        # o cache de respostas do LLM já faz o papel de checkpoint deste estágio
+        return summarize_section(label, texto, section_id_map, Config())
+    except Exception as exc:
+        logger.error(f"Erro no resumo da seção '{label}': {exc}", exc_info=True)
+        raise _falhar_estagio(self, job_id, exc, countdown=30)
     finally:
-        # Limpa arquivo temporário
-        limpar_arquivo_temporario(tmp_path)
+        task_progress.flush(job_id)
+
+
+@celery_app.task(
+    bind=True,
+    base=CallbackTask,
+    name='tasks.pdf.montar_relatorio',
+    max_retries=3,
+    default_retry_delay=60
+)
+def montar_relatorio_task(
+    self,
+    linhas: List[str],
+    job_id: str,
+    blob_key: str,
+    process_number: Optional[str],
+) -> Dict[str, Any]:
+    """Reduz os resumos ao relatório final e grava o cache pelo hash do PDF."""
+    try:
+        _progresso(self, job_id, "⚙️ Construindo relatório final...")
+        texto = finalize_report(linhas, process_number, Config(), report_cache_path(blob_key))
+        # relatório no cache: seguidores já o encontram
+        pdf_inflight.liberar(job_id)
+        checkpoints.clear(job_id)
+        return _resultado_relatorio(texto)
+    except Exception as exc:
+        logger.error(f"Erro ao construir o relatório: {exc}", exc_info=True)
+        raise _falhar_estagio(self, job_id, exc, countdown=60)
 
 
 @celery_app.task(
@@ -131,10 +383,7 @@ def buscar_documentos_task(
         Lista de documentos encontrados
     """
     try:
-        self.update_state(
-            state=TaskStatus.PROCESSING,
-            meta={'progress': 'Buscando documentos similares...'}
-        )
+        _progresso(self, self.request.id, 'Buscando documentos similares...')
         
         docs = semantic_search_rerank(
             relatorio,
@@ -146,7 +395,7 @@ def buscar_documentos_task(
     
     except Exception as exc:
         logger.error(f"Erro na busca de documentos: {exc}", exc_info=True)
-        raise self.retry(exc=exc, countdown=30)
+        raise retry_or_fail(self, exc, countdown=30)
 
 
 @celery_app.task(
@@ -175,17 +424,20 @@ def gerar_sentenca_task(
         numero_processo: Número do processo
         top_k: Número de documentos iniciais
         rerank_top_k: Número de documentos após rerank
-        arquivos_referencia_data: Lista de dicts com 'filename' e 'data' (bytes)
+        arquivos_referencia_data: Lista de dicts com 'filename' e 'blob_key'
+            (DOCX gravados no blob store pela API)
         buscar_na_base: Se deve buscar na base de dados
         
     Returns:
         Dict com sentenca, sentenca_url, referencias_url, etc.
     """
-    try:
-        self.update_state(
-            state=TaskStatus.PROCESSING,
-            meta={'progress': 'Preparando documentos de referência...'}
-        )
+    job_id = self.request.id
+    
+    def retomar(estagio: str) -> None:
+        _progresso(self, job_id, f"♻️ Retomando do checkpoint ({estagio})")
+    
+    def preparar_documentos() -> List[dict]:
+        _progresso(self, job_id, 'Preparando documentos de referência...')
         
         # 1) Monta lista inicial com arquivos enviados, se houver
         docs: List[dict] = []
@@ -193,59 +445,41 @@ def gerar_sentenca_task(
         if arquivos_referencia_data:
             for ref_data in arquivos_referencia_data:
                 filename = ref_data.get('filename', '')
-                data = ref_data.get('data')
                 
                 if not filename.lower().endswith('.docx'):
-                    raise ValueError(f"Arquivo {filename} deve ser DOCX")
-                
-                sec = parse_docx_bytes(data)
-                sec["id"] = filename or uuid.uuid4().hex
+                    raise NonRetryableError(f"Arquivo {filename} deve ser DOCX")
+            
+            # Extrai as seções de todos os arquivos em paralelo
+            secoes = parse_docx_many([blob_store.get_bytes(ref['blob_key']) for ref in arquivos_referencia_data])
+            for ref_data, sec in zip(arquivos_referencia_data, secoes):
+                sec["id"] = ref_data.get('filename', '') or uuid.uuid4().hex
                 docs.append(sec)
             
             # Se marcado, também busca na base
             if buscar_na_base:
-                self.update_state(
-                    state=TaskStatus.PROCESSING,
-                    meta={'progress': 'Buscando documentos na base de dados...'}
-                )
+                _progresso(self, job_id, 'Buscando documentos na base de dados...')
                 extra = semantic_search_rerank(
                     relatorio, top_k=top_k, rerank_top_k=rerank_top_k
                 )
                 docs.extend(extra)
         else:
             # Sem arquivos enviados, busca obrigatória
-            self.update_state(
-                state=TaskStatus.PROCESSING,
-                meta={'progress': 'Buscando documentos similares...'}
-            )
+            _progresso(self, job_id, 'Buscando documentos similares...')
             docs = semantic_search_rerank(
                 relatorio, top_k=top_k, rerank_top_k=rerank_top_k
             )
             if not docs:
-                raise ValueError("Nenhum documento semelhante encontrado")
-        
+                raise NonRetryableError("Nenhum documento semelhante encontrado")
+        return docs
+    
+    def gerar_texto() -> str:
         # 2) Geração via LLM
-        self.update_state(
-            state=TaskStatus.PROCESSING,
-            meta={'progress': 'Gerando sentença com LLM...'}
-        )
-        
-        # Importar função async e executar em loop
-        import asyncio
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+        _progresso(self, job_id, 'Gerando sentença com LLM...')
         
-        def on_progress(msg: str):
-            """Callback de progresso"""
-            self.update_state(
-                state=TaskStatus.PROCESSING,
-                meta={'progress': msg}
-            )
+        # Callback de progresso (escritas limitadas no canal de progresso)
+        on_progress = task_progress.reporter(job_id)
         
-        sentenca = loop.run_until_complete(
+        return run_async(
             gerar_sentenca_llm(
                 relatorio=relatorio,
                 docs=docs,
@@ -253,38 +487,35 @@ def gerar_sentenca_task(
                 on_progress=on_progress,
             )
         )
+    
+    try:
+        # Estágios com checkpoint: um retry (ex.: falha ao salvar o DOCX) não
+        # refaz a busca nem paga de novo a chamada ao LLM
+        docs = checkpoints.run_stage(job_id, 'documentos', preparar_documentos, on_resume=retomar)
+        sentenca = checkpoints.run_stage(job_id, 'sentenca', gerar_texto, on_resume=retomar)
         
         # 3) Gera nomes de arquivo baseados no número do processo
         nome_base_sentenca = gerar_nome_arquivo_sentenca(numero_processo)
         nome_base_referencias = gerar_nome_arquivo_referencias(numero_processo)
         
-        sent_id = f"{nome_base_sentenca}_{uuid.uuid4().hex[:8]}"
-        refs_id = f"{nome_base_referencias}_{uuid.uuid4().hex[:8]}"
-        
-        sent_path = f"/tmp/{sent_id}.docx"
-        refs_path = f"/tmp/{refs_id}.zip"
-        
-        # 4) Salvar .docx e ZIP de referências
-        self.update_state(
-            state=TaskStatus.PROCESSING,
-            meta={'progress': 'Salvando sentença e referências...'}
-        )
+        # 4) Registrar .docx e ZIP de referências (a API os gera no primeiro download)
+        _progresso(self, job_id, 'Salvando sentença e referências...')
         
         sentenca_limpa = decodificar_unicode(sentenca)
         
-        salvar_sentenca_como_docx(
-            relatorio=relatorio,
-            fundamentacao_dispositivo=sentenca_limpa,
-            arquivo_path=sent_path,
-            numero_processo=numero_processo
+        sentenca_url = artifacts.registrar(
+            'sentenca', artifacts.novo_id(nome_base_sentenca),
+            spec_sentenca(relatorio, sentenca_limpa, numero_processo),
+        )
+        referencias_url = artifacts.registrar(
+            'referencias', artifacts.novo_id(nome_base_referencias), spec_referencias(docs)
         )
-        salvar_docs_referencia(docs, refs_path)
         
         # 5) Montar resultado
         resultado = GerarSentencaResult(
             sentenca=sentenca_limpa,
-            sentenca_url=f"/download/sentenca/{sent_id}.docx",
-            referencias_url=f"/download/referencias/{refs_id}.zip",
+            sentenca_url=sentenca_url,
+            referencias_url=referencias_url,
             numero_processo=numero_processo,
             documentos=[
                 {
@@ -299,9 +530,95 @@ def gerar_sentenca_task(
             ]
         )
         
+        checkpoints.clear(job_id)
         return resultado.dict()
     
     except Exception as exc:
         logger.error(f"Erro na geração da sentença: {exc}", exc_info=True)
-        raise self.retry(exc=exc, countdown=60)
+        raise retry_or_fail(self, exc, countdown=60)
+
+
+@celery_app.task(name='tasks.limpar_blobs')
+def limpar_blobs_task() -> int:
+    """Remove do blob store os arquivos cujo resultado já expirou (agendada no beat)"""
+    removidos = blob_store.gc()
+    if removidos:
+        logger.info(f"🧹 {removidos} blobs expirados removidos")
+    return removidos
+
+
+@celery_app.task(name='tasks.limpar_progresso')
+def limpar_progresso_task() -> int:
+    """Remove o progresso de jobs cujo resultado já expirou (agendada no beat)"""
+    removidos = task_progress.purge(CeleryConfig.RESULT_EXPIRES)
+    if removidos:
+        logger.info(f"🧹 {removidos} registros de progresso expirados removidos")
+    return removidos
+
+
+@celery_app.task(name='tasks.despachar_lotes', ignore_result=True)
+def despachar_lotes_task() -> None:
+    """
+    Enfileira jobs de lotes até BATCH_MAX_INFLIGHT em voo. Disparada na
+    criação do lote, ao fim de cada job do lote (link) e pelo beat.
+    """
+    def enfileirar(task_id: str, blob_key: str, filename: str) -> None:
+        processar_pdf_task.apply_async(
+            args=(blob_key, filename),
+            task_id=task_id,
+            priority=CeleryConfig.PRIORITY_BATCH,
+            # o link segue para o último estágio do canvas (Task.replace o repassa)
+            link=despachar_lotes_task.si(),
+            link_error=despachar_lotes_task.si(),
+        )
+    
+    r = batches.despachar(lambda tid: celery_app.AsyncResult(tid).state, enfileirar)
+    if r["enfileirados"] or r["concluidos"]:
+        logger.info(f"📦 Lotes: {r['concluidos']} jobs concluídos, {r['enfileirados']} enfileirados")
+
+
+@celery_app.task(name='tasks.limpar_lotes')
+def limpar_lotes_task() -> int:
+    """Remove lotes cujos resultados já expiraram (agendada no beat)"""
+    return batches.purge(CeleryConfig.RESULT_EXPIRES)
+
+
+@celery_app.task(name='tasks.limpar_checkpoints')
+def limpar_checkpoints_task() -> int:
+    """Remove checkpoints de jobs abandonados (agendada no beat)"""
+    removidos = checkpoints.purge(CeleryConfig.RESULT_EXPIRES)
+    if removidos:
+        logger.info(f"🧹 {removidos} checkpoints de jobs abandonados removidos")
+    # registros de single-flight de líderes que morreram sem liberar
+    pdf_inflight.purge()
+    return removidos
+
+
+@celery_app.task(name='tasks.limpar_codigos_login')
+def limpar_codigos_login_task() -> int:
+    """Remove códigos de login vencidos/consumidos e e-mails desistidos (agendada no beat)"""
+    removidos = auth_store.purge()
+    if removidos:
+        logger.info(f"🧹 {removidos} códigos de login antigos removidos")
+    mortos = mailer.purge()
+    if mortos:
+        logger.info(f"🧹 {mortos} e-mails desistidos removidos da fila")
+    return removidos
+
+
+@celery_app.task(name='tasks.limpar_cache_llm')
+def limpar_cache_llm_task() -> int:
+    """Remove respostas de LLM em cache além do LLM_CACHE_TTL (agendada no beat)"""
+    removidos = llm_cache.purge_expired()
+    if removidos:
+        logger.info(f"🧹 {removidos} respostas de LLM expiradas removidas do cache")
+    return removidos
+
 
+@celery_app.task(name='tasks.limpar_artefatos')
+def limpar_artefatos_task() -> int:
+    """Remove sentenças/ZIPs gerados cujo prazo de download expirou (agendada no beat)"""
+    removidos = artifacts.gc()
+    if removidos:
+        logger.info(f"🧹 {removidos} artefatos expirados removidos")
+    return removidos
@@ -0,0 +1,76 @@
+"""
+Testes do armazenamento de artefatos gerados (services/artifacts.py)
+"""
+
+import os
+import time
+
+import pytest
+
+from services import artifacts
+
+
+@pytest.fixture(autouse=True)
+def artifact_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "ARTIFACT_DIR", tmp_path)
+    return tmp_path
+
+
+def test_gravar_publica_no_caminho_da_url():
+    art_id = artifacts.novo_id("sentenca_0001234 56/2024")
+    artifacts.gravar("sentenca", art_id, lambda path: open(path, "wb").write(b"docx"))
+
+    url = artifacts.url("sentenca", art_id)
+    tipo, arquivo = url.split("/")[-2:]
+    assert artifacts.local_path(tipo, arquivo).read_bytes() == b"docx"
+
+
+def test_falha_na_escrita_nao_deixa_arquivo(artifact_dir):
+    def escrever(path):
+        open(path, "wb").write(b"pela metade")
+        raise RuntimeError("falhou")
+
+    with pytest.raises(RuntimeError):
+        artifacts.gravar("referencias", "refs_x", escrever)
+    assert list(artifact_dir.rglob("*")) == [artifact_dir / "referencias"]
+
+
+@pytest.mark.parametrize("tipo,arquivo", [
+    ("sentenca", "../../etc/passwd.docx"),
+    ("sentenca", "refs_x.zip"),
+    ("outro", "x.docx"),
+    ("sentenca", "inexistente.docx"),
+])
+def test_nomes_invalidos_ou_ausentes(tipo, arquivo):
+    with pytest.raises(artifacts.ArtifactNotFound):
+        artifacts.local_path(tipo, arquivo)
+
+
+def test_gc_remove_so_os_expirados():
+    novo = artifacts.gravar("sentenca", "novo", lambda p: open(p, "wb").write(b"1"))
+    velho = artifacts.gravar("sentenca", "velho", lambda p: open(p, "wb").write(b"2"))
+    antigo = time.time() - 2 * 3600
+    os.utime(velho, (antigo, antigo))
+
+    assert artifacts.gc(ttl=3600) == 1
+    assert novo.exists() and not velho.exists()
+
+
+def test_registro_e_gerado_uma_vez_no_primeiro_download():
+    chamadas = []
+
+    def renderizar(tipo, spec, path):
+        chamadas.append(tipo)
+        open(path, "wb").write(spec["texto"].encode())
+
+    url = artifacts.registrar("sentenca", "lazy_1", {"texto": "sentença"})
+    tipo, arquivo = url.split("/")[-2:]
+    with pytest.raises(artifacts.ArtifactNotFound):
+        artifacts.local_path(tipo, arquivo)  # nada renderizado ainda
+
+    for _ in range(2):
+        assert artifacts.materializar(tipo, arquivo, renderizar).read_bytes() == "sentença".encode()
+    assert chamadas == ["sentenca"]
+
+    with pytest.raises(artifacts.ArtifactNotFound):
+        artifacts.materializar("sentenca", "nunca_registrado.docx", renderizar)
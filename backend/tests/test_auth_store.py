@@ -0,0 +1,103 @@
+"""
+Testes dos comandos de autenticação por código (services/auth_store.py)
+
+Rodam contra um Postgres real (TEST_POSTGRES_DSN), num schema temporário
+dentro de uma transação desfeita no fim de cada teste.
+"""
+
+import asyncio
+import os
+import uuid
+
+import pytest
+
+asyncpg = pytest.importorskip("asyncpg")
+pytest.importorskip("fastapi")
+pytest.importorskip("jose")
+
+DSN = os.getenv("TEST_POSTGRES_DSN")
+if not DSN:
+    pytest.skip("TEST_POSTGRES_DSN não definido", allow_module_level=True)
+
+from services import auth_store
+from services.auth import CREATE_SQL as AUTH_SQL
+from services.mailer import CREATE_SQL as MAIL_SQL
+
+EMAIL = "juiz@tjpe.jus.br"
+
+
+def _rodar(corpo):
+    async def _main():
+        conn = await asyncpg.connect(dsn=DSN)
+        tx = conn.transaction()
+        await tx.start()
+        try:
+            schema = f"teste_auth_{uuid.uuid4().hex[:8]}"
+            await conn.execute(f"CREATE SCHEMA {schema}; SET LOCAL search_path TO {schema}, public;")
+            await conn.execute(AUTH_SQL)
+            await conn.execute(MAIL_SQL)
+            await conn.execute("INSERT INTO app_user (email) VALUES ($1)", EMAIL)
+            await corpo(conn)
+        finally:
+            await tx.rollback()
+            await conn.close()
+
+    asyncio.run(_main())
+
+
+def _solicitar(conn, email=EMAIL, code="123456", corpo="Seu código: 123456"):
+    return auth_store.solicitar_codigo(conn, email, code, "10.0.0.1", 60, 10, "Código", corpo)
+
+
+def test_solicitar_respeita_cadastro_e_intervalo():
+    async def corpo(conn):
+        desconhecido = await _solicitar(conn, email="outro@tjpe.jus.br")
+        assert desconhecido["user_id"] is None and not desconhecido["criado"]
+
+        primeiro = await _solicitar(conn)
+        assert primeiro["criado"] and primeiro["enfileirado"]
+        assert await conn.fetchval("SELECT body FROM mail_outbox") == "Seu código: 123456"
+
+        # dentro do intervalo mínimo: nada gravado nem enfileirado
+        segundo = await _solicitar(conn, code="654321")
+        assert segundo["user_id"] == primeiro["user_id"]
+        assert not segundo["criado"] and not segundo["enfileirado"]
+        assert await conn.fetchval("SELECT count(*) FROM login_code") == 1
+        assert await conn.fetchval("SELECT count(*) FROM mail_outbox") == 1
+
+    _rodar(corpo)
+
+
+def test_codigo_vale_uma_vez():
+    async def corpo(conn):
+        await _solicitar(conn)
+
+        errado = await auth_store.consumir_codigo(conn, EMAIL, "000000", 111)
+        assert not errado["encontrado"] and not errado["autenticado"]
+
+        ok = await auth_store.consumir_codigo(conn, EMAIL, "123456", 222)
+        assert ok["autenticado"]
+        assert await conn.fetchval("SELECT last_login_iat FROM app_user") == 222
+
+        repetido = await auth_store.consumir_codigo(conn, EMAIL, "123456", 333)
+        assert repetido["encontrado"] and repetido["consumed_at"] is not None
+        assert not repetido["autenticado"]
+        assert await conn.fetchval("SELECT last_login_iat FROM app_user") == 222
+
+    _rodar(corpo)
+
+
+def test_codigo_vencido_nao_autentica():
+    async def corpo(conn):
+        await conn.execute(
+            """
+            INSERT INTO login_code (user_id, code, expires_at)
+            SELECT id, '123456', now() - interval '1 minute' FROM app_user
+            """
+        )
+        vencido = await auth_store.consumir_codigo(conn, EMAIL, "123456", 444)
+        assert vencido["encontrado"] and vencido["consumed_at"] is None
+        assert not vencido["autenticado"]
+        assert await conn.fetchval("SELECT last_login_iat FROM app_user") == 0
+
+    _rodar(corpo)
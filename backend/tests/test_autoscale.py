@@ -0,0 +1,24 @@
+"""
+Testes do dimensionamento do pool pelo backlog (tasks/autoscale.py)
+"""
+
+import pytest
+
+pytest.importorskip("celery")
+pytest.importorskip("asyncpg")
+
+from tasks.autoscale import capacidade_alvo
+
+
+def test_pico_de_manha_cresce_ate_o_maximo():
+    # 200 shards de OCR de 30 s para drenar em 5 min → 20 processos, limitado a 8
+    assert capacidade_alvo(200, 30.0, ocupados=2, minimo=1, maximo=8, meta_drenagem=300) == 8
+
+
+def test_backlog_pequeno_usa_so_o_necessario():
+    assert capacidade_alvo(15, 60.0, ocupados=1, minimo=1, maximo=8, meta_drenagem=300) == 3
+
+
+def test_fila_vazia_volta_ao_minimo_sem_matar_ocupados():
+    assert capacidade_alvo(0, 60.0, ocupados=0, minimo=1, maximo=8) == 1
+    assert capacidade_alvo(0, 60.0, ocupados=4, minimo=1, maximo=8) == 4
@@ -0,0 +1,140 @@
+"""
+Testes dos lotes de PDFs (services/batches.py) e do ZIP de relatórios do lote
+
+Os testes do despachante rodam contra um Postgres real (TEST_POSTGRES_DSN),
+num schema temporário apagado no fim de cada teste.
+"""
+
+import asyncio
+import os
+import uuid
+
+import pytest
+
+pytest.importorskip("asyncpg")
+from database import postgres_sync
+from services import batches
+
+DSN = os.getenv("TEST_POSTGRES_DSN")
+
+
+@pytest.fixture
+def banco(monkeypatch):
+    if not DSN:
+        pytest.skip("TEST_POSTGRES_DSN não definido")
+    psycopg2 = pytest.importorskip("psycopg2")
+    conn = psycopg2.connect(DSN)
+    conn.autocommit = True
+    schema = f"teste_lotes_{uuid.uuid4().hex[:8]}"
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {schema}; SET search_path TO {schema}, public;")
+        cur.execute(batches.CREATE_SQL)
+    # o despachante usa a conexão do processo (database.postgres_sync)
+    monkeypatch.setattr(postgres_sync, "_conn", conn)
+    try:
+        yield conn
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        conn.close()
+
+
+def _lote(conn, n):
+    batch_id = uuid.uuid4().hex
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO batch_job (id, total) VALUES (%s, %s)", (batch_id, n))
+        for i in range(n):
+            cur.execute(
+                "INSERT INTO batch_item (batch_id, idx, filename, blob_key) VALUES (%s, %s, %s, %s)",
+                (batch_id, i, f"{i}.pdf", f"blob{i}"),
+            )
+    return batch_id
+
+
+def _status(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT status, count(*) FROM batch_item GROUP BY status")
+        return dict(cur.fetchall())
+
+
+def test_despacha_no_maximo_max_inflight(banco):
+    _lote(banco, 10)
+    estados = {}
+    publicados = []
+
+    def enfileirar(task_id, blob_key, filename):
+        estados[task_id] = "STARTED"
+        publicados.append(filename)
+
+    r = batches.despachar(estados.get, enfileirar, max_inflight=3)
+    assert r == {"concluidos": 0, "enfileirados": 3}
+    assert publicados == ["0.pdf", "1.pdf", "2.pdf"]
+
+    # sem vaga: nada novo enquanto os três estão em voo
+    assert batches.despachar(estados.get, enfileirar, max_inflight=3) == {"concluidos": 0, "enfileirados": 0}
+
+    # um terminou, outro falhou: duas vagas
+    ids = list(estados)
+    estados[ids[0]] = "SUCCESS"
+    estados[ids[1]] = "FAILURE"
+    r = batches.despachar(estados.get, enfileirar, max_inflight=3)
+    assert r == {"concluidos": 2, "enfileirados": 2}
+    assert publicados[3:] == ["3.pdf", "4.pdf"]
+    assert _status(banco) == {"SUCCESS": 1, "FAILURE": 1, "QUEUED": 3, "PENDING": 5}
+
+
+def test_falha_ao_publicar_volta_para_pending(banco):
+    _lote(banco, 2)
+
+    def enfileirar(task_id, blob_key, filename):
+        raise ConnectionError("broker fora do ar")
+
+    assert batches.despachar(lambda tid: "PENDING", enfileirar, max_inflight=4)["enfileirados"] == 0
+    assert _status(banco) == {"PENDING": 2}
+
+
+def test_outro_despachante_com_o_lock_nao_publica_nada(banco):
+    _lote(banco, 2)
+    psycopg2 = pytest.importorskip("psycopg2")
+    outro = psycopg2.connect(DSN)
+    try:
+        with outro.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (batches._DISPATCH_LOCK,))
+        publicados = []
+        r = batches.despachar(lambda tid: "PENDING", lambda *a: publicados.append(a))
+        assert r == {"concluidos": 0, "enfileirados": 0}
+        assert publicados == [] and _status(banco) == {"PENDING": 2}
+    finally:
+        outro.close()
+
+
+def test_purge_remove_so_lotes_antigos(banco):
+    velho = _lote(banco, 2)
+    novo = _lote(banco, 1)
+    with banco.cursor() as cur:
+        cur.execute("UPDATE batch_job SET created_at = now() - interval '2 days' WHERE id=%s", (velho,))
+
+    assert batches.purge(24 * 3600) == 1
+    with banco.cursor() as cur:
+        cur.execute("SELECT DISTINCT batch_id FROM batch_item")
+        assert cur.fetchall() == [(novo,)]
+
+
+def test_resumo_conta_por_estado():
+    itens = [{"status": s} for s in ("PENDING", "PENDING", "QUEUED", "SUCCESS", "FAILURE", "STARTED")]
+    assert batches.resumo(itens) == {
+        "total": 6, "pendentes": 2, "em_andamento": 2, "concluidos": 1, "falhas": 1,
+    }
+
+
+def test_zip_sem_relatorio_concluido_responde_202(monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("celery")
+    import main
+
+    async def status_lote(batch_id):
+        return [{"idx": 0, "filename": "a.pdf", "task_id": "t0", "status": "QUEUED", "progress": None}]
+
+    monkeypatch.setattr(main, "status_lote", status_lote)
+    resposta = asyncio.run(main.lote_relatorios_zip("b1"))
+    assert resposta.status_code == 202
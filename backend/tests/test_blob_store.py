@@ -0,0 +1,39 @@
+"""
+Testes do blob store local (services/blob_store.py)
+"""
+
+import hashlib
+import os
+import time
+
+import pytest
+from services import blob_store
+
+
+@pytest.fixture(autouse=True)
+def _dir_temporario(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "BLOB_DIR", tmp_path / "blobs")
+    monkeypatch.setattr(blob_store, "BLOB_S3_BUCKET", None)
+
+
+def test_put_file_move_e_chave_e_o_hash(tmp_path):
+    src = tmp_path / "upload.pdf"
+    src.write_bytes(b"%PDF-1.4 conteudo")
+
+    key = blob_store.put_file(src)
+
+    assert key == hashlib.sha256(b"%PDF-1.4 conteudo").hexdigest()
+    assert not src.exists()
+    assert blob_store.get_bytes(key) == b"%PDF-1.4 conteudo"
+
+
+def test_gc_remove_apenas_expirados():
+    velho = blob_store.put_bytes(b"velho")
+    novo = blob_store.put_bytes(b"novo")
+    antigo = time.time() - 3600
+    os.utime(blob_store.local_path(velho), (antigo, antigo))
+
+    assert blob_store.gc(ttl=60) == 1
+    with pytest.raises(blob_store.BlobNotFound):
+        blob_store.local_path(velho)
+    assert blob_store.get_bytes(novo) == b"novo"
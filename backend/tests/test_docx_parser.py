@@ -0,0 +1,37 @@
+"""
+Testes do parser de seções de DOCX (services/docx_parser.py)
+"""
+
+import io
+
+import pytest
+
+docx = pytest.importorskip("docx")
+
+from services.docx_parser import _parse_document, parse_docx_bytes, parse_docx_many
+
+
+def _docx(*paragrafos, tabela=None) -> bytes:
+    doc = docx.Document()
+    for texto in paragrafos:
+        doc.add_paragraph(texto)
+    if tabela:
+        doc.add_table(rows=1, cols=1).cell(0, 0).text = tabela
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def test_parser_rapido_igual_ao_python_docx():
+    data = _docx(
+        "Preâmbulo", "RELATÓRIO", "Fatos.", "", "Fundamentação", "Razões.",
+        "DISPOSITIVO", "Julgo procedente.", tabela="dispositivo dentro de tabela",
+    )
+    secoes = parse_docx_bytes(data)
+    assert secoes == _parse_document(docx.Document(io.BytesIO(data)))
+    assert secoes == {"relatorio": "Fatos.\n", "fundamentacao": "Razões.\n", "dispositivo": "Julgo procedente.\n"}
+
+
+def test_varios_arquivos_mantem_a_ordem():
+    arquivos = [_docx("RELATÓRIO", f"Processo {i}") for i in range(5)]
+    assert [s["relatorio"] for s in parse_docx_many(arquivos)] == [f"Processo {i}\n" for i in range(5)]
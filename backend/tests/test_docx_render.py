@@ -0,0 +1,64 @@
+"""
+Testes do renderizador de DOCX por template (services/docx_render.py)
+"""
+
+import io
+import zipfile
+
+import pytest
+from lxml import etree
+
+docx = pytest.importorskip("docx")
+
+from services.docx_render import classificar_sentenca, render_referencia, render_sentenca
+
+
+def test_classificacao_em_uma_passada():
+    blocos = classificar_sentenca("FUNDAMENTAÇÃO\n\nTexto.\n\n  \n\nDISPOSITIVO\n\nJulgo procedente.")
+    assert blocos == [
+        ("secao", "FUNDAMENTAÇÃO"),
+        ("texto", "Texto."),
+        ("secao", "DISPOSITIVO"),
+        ("texto", "Julgo procedente."),
+    ]
+    # sem seções explícitas entra o título conjunto
+    assert classificar_sentenca("Análise do mérito.")[0] == ("secao", "FUNDAMENTAÇÃO E DISPOSITIVO")
+
+
+def test_sentenca_sai_do_template_com_estilos():
+    conteudo = render_sentenca("Relatório.", "FUNDAMENTAÇÃO\n\nTexto com \x01 controle.", "0001234-56.2024.8.17.0001")
+    doc = docx.Document(io.BytesIO(conteudo))
+    paragrafos = [(p.style.name, p.text) for p in doc.paragraphs]
+
+    assert paragrafos[0] == ("Heading 1", "SENTENÇA")
+    assert paragrafos[1] == ("Normal", "Processo nº 0001234-56.2024.8.17.0001")
+    assert ("Heading 2", "RELATÓRIO") in paragrafos
+    assert ("Normal", "Texto com  controle.") in paragrafos
+    assert round(doc.sections[0].page_width.inches, 2) == 8.27  # A4
+
+
+def test_referencias_nao_compartilham_estado():
+    _, a = render_referencia(1, {"id": "a", "relatorio": "Primeiro"})
+    _, b = render_referencia(2, {"id": "b", "relatorio": "Segundo"})
+    texto_a = [p.text for p in docx.Document(io.BytesIO(a)).paragraphs]
+    assert "Primeiro" in texto_a and "Segundo" not in texto_a
+
+
+def test_quebras_e_tabs_viram_br_e_tab():
+    conteudo = render_sentenca("Atos:\n– petição (ID 1)\n\tréplica (ID 2)", "")
+    with zipfile.ZipFile(io.BytesIO(conteudo)) as z:
+        arvore = etree.fromstring(z.read("word/document.xml"))
+    w = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+    paragrafo = next(
+        p for p in arvore.iter(f"{w}p")
+        if any((t.text or "").startswith("Atos:") for t in p.iter(f"{w}t"))
+    )
+    filhos = [
+        (el.tag.replace(w, ""), el.text) for el in paragrafo.find(f"{w}r")
+        if el.tag != f"{w}rPr"
+    ]
+    assert filhos == [
+        ("t", "Atos:"), ("br", None), ("t", "– petição (ID 1)"),
+        ("br", None), ("tab", None), ("t", "réplica (ID 2)"),
+    ]
+    assert not any("\n" in (t.text or "") for t in arvore.iter(f"{w}t"))
@@ -0,0 +1,57 @@
+"""
+Testes do matcher de palavras-chave (services/keyword_matcher.py)
+"""
+
+from services.keyword_matcher import KeywordMatcher
+
+KWS = {
+    "sentenca": ["sentença", "julgo", "julgo procedente"],
+    "contestacao": ["contestação", "contesta", "vem apresentar contestação"],
+    "despacho": ["despacho", "determino", "determino a"],
+}
+
+TEXTOS = [
+    "JULGO PROCEDENTE o pedido. Julgo extinto o feito. Sentença.",
+    "O réu vem apresentar Contestação e contesta os fatos.",
+    "Despacho: determino a intimação.",
+    "",
+    "nada relevante aqui",
+]
+
+
+def test_igual_a_busca_por_substring():
+    m = KeywordMatcher(KWS)
+    for texto in TEXTOS:
+        low = texto.lower()
+        esperado = {c: sum(1 for kw in kws if kw in low) for c, kws in KWS.items()}
+        assert m.classificar(texto).distintas == esperado
+
+
+def test_contagens_e_posicoes_com_sobreposicao():
+    res = KeywordMatcher(KWS).classificar(TEXTOS[0])
+    assert res.contagens["sentenca"] == 4  # julgo x2, julgo procedente, sentença
+    assert (0, "julgo procedente") in res.posicoes["sentenca"]
+    assert (0, "julgo") in res.posicoes["sentenca"]
+    assert res.contagens["despacho"] == 0
+
+
+def test_lote_igual_a_textos_isolados():
+    m = KeywordMatcher(KWS)
+    lote = m.classificar_lote(TEXTOS)
+    assert [r.posicoes for r in lote] == [m.classificar(t).posicoes for t in TEXTOS]
+    assert [m.primeira_classe(r) for r in lote] == [
+        "sentenca", "contestacao", "despacho", "outros", "outros",
+    ]
+
+
+def test_caracteres_que_mudam_com_lower():
+    m = KeywordMatcher(KWS)
+    # 'ſ' não vira 's' em lower(): nada casa, como em `kw in texto.lower()`
+    assert m.classificar("ſentença").contagens["sentenca"] == 0
+    # 'İ' vira dois caracteres em lower(): a posição continua a do texto original
+    texto = "İİ Sentença; DETERMİNO"
+    res = m.classificar(texto)
+    assert res.posicoes["sentenca"] == [(3, "sentença")]
+    assert texto[3:11].lower() == "sentença"
+    assert res.contagens["despacho"] == 0
+    assert m.classificar_lote(["İ", texto])[1].posicoes == res.posicoes
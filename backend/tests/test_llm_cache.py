@@ -0,0 +1,85 @@
+"""
+Testes do cache de respostas de LLM (services/llm_cache.py)
+"""
+
+import os
+import time
+
+import pytest
+from services import llm_cache
+
+MENSAGENS = [{"role": "user", "content": "Resuma a petição inicial."}]
+PARAMS = {"max_tokens": 4096, "temperature": 0.2, "seed": "7"}
+
+
+@pytest.fixture(autouse=True)
+def _dir_temporario(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_DIR", tmp_path / "llm_cache")
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_TTL", 60)
+
+
+def _envelhecer(path, segundos=3600):
+    antigo = time.time() - segundos
+    os.utime(path, (antigo, antigo))
+
+
+def test_chave_muda_com_modelo_e_parametros():
+    base = llm_cache.cache_key("openai", "gpt-5", PARAMS, MENSAGENS)
+    # ordem das chaves não importa (JSON canônico)
+    assert llm_cache.cache_key("openai", "gpt-5", dict(reversed(PARAMS.items())), MENSAGENS) == base
+
+    variantes = [
+        llm_cache.cache_key("openai", "gpt-5-mini", PARAMS, MENSAGENS),
+        llm_cache.cache_key("anthropic", "gpt-5", PARAMS, MENSAGENS),
+        llm_cache.cache_key("openai", "gpt-5", {**PARAMS, "max_tokens": 8192}, MENSAGENS),
+        llm_cache.cache_key("openai", "gpt-5", {**PARAMS, "temperature": 0.0}, MENSAGENS),
+        llm_cache.cache_key("openai", "gpt-5", {**PARAMS, "seed": None}, MENSAGENS),
+        llm_cache.cache_key("openai", "gpt-5", PARAMS, [{"role": "user", "content": "Resuma a contestação."}]),
+    ]
+    assert len({base, *variantes}) == len(variantes) + 1
+
+
+def test_entrada_expirada_e_ausente():
+    key = llm_cache.cache_key("openai", "gpt-5", PARAMS, MENSAGENS)
+    llm_cache.set(key, "Relatório do processo.")
+    assert llm_cache.get(key) == "Relatório do processo."
+
+    _envelhecer(llm_cache._path(key))
+    assert llm_cache.get(key) is None
+    assert not llm_cache._path(key).exists()
+
+
+@pytest.mark.parametrize("texto", [
+    "Erro ao gerar sentença: timeout",
+    "  erro: 529 overloaded",
+    "Documento processado com limitações técnicas.",
+    "Relatório: processo analisado parcialmente.",
+    "   ",
+    None,
+])
+def test_textos_de_erro_nunca_sao_gravados(texto):
+    key = llm_cache.cache_key("openai", "gpt-5", PARAMS, MENSAGENS)
+    llm_cache.set(key, texto)
+    assert llm_cache.get(key) is None
+    assert not llm_cache._path(key).exists()
+
+
+def test_purge_expired_remove_so_os_velhos():
+    velha = llm_cache.cache_key("openai", "gpt-5", PARAMS, [{"role": "user", "content": "velha"}])
+    nova = llm_cache.cache_key("openai", "gpt-5", PARAMS, [{"role": "user", "content": "nova"}])
+    llm_cache.set(velha, "resposta velha")
+    llm_cache.set(nova, "resposta nova")
+    _envelhecer(llm_cache._path(velha))
+
+    # temporário de uma escrita interrompida: só sai depois do TTL
+    tmp_velho = llm_cache._path(velha).with_suffix(".123.tmp")
+    tmp_novo = llm_cache._path(nova).with_suffix(".456.tmp")
+    tmp_velho.write_text("{}")
+    tmp_novo.write_text("{}")
+    _envelhecer(tmp_velho)
+
+    assert llm_cache.purge_expired() == 2
+    assert not llm_cache._path(velha).exists() and not tmp_velho.exists()
+    assert llm_cache.get(nova) == "resposta nova"
+    assert tmp_novo.exists()
@@ -0,0 +1,107 @@
+"""
+Testes do roteador de modelos (services/model_router.py)
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from services import model_router
+from services.model_router import (
+    AllTiersFailed,
+    Tier,
+    is_failover_error,
+    parse_tiers,
+    route_async,
+    route_sync,
+)
+from services.token_budget import TokenBudgetError
+
+TIERS = [Tier("openai", "gpt-primario", 5), Tier("anthropic", "claude-reserva", 5)]
+
+
+class Sobrecarga(Exception):
+    status_code = 529
+
+
+def test_parse_tiers_infere_provider_e_timeout():
+    tiers = parse_tiers("openai:gpt-5@120, claude-sonnet-4-5")
+    assert tiers[0] == Tier("openai", "gpt-5", 120.0)
+    assert tiers[1].provider == "anthropic"
+
+
+def test_failover_em_sobrecarga():
+    async def call(tier):
+        if tier.model == "gpt-primario":
+            raise Sobrecarga("overloaded")
+        return "ok"
+
+    tier, resultado = asyncio.run(route_async("sentenca", call, TIERS))
+    assert (tier.model, resultado) == ("claude-reserva", "ok")
+
+
+def test_erro_nao_transitorio_nao_troca_de_tier():
+    def call(tier):
+        raise KeyError("bug")
+
+    with pytest.raises(KeyError):
+        route_sync("summary", call, TIERS)
+
+
+def test_hedge_fica_com_o_primeiro_que_responde(monkeypatch):
+    monkeypatch.setenv("LLM_HEDGE_AFTER_REPORT", "0.05")
+
+    def call(tier):
+        if tier.model == "gpt-primario":
+            time.sleep(0.5)
+        return tier.model
+
+    inicio = time.monotonic()
+    tier, resultado = route_sync("report", call, TIERS)
+    assert resultado == "claude-reserva"
+    assert time.monotonic() - inicio < 0.4
+
+
+def test_slo_estourado_passa_ao_proximo_tier():
+    def call(tier):
+        if tier.model == "lento":
+            time.sleep(0.5)
+        return tier.model
+
+    tiers = [Tier("openai", "lento", 0.1), Tier("anthropic", "reserva", 5)]
+    assert route_sync("summary", call, tiers) == (tiers[1], "reserva")
+
+
+def test_espera_por_thread_livre_nao_conta_no_slo(monkeypatch):
+    # pool ocupado por chamadas de outro pipeline por mais que o SLO do tier
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(model_router, "_sync_pool", pool)
+    liberar = threading.Event()
+    pool.submit(liberar.wait)
+    threading.Timer(0.4, liberar.set).start()
+
+    tiers = [Tier("openai", "gpt-primario", 0.2), Tier("anthropic", "claude-reserva", 0.2)]
+    assert route_sync("summary", lambda tier: tier.model, tiers) == (tiers[0], "gpt-primario")
+    pool.shutdown()
+
+
+def test_todos_os_tiers_falham():
+    def call(tier):
+        raise Sobrecarga("503")
+
+    with pytest.raises(AllTiersFailed):
+        route_sync("summary", call, TIERS)
+
+
+def test_orcamento_estourado_em_todos_os_tiers_nao_repete_a_rodada():
+    def call(tier):
+        raise TokenBudgetError("prompt maior que a janela")
+
+    with pytest.raises(AllTiersFailed) as exc:
+        route_sync("summary", call, TIERS)
+    # TokenBudgetError troca de tier, mas a rodada inteira não vale repetir
+    assert is_failover_error(TokenBudgetError("x"))
+    assert not is_failover_error(exc.value)
+    assert is_failover_error(AllTiersFailed("summary", [(TIERS[0], TokenBudgetError("x")), (TIERS[1], Sobrecarga("529"))]))
@@ -0,0 +1,36 @@
+"""
+Testes das métricas do pool Postgres (database/pool_metrics.py)
+"""
+
+from database.pool_metrics import Histograma, PoolMetrics
+
+
+def test_quantis_pelos_baldes():
+    h = Histograma((1, 5, 10))
+    for v in [0.5] * 90 + [4] * 9 + [50]:
+        h.registrar(v)
+
+    assert h.total == 100
+    assert h.quantil(0.5) == 1
+    assert h.quantil(0.99) == 5
+    assert h.quantil(1.0) == 50  # balde +inf: devolve o máximo visto
+    assert h.resumo()["baldes"][-1] == {"le": "+inf", "n": 1}
+
+
+def test_sugestao_segue_a_demanda_observada():
+    m = PoolMetrics()
+    abertas = []
+    # 6 pedidos simultâneos: o 6º espera com 5 conexões em uso
+    for _ in range(6):
+        abertas.append(m.fim_pedido(m.pedido(), ok=True))
+    for t in abertas:
+        m.devolvida(t)
+
+    assert m.em_uso == 0 and m.aguardando == 0
+    assert m.demanda.maximo == 6
+    assert m.sugestao_max(1.0) == 6
+    assert m.uso_ms.total == 6
+
+
+def test_sem_dados_nao_sugere():
+    assert PoolMetrics().sugestao_max() is None
@@ -0,0 +1,108 @@
+"""
+Testes do cache de last_login_iat com LISTEN/NOTIFY (services/session_cache.py)
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+pytest.importorskip("asyncpg")
+from services import session_cache
+from services.session_cache import SESSION_CHANNEL, SessionCache
+
+
+class ConexaoListen:
+    """Conexão LISTEN falsa: guarda os callbacks para o teste disparar."""
+
+    def __init__(self):
+        self.fechada = False
+        self.ao_notificar = None
+        self.ao_terminar = None
+
+    async def add_listener(self, canal, fn):
+        assert canal == SESSION_CHANNEL
+        self.ao_notificar = fn
+
+    def add_termination_listener(self, fn):
+        self.ao_terminar = fn
+
+    def is_closed(self):
+        return self.fechada
+
+    async def close(self):
+        self.fechada = True
+
+    def notificar(self, payload):
+        self.ao_notificar(self, 1, SESSION_CHANNEL, payload)
+
+    def cair(self):
+        self.fechada = True
+        self.ao_terminar(self)
+
+
+class Banco:
+    def __init__(self, iat):
+        self.iat = iat
+        self.consultas = 0
+
+    async def fetchval(self, sql, user_id):
+        self.consultas += 1
+        return self.iat
+
+
+@pytest.fixture
+def ambiente(monkeypatch):
+    banco = Banco(100)
+    conexoes = []
+
+    async def connect(dsn):
+        conexoes.append(ConexaoListen())
+        return conexoes[-1]
+
+    @asynccontextmanager
+    async def conexao():
+        yield banco
+
+    monkeypatch.setattr(session_cache.asyncpg, "connect", connect)
+    monkeypatch.setattr(session_cache, "conexao", conexao)
+    return banco, conexoes
+
+
+def test_notify_substitui_iat_antigo_em_cache(ambiente):
+    banco, conexoes = ambiente
+
+    async def cenario():
+        cache = SessionCache(ttl=60)
+        assert await cache.last_login_iat("u1") == 100
+        assert await cache.last_login_iat("u1") == 100
+        assert banco.consultas == 1  # segunda leitura veio do cache
+
+        # login em outro dispositivo: o NOTIFY vale sem ir ao banco
+        conexoes[0].notificar("u1:200")
+        assert await cache.last_login_iat("u1") == 200
+        assert banco.consultas == 1
+
+        # uma notificação atrasada (menor) não derruba a sessão nova
+        conexoes[0].notificar("u1:150")
+        assert await cache.last_login_iat("u1") == 200
+
+    asyncio.run(cenario())
+
+
+def test_queda_do_listen_esvazia_o_cache(ambiente):
+    banco, conexoes = ambiente
+
+    async def cenario():
+        cache = SessionCache(ttl=60)
+        await cache.last_login_iat("u1")
+        conexoes[0].notificar("u1:200")
+
+        # notificações podem se perder sem a conexão: o cache é descartado
+        conexoes[0].cair()
+        banco.iat = 300
+        assert await cache.last_login_iat("u1") == 300
+        assert banco.consultas == 2
+        assert len(conexoes) == 2  # a chamada reabriu o LISTEN
+
+    asyncio.run(cenario())
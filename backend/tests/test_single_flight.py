@@ -0,0 +1,73 @@
+"""
+Testes do single-flight por hash do PDF (services/single_flight.py)
+"""
+
+import threading
+import time
+
+import pytest
+from services import single_flight
+
+
+@pytest.fixture(autouse=True)
+def _dir_temporario(tmp_path, monkeypatch):
+    monkeypatch.setattr(single_flight, "SINGLE_FLIGHT_DIR", tmp_path)
+    monkeypatch.setattr(single_flight, "POLL_INTERVAL", 0.01)
+
+
+def test_pedidos_simultaneos_executam_uma_vez():
+    chamadas = []
+    liberar = threading.Event()
+
+    def compute(progress):
+        chamadas.append(1)
+        progress("🔍 OCR")
+        liberar.wait(2)
+        return "relatório"
+
+    resultados, progresso_seguidor = [], []
+
+    def pedido(on_progress=None):
+        resultados.append(single_flight.run("abc", compute, on_progress=on_progress))
+
+    lider = threading.Thread(target=pedido)
+    lider.start()
+    time.sleep(0.05)
+    seguidor = threading.Thread(target=pedido, args=(progresso_seguidor.append,))
+    seguidor.start()
+    time.sleep(0.05)
+    liberar.set()
+    lider.join()
+    seguidor.join()
+
+    assert len(chamadas) == 1
+    assert resultados == ["relatório", "relatório"]
+    assert progresso_seguidor == ["🔍 OCR"]
+
+
+def test_lock_de_outro_processo_usa_o_cache_ao_liberar(tmp_path):
+    """Simula um líder em outro processo segurando o flock do mesmo hash."""
+    import fcntl
+    import os
+
+    fd = os.open(tmp_path / "xyz.lock", os.O_RDWR | os.O_CREAT)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    (tmp_path / "xyz.progress").write_text("🧠 Resumindo\n", encoding="utf-8")
+    resultado = {}
+
+    def liberar():
+        time.sleep(0.1)
+        resultado["cache"] = "relatório do líder"
+        os.close(fd)
+
+    threading.Thread(target=liberar).start()
+    progresso = []
+    texto = single_flight.run(
+        "xyz",
+        lambda progress: pytest.fail("não deveria recalcular"),
+        on_progress=progresso.append,
+        cached=lambda: resultado.get("cache"),
+    )
+
+    assert texto == "relatório do líder"
+    assert "🧠 Resumindo" in progresso
@@ -0,0 +1,98 @@
+"""
+Testes da conexão SMTP persistente (services/smtp_client.py) contra um
+servidor SMTP local mínimo, sem TLS nem autenticação.
+"""
+
+import smtplib
+import socketserver
+import threading
+
+import pytest
+
+from services.smtp_client import SmtpConexao, erro_permanente, mensagem
+
+
+class _SmtpDuble(socketserver.StreamRequestHandler):
+    """Fala o mínimo do protocolo; RCPT para 'recusa@...' responde 550."""
+
+    def _linha(self, texto: str) -> None:
+        self.wfile.write(f"{texto}\r\n".encode())
+
+    def handle(self):
+        servidor = self.server
+        servidor.conexoes += 1
+        self._linha("220 duble")
+        while True:
+            linha = self.rfile.readline().decode().strip()
+            if not linha:
+                return
+            cmd = linha.split(" ", 1)[0].upper()
+            if cmd in ("EHLO", "HELO"):
+                self._linha("250 duble")
+            elif cmd == "RCPT" and "recusa@" in linha:
+                self._linha("550 usuario inexistente")
+            elif cmd in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self._linha("250 ok")
+            elif cmd == "DATA":
+                self._linha("354 manda")
+                partes = []
+                while (dado := self.rfile.readline().decode()) != ".\r\n":
+                    partes.append(dado)
+                servidor.mensagens.append("".join(partes))
+                self._linha("250 recebida")
+            elif cmd == "QUIT":
+                self._linha("221 tchau")
+                return
+            else:
+                self._linha("502 nao implementado")
+
+
+@pytest.fixture
+def duble():
+    servidor = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SmtpDuble)
+    servidor.daemon_threads = True
+    servidor.conexoes = 0
+    servidor.mensagens = []
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _conexao(servidor, **kwargs) -> SmtpConexao:
+    host, port = servidor.server_address
+    return SmtpConexao(host=host, port=port, username=None, password=None, starttls=False, timeout=5, **kwargs)
+
+
+def test_envios_reaproveitam_a_conexao(duble):
+    smtp = _conexao(duble)
+    for i in range(3):
+        smtp.enviar(mensagem("app@tjpe.jus.br", "juiz@tjpe.jus.br", "Código", f"código {i}"))
+    smtp.fechar()
+
+    assert duble.conexoes == 1
+    assert len(duble.mensagens) == 3
+    assert "código 2" in duble.mensagens[2] or "=C3=B3digo 2" in duble.mensagens[2]
+
+
+def test_reconecta_quando_a_conexao_fica_ociosa(duble):
+    smtp = _conexao(duble, idle=0)
+    smtp.enviar(mensagem("app@tjpe.jus.br", "juiz@tjpe.jus.br", "a", "1"))
+    smtp.enviar(mensagem("app@tjpe.jus.br", "juiz@tjpe.jus.br", "b", "2"))
+    smtp.fechar()
+
+    assert duble.conexoes == 2
+    assert len(duble.mensagens) == 2
+
+
+def test_recusa_5xx_e_permanente(duble):
+    smtp = _conexao(duble)
+    with pytest.raises(smtplib.SMTPRecipientsRefused) as exc:
+        smtp.enviar(mensagem("app@tjpe.jus.br", "recusa@tjpe.jus.br", "a", "1"))
+    assert erro_permanente(exc.value)
+
+    # a conexão continua utilizável depois da recusa
+    smtp.enviar(mensagem("app@tjpe.jus.br", "juiz@tjpe.jus.br", "b", "2"))
+    smtp.fechar()
+    assert duble.conexoes == 1
+    assert not erro_permanente(smtplib.SMTPServerDisconnected("caiu"))
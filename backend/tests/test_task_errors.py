@@ -0,0 +1,48 @@
+"""
+Testes da classificação de erros das tasks (tasks/errors.py)
+"""
+
+import json
+
+import pytest
+
+pytest.importorskip("celery")
+pytest.importorskip("pypdf")
+pytest.importorskip("pydantic")
+
+from pypdf.errors import PdfReadError
+
+from services.token_budget import TokenBudgetError
+from tasks.errors import NonRetryableError, retry_or_fail
+
+
+class _Task:
+    def __init__(self):
+        self.retries = []
+
+    def retry(self, exc, countdown):
+        self.retries.append((exc, countdown))
+        return RuntimeError("retry")
+
+
+@pytest.mark.parametrize("exc", [PdfReadError("EOF"), TokenBudgetError("prompt"), NonRetryableError("DOCX")])
+def test_erro_permanente_falha_sem_retry(exc):
+    task = _Task()
+    assert retry_or_fail(task, exc, countdown=30) is exc
+    assert task.retries == []
+
+
+def test_erro_transitorio_entra_em_retry():
+    task = _Task()
+    exc = ConnectionError("LLM fora do ar")
+    retry_or_fail(task, exc, countdown=30)
+    assert task.retries == [(exc, 30)]
+
+
+def test_json_truncado_entra_em_retry():
+    # JSONDecodeError é ValueError, mas um blob truncado pode vir inteiro depois
+    with pytest.raises(json.JSONDecodeError) as info:
+        json.loads('{"texts": ["pág')
+    task = _Task()
+    retry_or_fail(task, info.value, countdown=30)
+    assert task.retries == [(info.value, 30)]
@@ -0,0 +1,35 @@
+"""
+Testes do limitador de escritas de progresso (services/task_progress.py)
+"""
+
+import time
+
+import pytest
+
+pytest.importorskip("asyncpg")
+from services import task_progress
+
+
+def test_mensagens_no_intervalo_sao_coalescidas(monkeypatch):
+    escritas = []
+    monkeypatch.setattr(task_progress, "_write", lambda task_id, msg: escritas.append(msg))
+    rep = task_progress.ProgressReporter("job-1", min_interval=0.1)
+
+    for i in range(50):
+        rep(f"página {i}")
+    assert escritas == ["página 0"]
+
+    time.sleep(0.2)
+    assert escritas == ["página 0", "página 49"]
+
+
+def test_flush_grava_o_pendente_na_hora(monkeypatch):
+    escritas = []
+    monkeypatch.setattr(task_progress, "_write", lambda task_id, msg: escritas.append(msg))
+    rep = task_progress.ProgressReporter("job-2", min_interval=60)
+
+    rep("início")
+    rep("fim")
+    rep.flush()
+
+    assert escritas == ["início", "fim"]
@@ -0,0 +1,51 @@
+"""
+Testes do orçamento de tokens (services/token_budget.py)
+"""
+
+import pytest
+from services.token_budget import (
+    TokenBudgetError,
+    allocate_context_budget,
+    cap_output_tokens,
+    context_budget,
+    context_window,
+    count_tokens,
+    max_output_tokens,
+)
+
+
+def test_context_window_prefixo_mais_longo():
+    """gpt-4o-mini não pode herdar a janela de gpt-4"""
+    assert context_window("gpt-4o-mini") == 128_000
+    assert context_window("gpt-4") == 8_192
+    assert max_output_tokens("gpt-4o-mini") == 16_384
+
+
+def test_context_window_override_por_env(monkeypatch):
+    monkeypatch.setenv("LLM_CONTEXT_WINDOW_GPT_4O", "50000")
+    assert context_window("gpt-4o") == 50_000
+
+
+def test_alocacao_prioriza_rerank_e_trunca_o_ultimo():
+    fraco = ({"score_rerank": 0.1}, "fraco " * 2000)
+    forte = ({"score_rerank": 0.9}, "forte " * 200)
+    orcamento = count_tokens(forte[1], "gpt-4o") + 300
+
+    alocados = allocate_context_budget([fraco, forte], orcamento, "gpt-4o")
+
+    assert alocados[0] == forte
+    assert len(alocados) == 2
+    assert count_tokens(alocados[1][1], "gpt-4o") <= 300
+
+
+def test_cap_output_respeita_teto_do_modelo():
+    msgs = [{"role": "user", "content": "relatório curto"}]
+    assert cap_output_tokens("gpt-4o", msgs, 128_000) == 16_384
+
+
+def test_requisicao_que_nao_cabe_e_recusada_antes_do_envio():
+    msgs = [{"role": "user", "content": "palavra " * 20_000}]
+    with pytest.raises(TokenBudgetError):
+        context_budget("gpt-4", msgs, 4096)
+    with pytest.raises(TokenBudgetError):
+        cap_output_tokens("gpt-4", msgs, 4096)
@@ -0,0 +1,53 @@
+"""
+Testes da extração de PDFs de um ZIP de lote (services/uploads.py)
+"""
+
+import zipfile
+
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi import HTTPException
+
+from services.uploads import extrair_pdfs_zip
+
+PDF = b"%PDF-1.4 " + b"x" * 4096
+
+
+def _zip(path, membros):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as zf:
+        for nome, dados in membros:
+            zf.writestr(nome, dados)
+    return path
+
+
+def test_extrai_so_pdfs(tmp_path):
+    zip_path = _zip(tmp_path / "lote.zip", [("a.pdf", PDF), ("dir/b.PDF", PDF), ("leia.txt", b"x")])
+    destino = tmp_path / "saida"
+    extraidos = extrair_pdfs_zip(zip_path, destino)
+    assert [up.filename for up in extraidos] == ["a.pdf", "b.PDF"]
+    assert all(up.path.read_bytes() == PDF for up in extraidos)
+
+
+def test_crc_invalido_no_meio_remove_tudo(tmp_path):
+    zip_path = _zip(tmp_path / "lote.zip", [("a.pdf", PDF), ("b.pdf", PDF)])
+    # corrompe o conteúdo do segundo membro: o CRC só falha ao lê-lo
+    dados = bytearray(zip_path.read_bytes())
+    pos = dados.rindex(PDF[:9])
+    dados[pos + 100] ^= 0xFF
+    zip_path.write_bytes(bytes(dados))
+
+    destino = tmp_path / "saida"
+    with pytest.raises(HTTPException) as info:
+        extrair_pdfs_zip(zip_path, destino)
+    assert info.value.status_code == 400
+    assert list(destino.iterdir()) == []
+
+
+def test_limite_total_descompactado(tmp_path):
+    zip_path = _zip(tmp_path / "lote.zip", [(f"{i}.pdf", PDF) for i in range(3)])
+    destino = tmp_path / "saida"
+    with pytest.raises(HTTPException) as info:
+        extrair_pdfs_zip(zip_path, destino, max_total_bytes=2 * len(PDF) + 1)
+    assert info.value.status_code == 413
+    assert list(destino.iterdir()) == []
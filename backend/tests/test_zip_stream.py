@@ -0,0 +1,18 @@
+"""
+Testes do ZIP em streaming (services/zip_stream.py)
+"""
+
+import io
+import zipfile
+
+from services.zip_stream import zip_stream
+
+
+def test_zip_em_partes_e_valido():
+    partes = list(zip_stream([("0001_autos.txt", "Relatório"), ("0002_autos.erro.txt", b"falha")]))
+
+    assert len(partes) >= 2  # um pedaço por arquivo + diretório central
+    zf = zipfile.ZipFile(io.BytesIO(b"".join(partes)))
+    assert zf.testzip() is None
+    assert zf.read("0001_autos.txt").decode("utf-8") == "Relatório"
+    assert zf.namelist() == ["0001_autos.txt", "0002_autos.erro.txt"]
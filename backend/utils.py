@@ -3,6 +3,7 @@ Funções utilitárias compartilhadas
 """
 import os
 import re
+import hashlib
 from typing import Optional
 from datetime import datetime
 
@@ -115,3 +116,13 @@ def limpar_arquivo_temporario(path: str) -> None:
     except Exception as e:
         print(f"⚠️ Erro ao remover arquivo temporário {path}: {e}")
 
+
+def sha256_file(path, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Calcula o SHA-256 de um arquivo lendo em blocos
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
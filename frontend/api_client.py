@@ -0,0 +1,247 @@
+"""
+Cliente HTTP da API do Justino para o app Streamlit.
+
+Uma requests.Session por processo (keep-alive: as chamadas reaproveitam a
+conexão TCP), com timeouts de conexão/leitura sempre definidos e retries
+com backoff para falhas de conexão e respostas 502/503/504 — POSTs só são
+repetidos quando a conexão nem chegou a ser feita, para não gerar a mesma
+sentença duas vezes.
+
+Downloads de artefatos (/download/...) são gravados em disco em streaming
+e guardados por nome de arquivo: o nome carrega o id da sentença, então
+reruns do Streamlit reaproveitam o arquivo em vez de baixar de novo.
+"""
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_URL = os.getenv("API_URL", "http://localhost:8010")
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "600"))      # extração/geração síncronas
+API_STREAM_TIMEOUT = float(os.getenv("API_STREAM_TIMEOUT", "240"))  # silêncio máximo no SSE (o backend manda ping a cada 30s)
+API_RETRIES = int(os.getenv("API_RETRIES", "3"))
+ARTIFACT_CACHE_DIR = Path(os.getenv("ARTIFACT_CACHE_DIR", "/tmp/justino_artifacts"))
+ARTIFACT_CACHE_TTL = int(os.getenv("ARTIFACT_CACHE_TTL", str(24 * 60 * 60)))
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# (nome do arquivo, conteúdo, content-type)
+Arquivo = Tuple[str, bytes, str]
+
+
+class ApiError(Exception):
+    """Resposta de erro da API (status HTTP e corpo)."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"Erro {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class SseEvent:
+    event: str = "message"
+    data: str = ""
+    id: Optional[str] = None
+
+
+@dataclass
+class Sentenca:
+    sentenca: str
+    sentenca_url: Optional[str] = None
+    referencias_url: Optional[str] = None
+    numero_processo: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "Sentenca":
+        return cls(
+            sentenca=data.get("sentenca", ""),
+            sentenca_url=data.get("sentenca_url") or None,
+            referencias_url=data.get("referencias_url") or None,
+            numero_processo=data.get("numero_processo"),
+        )
+
+
+def _linhas(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Linhas de um fluxo de bytes (CRLF, LF ou CR), sem os terminadores."""
+    buffer = b""
+    cr_pendente = False
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if cr_pendente and chunk.startswith(b"\n"):
+            chunk = chunk[1:]  # o \n do \r\n chegou no chunk seguinte
+        cr_pendente = chunk.endswith(b"\r")
+        buffer += chunk
+        partes = buffer.replace(b"\r\n", b"\n").replace(b"\r", b"\n").split(b"\n")
+        buffer = partes.pop()
+        for linha in partes:
+            yield linha.decode("utf-8")
+    if buffer:
+        yield buffer.decode("utf-8")
+
+
+def parse_sse(chunks: Iterable[bytes]) -> Iterator[SseEvent]:
+    """
+    Eventos de um fluxo text/event-stream: campos event/data/id, linhas de
+    data juntadas com \\n, comentários (':', os pings) ignorados e um evento
+    despachado a cada linha em branco.
+    """
+    evento, dados, ultimo_id = None, [], None
+    for linha in _linhas(chunks):
+        if not linha:
+            if dados:
+                yield SseEvent(evento or "message", "\n".join(dados), ultimo_id)
+            evento, dados = None, []
+            continue
+        if linha.startswith(":"):
+            continue
+        campo, _, valor = linha.partition(":")
+        if valor.startswith(" "):
+            valor = valor[1:]
+        if campo == "event":
+            evento = valor
+        elif campo == "data":
+            dados.append(valor)
+        elif campo == "id":
+            ultimo_id = valor
+    if dados:
+        yield SseEvent(evento or "message", "\n".join(dados), ultimo_id)
+
+
+class ApiClient:
+    """Cliente da API com sessão keep-alive, timeouts e retries."""
+
+    def __init__(self, base_url: str = API_URL, retries: int = API_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=0.5,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),  # leitura/status: só métodos idempotentes
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=16)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _url(self, path: str) -> str:
+        return path if path.startswith("http") else f"{self.base_url}{path}"
+
+    @staticmethod
+    def _checar(resp: requests.Response) -> requests.Response:
+        if resp.status_code >= 400:
+            try:
+                detail = resp.json().get("detail", resp.text)
+            except ValueError:
+                detail = resp.text
+            resp.close()
+            raise ApiError(resp.status_code, str(detail))
+        return resp
+
+    # ───────────────────────────── chamadas ─────────────────────────────
+    def health(self) -> bool:
+        try:
+            resp = self.session.get(self._url("/health"), timeout=(API_CONNECT_TIMEOUT, 5))
+        except requests.RequestException:
+            return False
+        return resp.status_code == 200
+
+    def processar(self, pdf: Arquivo) -> Dict:
+        """POST /processar: relatório extraído do PDF."""
+        resp = self.session.post(
+            self._url("/processar"), files={"pdf": pdf},
+            timeout=(API_CONNECT_TIMEOUT, API_READ_TIMEOUT),
+        )
+        return self._checar(resp).json()
+
+    def stream_processar(self, pdf: Arquivo) -> Iterator[SseEvent]:
+        """POST /stream/processar: progresso e resultado como eventos SSE."""
+        return self._stream("/stream/processar", files={"pdf": pdf})
+
+    def gerar_sentenca(self, campos: Dict[str, str], referencias: Sequence[Arquivo] = ()) -> Sentenca:
+        """POST /gerar-sentenca: sentença e URLs dos artefatos."""
+        resp = self.session.post(
+            self._url("/gerar-sentenca"), data=campos,
+            files=[("arquivos_referencia", f) for f in referencias],
+            timeout=(API_CONNECT_TIMEOUT, API_READ_TIMEOUT),
+        )
+        return Sentenca.from_json(self._checar(resp).json())
+
+    def stream_gerar_sentenca(self, campos: Dict[str, str], referencias: Sequence[Arquivo] = ()) -> Iterator[SseEvent]:
+        """POST /stream/gerar-sentenca: progresso e sentença como eventos SSE."""
+        return self._stream(
+            "/stream/gerar-sentenca", data=campos,
+            files=[("arquivos_referencia", f) for f in referencias],
+        )
+
+    def _stream(self, path: str, **kwargs) -> Iterator[SseEvent]:
+        resp = self._checar(self.session.post(
+            self._url(path), stream=True, headers={"Accept": "text/event-stream"},
+            timeout=(API_CONNECT_TIMEOUT, API_STREAM_TIMEOUT), **kwargs,
+        ))
+
+        def eventos() -> Iterator[SseEvent]:
+            # chunk_size=None: entrega cada pedaço assim que chega (sem esperar encher um buffer)
+            with resp:
+                yield from parse_sse(resp.iter_content(chunk_size=None))
+
+        return eventos()
+
+    # ───────────────────────────── artefatos ─────────────────────────────
+    def baixar(self, url: str) -> Path:
+        """
+        Caminho local do artefato (ex.: /download/sentenca/<id>.docx), baixado
+        em streaming na primeira chamada e reaproveitado nas seguintes.
+        """
+        partes = url.rstrip("/").split("/")
+        destino = ARTIFACT_CACHE_DIR / partes[-2] / partes[-1]
+        if destino.is_file():
+            return destino
+        self._limpar_cache()
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        tmp = destino.with_name(f".{destino.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with self._checar(self.session.get(
+                self._url(url), stream=True, timeout=(API_CONNECT_TIMEOUT, 60),
+            )) as resp, open(tmp, "wb") as f:
+                for chunk in resp.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+            os.replace(tmp, destino)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return destino
+
+    @staticmethod
+    def _limpar_cache() -> None:
+        if not ARTIFACT_CACHE_DIR.exists():
+            return
+        limite = time.time() - ARTIFACT_CACHE_TTL
+        for path in ARTIFACT_CACHE_DIR.glob("*/*"):
+            try:
+                if path.stat().st_mtime < limite:
+                    path.unlink()
+            except OSError:
+                pass
+
+
+__all__ = [
+    "API_URL",
+    "DOCX_MIME",
+    "ApiClient",
+    "ApiError",
+    "Sentenca",
+    "SseEvent",
+    "parse_sse",
+]
@@ -6,67 +6,95 @@ import sqlite3
 import os
 import smtplib
 import secrets
-import time
+import threading
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Optional, Dict
 
 class AuthTJPE:
+    """
+    Usuários, códigos e sessões em SQLite. Uma conexão por processo (ver
+    get_auth_manager), em modo WAL: leituras não esperam escritas e cada
+    rerun do Streamlit não reabre o banco. As consultas são constantes, então
+    o sqlite3 reaproveita os statements compilados (cached_statements).
+    """
+
     def __init__(self, db_path: str = "/app/data/users_tjpe.db"):
         self.db_path = db_path
         self.session_timeout = 8 * 60 * 60  # 8 horas em segundos
         self.code_timeout = 10 * 60  # 10 minutos para código de verificação
+        # Sessões do Streamlit rodam em threads: conexão compartilhada, acesso serializado
+        self._lock = threading.RLock()
+        self._conn = self._connect()
         self.init_database()
         self.create_admin_user()
-    
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10, cached_statements=64)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _fetchone(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
     def init_database(self):
         """Inicializa banco de dados de usuários"""
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Tabela de usuários aprovados
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS approved_users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                full_name TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                created_by TEXT DEFAULT 'admin',
-                is_active BOOLEAN DEFAULT 1,
-                last_login TIMESTAMP
-            )
-        ''')
-        
-        # Tabela de códigos de verificação
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS verification_codes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT NOT NULL,
-                code TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP NOT NULL,
-                used BOOLEAN DEFAULT 0
-            )
-        ''')
-        
-        # Tabela de sessões ativas
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS active_sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT NOT NULL,
-                session_token TEXT UNIQUE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP NOT NULL,
-                ip_address TEXT,
-                user_agent TEXT
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with self._lock, self._conn:
+            # Tabela de usuários aprovados
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS approved_users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    email TEXT UNIQUE NOT NULL,
+                    full_name TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    created_by TEXT DEFAULT 'admin',
+                    is_active BOOLEAN DEFAULT 1,
+                    last_login TIMESTAMP
+                )
+            ''')
+
+            # Tabela de códigos de verificação
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS verification_codes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    email TEXT NOT NULL,
+                    code TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    expires_at TIMESTAMP NOT NULL,
+                    used BOOLEAN DEFAULT 0
+                )
+            ''')
+
+            # Tabela de sessões ativas
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS active_sessions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    email TEXT NOT NULL,
+                    session_token TEXT UNIQUE NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    expires_at TIMESTAMP NOT NULL,
+                    ip_address TEXT,
+                    user_agent TEXT
+                )
+            ''')
+
+            # Índices das buscas por e-mail e das limpezas por expiração
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_codes_email ON verification_codes(email, used)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_codes_expires ON verification_codes(expires_at)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON active_sessions(expires_at)')
     
     def create_admin_user(self):
         """Cria usuário admin se não existir"""
@@ -86,31 +114,19 @@ class AuthTJPE:
     
     def is_user_approved(self, email: str) -> bool:
         """Verifica se usuário está aprovado"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        return self._fetchone('''
             SELECT 1 FROM approved_users 
             WHERE email = ? AND is_active = 1
-        ''', (email.lower(),))
-        
-        exists = cursor.fetchone() is not None
-        conn.close()
-        return exists
+        ''', (email.lower(),)) is not None
     
     def add_approved_user(self, email: str, full_name: str, created_by: str = "admin") -> bool:
         """Adiciona usuário à lista de aprovados (apenas admin)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO approved_users (email, full_name, created_by)
-                VALUES (?, ?, ?)
-            ''', (email.lower(), full_name, created_by))
-            
-            conn.commit()
-            conn.close()
+            with self._lock, self._conn:
+                self._conn.execute('''
+                    INSERT INTO approved_users (email, full_name, created_by)
+                    VALUES (?, ?, ?)
+                ''', (email.lower(), full_name, created_by))
             return True
         except sqlite3.IntegrityError:
             return False  # Usuário já existe
@@ -184,31 +200,27 @@ class AuthTJPE:
         if not self.is_user_approved(email):
             return False
         
-        # Limpar códigos expirados
-        self.cleanup_expired_codes()
-        
         # Gerar novo código
         code = self.generate_verification_code()
-        expires_at = datetime.now() + timedelta(seconds=self.code_timeout)
+        now = datetime.now()
+        expires_at = now + timedelta(seconds=self.code_timeout)
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Invalidar códigos anteriores
-        cursor.execute('''
-            UPDATE verification_codes 
-            SET used = 1 
-            WHERE email = ? AND used = 0
-        ''', (email.lower(),))
-        
-        # Inserir novo código
-        cursor.execute('''
-            INSERT INTO verification_codes (email, code, expires_at)
-            VALUES (?, ?, ?)
-        ''', (email.lower(), code, expires_at))
-        
-        conn.commit()
-        conn.close()
+        with self._lock, self._conn:
+            # Limpar códigos expirados
+            self._conn.execute('DELETE FROM verification_codes WHERE expires_at < ?', (now,))
+
+            # Invalidar códigos anteriores
+            self._conn.execute('''
+                UPDATE verification_codes 
+                SET used = 1 
+                WHERE email = ? AND used = 0
+            ''', (email.lower(),))
+            
+            # Inserir novo código
+            self._conn.execute('''
+                INSERT INTO verification_codes (email, code, expires_at)
+                VALUES (?, ?, ?)
+            ''', (email.lower(), code, expires_at))
         
         # Buscar nome do usuário
         user_info = self.get_user_info(email)
@@ -219,57 +231,41 @@ class AuthTJPE:
     
     def verify_code(self, email: str, code: str) -> bool:
         """Verifica código de acesso"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id FROM verification_codes 
-            WHERE email = ? AND code = ? AND used = 0 AND expires_at > ?
-        ''', (email.lower(), code, datetime.now()))
-        
-        result = cursor.fetchone()
-        
-        if result:
-            # Marcar código como usado
-            cursor.execute('''
+        with self._lock, self._conn:
+            # Marca como usado e confere no mesmo comando
+            cursor = self._conn.execute('''
                 UPDATE verification_codes 
                 SET used = 1 
-                WHERE id = ?
-            ''', (result[0],))
-            
-            conn.commit()
-            conn.close()
-            return True
-        
-        conn.close()
-        return False
+                WHERE id = (
+                    SELECT id FROM verification_codes 
+                    WHERE email = ? AND code = ? AND used = 0 AND expires_at > ?
+                    ORDER BY id DESC LIMIT 1
+                )
+            ''', (email.lower(), code, datetime.now()))
+            return cursor.rowcount > 0
     
     def create_session(self, email: str) -> str:
         """Cria sessão após verificação"""
         session_token = secrets.token_urlsafe(32)
-        expires_at = datetime.now() + timedelta(seconds=self.session_timeout)
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        now = datetime.now()
+        expires_at = now + timedelta(seconds=self.session_timeout)
         
-        # Limpar sessões expiradas
-        cursor.execute('DELETE FROM active_sessions WHERE expires_at < ?', (datetime.now(),))
-        
-        # Criar nova sessão
-        cursor.execute('''
-            INSERT INTO active_sessions (email, session_token, expires_at)
-            VALUES (?, ?, ?)
-        ''', (email.lower(), session_token, expires_at))
-        
-        # Atualizar último login
-        cursor.execute('''
-            UPDATE approved_users 
-            SET last_login = CURRENT_TIMESTAMP 
-            WHERE email = ?
-        ''', (email.lower(),))
-        
-        conn.commit()
-        conn.close()
+        with self._lock, self._conn:
+            # Limpar sessões expiradas
+            self._conn.execute('DELETE FROM active_sessions WHERE expires_at < ?', (now,))
+            
+            # Criar nova sessão
+            self._conn.execute('''
+                INSERT INTO active_sessions (email, session_token, expires_at)
+                VALUES (?, ?, ?)
+            ''', (email.lower(), session_token, expires_at))
+            
+            # Atualizar último login
+            self._conn.execute('''
+                UPDATE approved_users 
+                SET last_login = CURRENT_TIMESTAMP 
+                WHERE email = ?
+            ''', (email.lower(),))
         
         return session_token
     
@@ -278,76 +274,63 @@ class AuthTJPE:
         if not session_token:
             return None
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        result = self._fetchone('''
             SELECT email FROM active_sessions 
             WHERE session_token = ? AND expires_at > ?
         ''', (session_token, datetime.now()))
         
-        result = cursor.fetchone()
-        conn.close()
-        
         return result[0] if result else None
     
-    def logout(self, session_token: str):
-        """Remove sessão"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def validate_session_user(self, session_token: str) -> Optional[Dict]:
+        """Valida a sessão e já devolve o usuário (uma consulta só)"""
+        if not session_token:
+            return None
         
-        cursor.execute('DELETE FROM active_sessions WHERE session_token = ?', (session_token,))
+        user = self._fetchone('''
+            SELECT u.email, u.full_name, u.created_at, u.last_login, u.created_by
+            FROM active_sessions s JOIN approved_users u ON u.email = s.email
+            WHERE s.session_token = ? AND s.expires_at > ?
+        ''', (session_token, datetime.now()))
         
-        conn.commit()
-        conn.close()
+        return self._user_dict(user) if user else None
+    
+    def logout(self, session_token: str):
+        """Remove sessão"""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM active_sessions WHERE session_token = ?', (session_token,))
+    
+    @staticmethod
+    def _user_dict(user) -> Dict:
+        return {
+            "email": user[0],
+            "full_name": user[1],
+            "created_at": user[2],
+            "last_login": user[3],
+            "created_by": user[4],
+            "is_admin": user[0] == "george.queiroz@tjpe.jus.br"
+        }
     
     def get_user_info(self, email: str) -> Optional[Dict]:
         """Retorna informações do usuário"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        user = self._fetchone('''
             SELECT email, full_name, created_at, last_login, created_by
             FROM approved_users WHERE email = ?
         ''', (email.lower(),))
         
-        user = cursor.fetchone()
-        conn.close()
-        
-        if user:
-            return {
-                "email": user[0],
-                "full_name": user[1],
-                "created_at": user[2],
-                "last_login": user[3],
-                "created_by": user[4],
-                "is_admin": user[0] == "george.queiroz@tjpe.jus.br"
-            }
-        return None
+        return self._user_dict(user) if user else None
     
     def cleanup_expired_codes(self):
         """Remove códigos expirados"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM verification_codes WHERE expires_at < ?', (datetime.now(),))
-        
-        conn.commit()
-        conn.close()
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM verification_codes WHERE expires_at < ?', (datetime.now(),))
     
     def list_approved_users(self) -> list:
         """Lista usuários aprovados (apenas admin)"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        users = self._fetchall('''
             SELECT email, full_name, created_at, last_login, is_active
             FROM approved_users ORDER BY created_at DESC
         ''')
         
-        users = cursor.fetchall()
-        conn.close()
-        
         return [
             {
                 "email": user[0],
@@ -363,6 +346,14 @@ class AuthTJPE:
 # Funções para integração com Streamlit
 # ────────────────────────────────────────────────
 
+# Revalidação da sessão no banco: no máximo uma vez a cada N segundos por aba
+SESSION_REVALIDATE_SEC = float(os.getenv("SESSION_REVALIDATE_SEC", "30"))
+
+@st.cache_resource
+def get_auth_manager() -> AuthTJPE:
+    """Store único do processo (compartilhado por todas as sessões/abas)"""
+    return AuthTJPE()
+
 def init_auth_state():
     """Inicializa estado de autenticação"""
     if "authenticated" not in st.session_state:
@@ -370,7 +361,7 @@ def init_auth_state():
     if "user_info" not in st.session_state:
         st.session_state.user_info = None
     if "auth_manager" not in st.session_state:
-        st.session_state.auth_manager = AuthTJPE()
+        st.session_state.auth_manager = get_auth_manager()
     if "login_step" not in st.session_state:
         st.session_state.login_step = "email"  # email -> code -> authenticated
 
@@ -382,12 +373,29 @@ def check_authentication() -> bool:
     session_token = st.session_state.get("session_token")
     
     if session_token:
-        email = st.session_state.auth_manager.validate_session(session_token)
-        if email:
+        # Reruns seguidos reaproveitam a última validação do mesmo token
+        cache = st.session_state.get("session_token_validation")
+        if (
+            cache
+            and cache["token"] == session_token
+            and time.monotonic() - cache["checked_at"] < SESSION_REVALIDATE_SEC
+        ):
+            st.session_state.authenticated = True
+            st.session_state.user_info = cache["user_info"]
+            return True
+        
+        user_info = st.session_state.auth_manager.validate_session_user(session_token)
+        if user_info:
+            st.session_state.session_token_validation = {
+                "token": session_token,
+                "user_info": user_info,
+                "checked_at": time.monotonic(),
+            }
             st.session_state.authenticated = True
-            st.session_state.user_info = st.session_state.auth_manager.get_user_info(email)
+            st.session_state.user_info = user_info
             return True
     
+    st.session_state.pop("session_token_validation", None)
     st.session_state.authenticated = False
     st.session_state.user_info = None
     return False
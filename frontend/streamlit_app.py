@@ -7,7 +7,6 @@ import os
 import requests
 import streamlit as st
 from dotenv import load_dotenv
-from sseclient import SSEClient
 from datetime import datetime
 import re
 from io import BytesIO
@@ -16,10 +15,51 @@ import json
 
 # Import do sistema de autenticação
 from auth_tjpe import require_authentication, show_admin_panel
+from api_client import DOCX_MIME, ApiClient, ApiError
 
 load_dotenv()
 API_URL = os.getenv("API_URL", "http://localhost:8010")
 
+@st.cache_resource
+def get_api_client() -> ApiClient:
+    """Cliente HTTP único do processo (sessão keep-alive compartilhada)"""
+    return ApiClient(API_URL)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def api_online() -> bool:
+    """Health check da API, refeito no máximo a cada 30s (não a cada rerun)"""
+    return get_api_client().health()
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def texto_para_docx(titulo: str, texto: str) -> bytes:
+    """DOCX em memória a partir do texto, preservando parágrafos e quebras de linha"""
+    buffer = BytesIO()
+    doc = Document()
+    doc.add_heading(titulo, level=1)
+
+    # Divide em seções baseado em quebras duplas ou mais
+    for secao in re.split(r'\n{2,}', texto or ""):
+        secao = secao.strip()
+        if not secao:
+            continue
+        linhas = secao.split('\n')
+        if len(linhas) == 1:
+            # Se é uma linha única, adiciona como parágrafo
+            doc.add_paragraph(linhas[0])
+        else:
+            # Se tem múltiplas linhas, cria parágrafo preservando quebras
+            p = doc.add_paragraph()
+            for i, linha in enumerate(linhas):
+                linha = linha.strip()
+                if not linha:
+                    continue
+                if i > 0:
+                    p.add_run().add_break()
+                p.add_run(linha)
+
+    doc.save(buffer)
+    return buffer.getvalue()
+
 def limpar_relatorio(texto_bruto):
     """
     Remove tags, formatação e outros elementos indesejados do relatório
@@ -153,10 +193,11 @@ def main_app():
         st.session_state.sentenca_texto = None
     if "sentenca_processada" not in st.session_state:
         st.session_state.sentenca_processada = False
-    if "sentenca_bytes" not in st.session_state:
-        st.session_state.sentenca_bytes = None
-    if "referencias_bytes" not in st.session_state:
-        st.session_state.referencias_bytes = None
+    # URLs dos artefatos gerados no backend (baixados sob demanda, com cache local)
+    if "sentenca_url" not in st.session_state:
+        st.session_state.sentenca_url = None
+    if "referencias_url" not in st.session_state:
+        st.session_state.referencias_url = None
     if "numero_processo" not in st.session_state:
         st.session_state.numero_processo = None # Garante que sempre começa como None ou valor padrão
 
@@ -241,13 +282,9 @@ def main_app():
         # Status do sistema
         st.markdown("---")
         st.markdown("#### **📊 Status do Sistema**")
-        try:
-            resp = requests.get(f"{API_URL}/health", timeout=None)
-            if resp.status_code == 200:
-                st.success("🟢 Sistema Online")
-            else:
-                st.warning("🟡 Sistema com Problemas")
-        except:
+        if api_online():
+            st.success("🟢 Sistema Online")
+        else:
             st.error("🔴 Sistema Offline")
 
     st.title("⚖️ SDJ - Sistema Distribuído Jurídico")
@@ -267,7 +304,8 @@ def main_app():
             progress_bar = st.progress(0)
                 
             status.text("🔄 Enviando PDF para extração...")
-            files = {"pdf": (uploaded_pdf.name, uploaded_pdf.getvalue(), "application/pdf")}
+            pdf = (uploaded_pdf.name, uploaded_pdf.getvalue(), "application/pdf")
+            client = get_api_client()
                 
             try:
                 # ESTRATÉGIA PRINCIPAL: Usar endpoint direto que sabemos que funciona
@@ -278,14 +316,17 @@ def main_app():
                 time_warning = st.empty()
                 time_warning.info("⏱️ O processamento pode demorar alguns minutos dependendo do tamanho do arquivo. Aguarde...")
                     
-                with st.spinner("Extraindo relatório..."):
-                    resp_direct = requests.post(f"{API_URL}/processar", files=files, timeout=None)  # 10 minutos
+                try:
+                    with st.spinner("Extraindo relatório..."):
+                        result = client.processar(pdf)
+                    erro_direto = None
+                except ApiError as e:
+                    result, erro_direto = None, e
                     
                 time_warning.empty()  # Remove o aviso após o processamento
                     
-                if resp_direct.status_code == 200:
+                if erro_direto is None:
                     progress_bar.progress(80)
-                    result = resp_direct.json()
                         
                     if 'relatorio' in result:
                         relatorio_bruto = result['relatorio']
@@ -319,43 +360,37 @@ def main_app():
                         status.error("❌ Resposta da API não contém relatório")
                 else:
                     progress_bar.empty()
-                    status.error(f"❌ Erro {resp_direct.status_code}: {resp_direct.text}")
+                    status.error(f"❌ {erro_direto}")
                         
                     # FALLBACK: Tenta streaming como segunda opção
                     status.text("🔄 Tentando método streaming como fallback...")
                         
                     try:
                         with st.spinner("Tentando extração via streaming..."):
-                            resp_stream = requests.post(f"{API_URL}/stream/processar", files=files, stream=True, timeout=None)
-                            
-                        if resp_stream.status_code == 200:
-                            # Processa stream usando SSEClient
-                            try:
-                                client = SSEClient(resp_stream)
-                                for event in client.events():
-                                    if event.event == "message":
-                                        status.text(event.data)
-                                    elif event.event == "complete":
-                                        # O backend retorna o relatório diretamente no data do evento complete
-                                        relatorio_bruto = event.data
-                                        relatorio_limpo = limpar_relatorio(relatorio_bruto)
-                                        st.session_state.relatorio = relatorio_limpo
-                                            
-                                        # Extrai número do processo
-                                        st.session_state.numero_processo = extrair_numero_processo(relatorio_limpo)
-                                            
-                                        st.session_state.relatorio_processado = True
-                                        status.success("✅ Relatório extraído via streaming!")
-                                        st.rerun()
-                                        break
-                                    elif event.event == "error":
-                                        status.error(f"❌ Erro no streaming: {event.data}")
-                                        break
-                            except Exception as e:
-                                status.error(f"❌ Erro ao processar streaming: {str(e)}")
-                        else:
-                            status.error(f"❌ Streaming também falhou: {resp_stream.status_code}")
+                            eventos = client.stream_processar(pdf)
                             
+                        # Processa os eventos SSE à medida que chegam
+                        for event in eventos:
+                            if event.event == "message":
+                                status.text(event.data)
+                            elif event.event == "complete":
+                                # O backend retorna o relatório diretamente no data do evento complete
+                                relatorio_bruto = event.data
+                                relatorio_limpo = limpar_relatorio(relatorio_bruto)
+                                st.session_state.relatorio = relatorio_limpo
+                                    
+                                # Extrai número do processo
+                                st.session_state.numero_processo = extrair_numero_processo(relatorio_limpo)
+                                    
+                                st.session_state.relatorio_processado = True
+                                status.success("✅ Relatório extraído via streaming!")
+                                st.rerun()
+                                break
+                            elif event.event == "error":
+                                status.error(f"❌ Erro no streaming: {event.data}")
+                                break
+                    except ApiError as e:
+                        status.error(f"❌ Streaming também falhou: {e}")
                     except Exception as e:
                         status.error(f"❌ Erro no fallback streaming: {str(e)}")
                         
@@ -395,37 +430,8 @@ def main_app():
                         disabled=True,
                         key="preview_relatorio")
             
-        # gerar DOCX em memória com formatação adequada
-        buffer = BytesIO()
-        doc = Document()
-        doc.add_heading("Relatório Extraído", level=1)
-            
-        # Processa o texto preservando quebras de linha
-        texto_relatorio = st.session_state.relatorio
-            
-        # Divide em seções baseado em quebras duplas ou mais
-        secoes = re.split(r'\n{2,}', texto_relatorio)
-            
-        for secao in secoes:
-            if secao.strip():
-                # Divide cada seção em linhas
-                linhas_secao = secao.split('\n')
-                    
-                if len(linhas_secao) == 1:
-                    # Se é uma linha única, adiciona como parágrafo
-                    doc.add_paragraph(linhas_secao[0].strip())
-                else:
-                    # Se tem múltiplas linhas, cria parágrafo preservando quebras
-                    paragrafo = doc.add_paragraph()
-                    for i, linha in enumerate(linhas_secao):
-                        if linha.strip():
-                            if i > 0:
-                                # Adiciona quebra de linha
-                                paragrafo.add_run().add_break()
-                            paragrafo.add_run(linha.strip())
-            
-        doc.save(buffer)
-        buffer.seek(0)
+        # gerar DOCX em memória com formatação adequada (cacheado: não refaz a cada rerun)
+        dados_relatorio = texto_para_docx("Relatório Extraído", st.session_state.relatorio)
 
         # Gera nome do arquivo baseado no número do processo
         # Garante que st.session_state.numero_processo seja uma string antes de chamar replace
@@ -439,7 +445,7 @@ def main_app():
 
         st.download_button(
             label="📥 Baixar Relatório (.docx)",
-            data=buffer.getvalue(),
+            data=dados_relatorio,
             file_name=nome_arquivo_relatorio,
             mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
             key="dl_relatorio"
@@ -508,144 +514,91 @@ def main_app():
         time_warning = st.empty()
         time_warning.info("⏱️ A geração pode demorar alguns minutos. Aguarde...")
 
+        client = get_api_client()
+        campos = {
+            "relatorio": st.session_state.relatorio,
+            "instrucoes_usuario": instrucoes_usuario,
+            "top_k": str(top_k),
+            "rerank_top_k": str(rerank_top_k),
+            "numero_processo": st.session_state.get("numero_processo", ""), # Garante que envia uma string
+            "buscar_na_base": "true"
+        }
+        referencias = [(f.name, f.getvalue(), DOCX_MIME) for f in arquivos_ref or []]
+
         try:
             # ESTRATÉGIA PRINCIPAL: Usar endpoint direto como no relatório
-            with st.spinner("Gerando sentença..."):
-                response = requests.post(
-                    f"{API_URL}/gerar-sentenca",
-                    data={
-                        "relatorio": st.session_state.relatorio,
-                        "instrucoes_usuario": instrucoes_usuario,
-                        "top_k": str(top_k),
-                        "rerank_top_k": str(rerank_top_k),
-                        "numero_processo": st.session_state.get("numero_processo", ""), # Garante que envia uma string
-                        "buscar_na_base": "true"
-                    },
-                    files=[
-                        ("arquivos_referencia",
-                         (f.name, f.getvalue(),
-                          "application/vnd.openxmlformats-officedocument.wordprocessingml.document"))
-                        for f in arquivos_ref or []
-                    ],
-                    timeout=600  # 10 minutos
-                )
+            try:
+                with st.spinner("Gerando sentença..."):
+                    result = client.gerar_sentenca(campos, referencias)
+                resposta_invalida = False
+            except ValueError:
+                # Resposta 200 que não é JSON: tenta o endpoint de streaming (fallback)
+                result, resposta_invalida = None, True
                 
             time_warning.empty()  # Remove o aviso após o processamento
             progress_bar.progress(60)
 
-            if response.status_code == 200:
-                try:
-                    result = response.json()
+            if not resposta_invalida:
+                sentenca_limpa = limpar_relatorio(result.sentenca)  # Usa a mesma função de limpeza
                     
-                    if 'sentenca' in result:
-                        sentenca_bruta = result['sentenca']
-                        sentenca_limpa = limpar_relatorio(sentenca_bruta)  # Usa a mesma função de limpeza
-                            
-                        if len(sentenca_limpa) > 50:
-                            st.session_state.sentenca_texto = sentenca_limpa
-                                
-                            # Baixa conteúdos se URLs estão disponíveis
-                            if 'sentenca_url' in result and 'referencias_url' in result:
-                                sent_url = API_URL + result["sentenca_url"]
-                                refs_url = API_URL + result["referencias_url"]
-                                    
-                                try:
-                                    sent_bytes = requests.get(sent_url).content
-                                    refs_bytes = requests.get(refs_url).content
-                                    st.session_state.sentenca_bytes = sent_bytes
-                                    st.session_state.referencias_bytes = refs_bytes
-                                except Exception as e:
-                                    # Se não conseguir baixar, gera os arquivos localmente
-                                    st.session_state.sentenca_bytes = None
-                                    st.session_state.referencias_bytes = None
-                                    status.warning(f"⚠️ Não foi possível baixar arquivos do servidor: {e}. Gerando localmente.")
-                                    
-                            progress_bar.progress(100)
-                            st.session_state.sentenca_processada = True
-                            status.success("✅ Sentença gerada com sucesso!")
-                                
-                            # Limpa a barra de progresso e força atualização
-                            progress_bar.empty()
-                            st.rerun()
-                        else:
-                            progress_bar.empty()
-                            status.error(f"❌ Sentença muito pequena após limpeza: {len(sentenca_limpa)} caracteres")
-                    else:
-                        progress_bar.empty()
-                        status.error("❌ Resposta da API não contém sentença")
-                        
-                except json.JSONDecodeError:
-                    # Se não for JSON, tenta processar como stream (fallback)
-                    progress_bar.empty()
-                    status.text("🔄 Processando resposta via streaming...")
+                if len(sentenca_limpa) > 50:
+                    st.session_state.sentenca_texto = sentenca_limpa
                         
-                    try:
-                        # Refaz a requisição como stream
-                        stream_response = requests.post(
-                            f"{API_URL}/gerar-sentenca",
-                            data={
-                                "relatorio": st.session_state.relatorio,
-                                "instrucoes_usuario": instrucoes_usuario,
-                                "top_k": str(top_k),
-                                "rerank_top_k": str(rerank_top_k),
-                                "numero_processo": st.session_state.get("numero_processo", ""), # Garante que envia uma string
-                                "buscar_na_base": "true"
-                            },
-                            files=[
-                                ("arquivos_referencia",
-                                 (f.name, f.getvalue(),
-                                  "application/vnd.openxmlformats-officedocument.wordprocessingml.document"))
-                                for f in arquivos_ref or []
-                            ],
-                            stream=True,
-                            timeout=600
-                        )
+                    # Guarda só as URLs: os arquivos são baixados uma vez, na exibição
+                    st.session_state.sentenca_url = result.sentenca_url
+                    st.session_state.referencias_url = result.referencias_url
                             
-                        if stream_response.status_code == 200:
-                            client = SSEClient(stream_response)
-                            for event in client.events():
-                                if event.event == "message":
-                                    status.text(f"🔄 {event.data}")
-                                elif event.event == "complete":
-                                    data = json.loads(event.data)
-                                    sentenca_bruta = data["sentenca"].replace("\\n", "\n")
-                                    sentenca_limpa = limpar_relatorio(sentenca_bruta)
-                                        
-                                    if len(sentenca_limpa) > 50:
-                                        st.session_state.sentenca_texto = sentenca_limpa
-                                            
-                                        # Baixa conteúdos
-                                        sent_url = API_URL + data["sentenca_url"]
-                                        refs_url = API_URL + data["referencias_url"]
-                                        
-                                        try:
-                                            sent_bytes = requests.get(sent_url).content
-                                            refs_bytes = requests.get(refs_url).content
-                                            st.session_state.sentenca_bytes = sent_bytes
-                                            st.session_state.referencias_bytes = refs_bytes
-                                        except Exception as e:
-                                            st.session_state.sentenca_bytes = None
-                                            st.session_state.referencias_bytes = None
-                                            status.warning(f"⚠️ Não foi possível baixar arquivos do servidor: {e}. Gerando localmente.")
-
-                                        st.session_state.sentenca_processada = True
-                                            
-                                        status.success("✅ Sentença gerada via streaming!")
-                                        st.rerun()
-                                    else:
-                                        status.error(f"❌ Sentença muito pequena: {len(sentenca_limpa)} caracteres")
-                                    break
-                                elif event.event == "error":
-                                    status.error(f"❌ Erro na geração: {event.data}")
-                                    break
-                        else:
-                            status.error(f"❌ Erro no streaming: {stream_response.status_code}")
-                    except Exception as e:
-                        status.error(f"❌ Erro no fallback streaming: {str(e)}")
+                    progress_bar.progress(100)
+                    st.session_state.sentenca_processada = True
+                    status.success("✅ Sentença gerada com sucesso!")
                         
-                except requests.exceptions.Timeout:
+                    # Limpa a barra de progresso e força atualização
                     progress_bar.empty()
-                    status.error("⏱️ Timeout na geração (10 minutos). O processamento pode estar demorando mais que o esperado. Tente novamente.")
+                    st.rerun()
+                else:
+                    progress_bar.empty()
+                    status.error(f"❌ Sentença muito pequena após limpeza: {len(sentenca_limpa)} caracteres")
+            else:
+                progress_bar.empty()
+                status.text("🔄 Processando resposta via streaming...")
+                    
+                try:
+                    for event in client.stream_gerar_sentenca(campos, referencias):
+                        if event.event == "message":
+                            status.text(f"🔄 {event.data}")
+                        elif event.event == "complete":
+                            data = json.loads(event.data)
+                            sentenca_bruta = data["sentenca"].replace("\\n", "\n")
+                            sentenca_limpa = limpar_relatorio(sentenca_bruta)
+                                
+                            if len(sentenca_limpa) > 50:
+                                st.session_state.sentenca_texto = sentenca_limpa
+                                st.session_state.sentenca_url = data.get("sentenca_url") or None
+                                st.session_state.referencias_url = data.get("referencias_url") or None
+                                st.session_state.sentenca_processada = True
+                                    
+                                status.success("✅ Sentença gerada via streaming!")
+                                st.rerun()
+                            else:
+                                status.error(f"❌ Sentença muito pequena: {len(sentenca_limpa)} caracteres")
+                            break
+                        elif event.event == "error":
+                            status.error(f"❌ Erro na geração: {event.data}")
+                            break
+                except ApiError as e:
+                    status.error(f"❌ Erro no streaming: {e}")
+                except Exception as e:
+                    status.error(f"❌ Erro no fallback streaming: {str(e)}")
+                    
+        except ApiError as e:
+            time_warning.empty()
+            progress_bar.empty()
+            status.error(f"❌ {e}")
+
+        except requests.exceptions.Timeout:
+            time_warning.empty()
+            progress_bar.empty()
+            status.error("⏱️ Timeout na geração (10 minutos). O processamento pode estar demorando mais que o esperado. Tente novamente.")
                 
         except requests.exceptions.ConnectionError:
             progress_bar.empty()
@@ -679,50 +632,37 @@ def main_app():
                         disabled=True,
                         key="preview_sentenca")
 
-        # ─────────────────────── Geração do DOCX da Sentença ───────────────────────
-        buffer_sentenca = BytesIO()
-        doc = Document()
-        doc.add_heading("Sentença Gerada", level=1)
-
-        texto = st.session_state.sentenca_texto or ""
-        secoes = re.split(r'\n{2,}', texto)
-        for secao in secoes:
-            secao = secao.strip()
-            if not secao:
-                continue
-            linhas = secao.split('\n')
-            if len(linhas) == 1:
-                doc.add_paragraph(linhas[0])
-            else:
-                p = doc.add_paragraph()
-                for i, linha in enumerate(linhas):
-                    linha = linha.strip()
-                    if not linha:
-                        continue
-                    if i > 0:
-                        p.add_run().add_break()
-                    p.add_run(linha)
-
-        doc.save(buffer_sentenca)
-        buffer_sentenca.seek(0)
+        # ─────────────────────── Arquivos da Sentença ───────────────────────
+        # Artefatos do backend: baixados em streaming uma vez por sentença (cache local por id)
+        client = get_api_client()
+        dados_sentenca = None
+        dados_referencias = None
+        try:
+            if st.session_state.sentenca_url:
+                dados_sentenca = client.baixar(st.session_state.sentenca_url).read_bytes()
+            if st.session_state.referencias_url:
+                dados_referencias = client.baixar(st.session_state.referencias_url).read_bytes()
+        except (requests.exceptions.RequestException, ApiError, OSError) as e:
+            st.warning(f"⚠️ Não foi possível baixar arquivos do servidor: {e}. Gerando localmente.")
 
         # nome inteligente para o DOCX
         nome_sentenca = gerar_nome_arquivo_sentenca(st.session_state.numero_processo)
 
         # ─────────────────────────── Download da Sentença ───────────────────────────
-        # Usa o arquivo gerado pelo backend se disponível, senão usa o gerado localmente
-        dados_sentenca = st.session_state.sentenca_bytes if st.session_state.sentenca_bytes else buffer_sentenca.getvalue()
+        # Usa o arquivo gerado pelo backend se disponível, senão gera localmente (cacheado)
+        if dados_sentenca is None:
+            dados_sentenca = texto_para_docx("Sentença Gerada", st.session_state.sentenca_texto)
             
         st.download_button(
             "📥 Baixar Sentença (.docx)",
             data=dados_sentenca,
             file_name=nome_sentenca,
-            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            mime=DOCX_MIME,
             key="dl_sentenca"
         )
 
         # ─────────────────────────── Download das Referências ───────────────────────
-        if st.session_state.referencias_bytes:
+        if dados_referencias:
             # Garante que numero_processo seja uma string antes de chamar replace
             numero_processo_seguro = st.session_state.get("numero_processo", "")
             numero_limpo = numero_processo_seguro
@@ -730,7 +670,7 @@ def main_app():
 
             st.download_button(
                 "📥 Baixar Referências (.zip)",
-                data=st.session_state.referencias_bytes,
+                data=dados_referencias,
                 file_name=nome_refs,
                 mime="application/zip",
                 key="dl_referencias"
@@ -0,0 +1,42 @@
+"""
+Testes do parser SSE do cliente da API (api_client.py)
+"""
+
+import pytest
+
+pytest.importorskip("requests")
+from api_client import SseEvent, parse_sse
+
+FLUXO = (
+    ": ping\r\n"
+    "\r\n"
+    "event: progress\r\n"
+    "data: 🔍 OCR das páginas 1–25\r\n"
+    "\r\n"
+    "event: complete\r\n"
+    "id: 7\r\n"
+    "data: {\"sentenca\": \"linha 1\r\n"
+    "data: linha 2\"}\r\n"
+    "\r\n"
+).encode("utf-8")
+
+ESPERADO = [
+    SseEvent("progress", "🔍 OCR das páginas 1–25", None),
+    SseEvent("complete", '{"sentenca": "linha 1\nlinha 2"}', "7"),
+]
+
+
+@pytest.mark.parametrize("tamanho", [1, 2, 3, 7, len(FLUXO)])
+def test_crlf_quebrado_entre_chunks(tamanho):
+    # tamanhos pequenos separam \r de \n e cortam caracteres UTF-8 no meio
+    chunks = [FLUXO[i:i + tamanho] for i in range(0, len(FLUXO), tamanho)]
+    assert list(parse_sse(chunks)) == ESPERADO
+
+
+def test_comentarios_e_linhas_sem_dados_nao_geram_evento():
+    assert list(parse_sse([b": ping\n\n: outro\n\nevent: vazio\n\n"])) == []
+
+
+def test_data_em_varias_linhas_e_evento_final_sem_linha_em_branco():
+    eventos = list(parse_sse([b"data:a\ndata: b\r", b"data:  c"]))
+    assert eventos == [SseEvent("message", "a\nb\n c", None)]